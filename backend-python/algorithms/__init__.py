@@ -3,5 +3,10 @@ Algorithms module for phylogenetic tree reconstruction
 """
 
 from .neighbor_joining import NeighborJoining, build_nj_tree
+from .rapid_nj import RapidNeighborJoining
+from .approximate_nj import ApproximateNeighborJoining, build_approximate_tree
 
-__all__ = ['NeighborJoining', 'build_nj_tree']
\ No newline at end of file
+__all__ = [
+    'NeighborJoining', 'RapidNeighborJoining', 'ApproximateNeighborJoining',
+    'build_nj_tree', 'build_approximate_tree'
+]
\ No newline at end of file
@@ -0,0 +1,435 @@
+"""
+Approximate Neighbor-Joining for large corpora
+FastTree-style heuristics (Price, Dehal and Arkin, 2009): clusters are represented
+by profiles (mean embeddings) instead of a distance matrix, and joins are chosen
+from per-node top-hit lists instead of a full Q matrix search
+"""
+
+import math
+import numpy as np
+import logging
+from typing import List, Dict, Tuple, Optional, Any, Callable
+
+from .neighbor_joining import NeighborJoining
+from .tree_store import TreeStore
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on the top-hit list length (default is sqrt(n))
+MAX_TOP_HITS = 128
+
+# Once this few clusters remain, the rest of the tree is built with exact NJ
+EXACT_TAIL_SIZE = 256
+
+# Rows processed per block when computing distances against all clusters
+DISTANCE_BLOCK_SIZE = 4096
+
+
+class ApproximateNeighborJoining:
+    """
+    Approximate Neighbor-Joining working directly from embeddings
+
+    Distances are cosine distances between L2-normalized embeddings. For a
+    joined cluster, the profile is the average of its children profiles, so
+    the profile distance 1 - P_a . P_b minus the up-distances of a and b is
+    exactly the NJ-reduced distance. Only the search is approximate:
+
+    - every cluster keeps its top-hit list (its m ~ sqrt(n) closest clusters),
+      seeded from a neighbor's list so that only O(n sqrt(n)) distances are
+      computed initially
+    - joins are picked from a short global list of the best visible hits,
+      refreshed every m joins together with the out-distances
+    - a joined cluster inherits the merged top-hit lists of its children
+
+    Memory is O(n * (d + m)) and no n x n matrix is ever built.
+    """
+
+    def __init__(
+        self,
+        embeddings: np.ndarray,
+        labels: List[str],
+        top_hits: Optional[int] = None,
+        seed: int = 0
+    ):
+        """
+        Initialize approximate NJ with embeddings and labels
+
+        Args:
+            embeddings: Embedding matrix (n x d), normalized internally
+            labels: List of labels for each document
+            top_hits: Length of the top-hit lists (default sqrt(n), at most MAX_TOP_HITS)
+            seed: Seed for the order in which top-hit lists are computed
+        """
+        profiles = np.array(embeddings, dtype=np.float32)
+        if profiles.ndim != 2:
+            raise ValueError("Embeddings must be a 2D array")
+
+        n = profiles.shape[0]
+        if len(labels) != n:
+            raise ValueError(f"Number of labels ({len(labels)}) must match number of embeddings ({n})")
+        if n < 3:
+            raise ValueError("At least 3 documents are required to build a tree")
+
+        norms = np.linalg.norm(profiles, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        profiles /= norms
+
+        self.labels = labels.copy()
+        self.n_original = n
+        self.seed = seed
+
+        if top_hits is None:
+            top_hits = min(max(int(math.ceil(math.sqrt(n))), 8), MAX_TOP_HITS)
+        self.top_hits = max(1, min(top_hits, n - 1))
+
+        # Cluster state, indexed by slot (a joined cluster reuses a child's slot)
+        self.profiles = profiles
+        self.up_distance = np.zeros(n, dtype=np.float64)
+        self.out_distance = np.zeros(n, dtype=np.float64)
+        self.active = np.ones(n, dtype=bool)
+        self.n_active = n
+        self.slot_node = np.arange(n, dtype=np.int64)
+
+        # Node IDs -> slot (-1 once joined); IDs are never reused
+        self.node_slot = np.full(2 * n, -1, dtype=np.int64)
+        self.node_slot[:n] = np.arange(n)
+
+        # Top-hit lists: node IDs (-1 for empty entries) and NJ-reduced distances
+        self.hit_nodes = np.full((n, self.top_hits), -1, dtype=np.int64)
+        self.hit_dist = np.full((n, self.top_hits), np.inf, dtype=np.float64)
+
+        # Sums over active clusters, used for out-distances
+        self.total_profile = profiles.sum(axis=0, dtype=np.float64)
+        self.total_up = 0.0
+
+        # Global list of candidate joins: node pairs and their reduced distances
+        self._cand_a = np.empty(0, dtype=np.int64)
+        self._cand_b = np.empty(0, dtype=np.int64)
+        self._cand_dist = np.empty(0, dtype=np.float64)
+
+        # Tree under construction; node IDs are the tree node indices
+        self.tree = TreeStore(labels)
+
+        # Track computation statistics
+        self.iterations = 0
+        self.distance_evaluations = 0
+        self.refreshes = 0
+
+        # Optional progress_callback(iterations_done, iterations_total)
+        self.progress_callback: Optional[Callable[[int, int], None]] = None
+
+    def _distances(self, slot: int, others: np.ndarray) -> np.ndarray:
+        """NJ-reduced distances from one cluster to a set of clusters"""
+        delta = 1.0 - self.profiles[others] @ self.profiles[slot]
+        self.distance_evaluations += len(others)
+        return delta - self.up_distance[slot] - self.up_distance[others]
+
+    def _compute_out_distances(self, slots: np.ndarray) -> np.ndarray:
+        """
+        Out-distances r_i = sum_k d(i,k) over the active clusters
+
+        Uses the total profile: sum_k (1 - P_i . P_k) = m - P_i . T
+        """
+        m = self.n_active
+        P = self.profiles[slots]
+        delta_sum = m - P @ self.total_profile.astype(np.float32) - (1.0 - np.einsum('ij,ij->i', P, P))
+        u = self.up_distance[slots]
+        return delta_sum - (m - 1) * u - (self.total_up - u)
+
+    def _build_top_hits(self):
+        """
+        Initial top-hit lists
+
+        A seed computes distances to every document; its closest neighbors
+        then only search the seed's 2m best candidates (FastTree hit inheritance).
+        """
+        n = self.n_original
+        m = self.top_hits
+        rng = np.random.default_rng(self.seed)
+        done = np.zeros(n, dtype=bool)
+        all_slots = np.arange(n)
+
+        for s in rng.permutation(n):
+            if done[s]:
+                continue
+
+            dist = self._distances(s, all_slots)
+            dist[s] = np.inf
+            n_cand = min(2 * m, n - 1)
+            cand = np.argpartition(dist, n_cand - 1)[:n_cand]
+            cand = cand[np.argsort(dist[cand], kind='stable')]
+
+            self._set_hits(s, cand[:m], dist[cand[:m]])
+            done[s] = True
+
+            # Close neighbors inherit the seed's candidates
+            neighbors = cand[:m][~done[cand[:m]]]
+            if not len(neighbors):
+                continue
+            pool = np.concatenate(([s], cand))
+            delta = 1.0 - self.profiles[neighbors] @ self.profiles[pool].T
+            self.distance_evaluations += delta.size
+            delta[pool[np.newaxis, :] == neighbors[:, np.newaxis]] = np.inf
+            keep = min(m, len(pool) - 1)
+            best = np.argsort(delta, axis=1, kind='stable')[:, :keep]
+            for row, nb in enumerate(neighbors):
+                self._set_hits(nb, pool[best[row]], delta[row, best[row]])
+            done[neighbors] = True
+
+    def _set_hits(self, slot: int, hit_slots: np.ndarray, hit_dist: np.ndarray):
+        """Store a top-hit list for a slot"""
+        count = len(hit_slots)
+        self.hit_nodes[slot, :count] = self.slot_node[hit_slots]
+        self.hit_dist[slot, :count] = hit_dist
+        self.hit_nodes[slot, count:] = -1
+        self.hit_dist[slot, count:] = np.inf
+
+    def _recompute_hits(self, slot: int):
+        """Brute-force top hits for a cluster whose list went stale"""
+        others = np.flatnonzero(self.active)
+        others = others[others != slot]
+        dist = self._distances(slot, others)
+        keep = min(self.top_hits, len(others))
+        best = np.argpartition(dist, keep - 1)[:keep]
+        best = best[np.argsort(dist[best], kind='stable')]
+        self._set_hits(slot, others[best], dist[best])
+
+    def _visible_hits(self, slots: np.ndarray, n: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Best hit of each cluster under the NJ criterion d(i,j) - (r_i + r_j) / (n-2)
+
+        Returns the hit node IDs, their reduced distances and criterion values
+        (inf where a cluster has no live hit).
+        """
+        nodes = self.hit_nodes[slots]
+        hit_slot = np.where(nodes >= 0, self.node_slot[np.maximum(nodes, 0)], -1)
+        live = hit_slot >= 0
+
+        crit = self.hit_dist[slots] - (
+            self.out_distance[slots][:, np.newaxis] + self.out_distance[np.maximum(hit_slot, 0)]
+        ) / (n - 2)
+        crit[~live] = np.inf
+
+        best = np.argmin(crit, axis=1)
+        rows = np.arange(len(slots))
+        return nodes[rows, best], self.hit_dist[slots][rows, best], crit[rows, best]
+
+    def _refresh(self, n: int):
+        """Recompute out-distances and the global list of candidate joins"""
+        self.refreshes += 1
+        slots = np.flatnonzero(self.active)
+
+        for start in range(0, len(slots), DISTANCE_BLOCK_SIZE):
+            block = slots[start:start + DISTANCE_BLOCK_SIZE]
+            self.out_distance[block] = self._compute_out_distances(block)
+
+        best_nodes, best_dist, crit = self._visible_hits(slots, n)
+
+        # Clusters whose whole top-hit list was joined away get a fresh list
+        for slot in slots[~np.isfinite(crit)]:
+            self._recompute_hits(slot)
+        if not np.all(np.isfinite(crit)):
+            best_nodes, best_dist, crit = self._visible_hits(slots, n)
+
+        keep = min(self.top_hits, len(slots))
+        top = np.argpartition(crit, keep - 1)[:keep]
+        self._cand_a = self.slot_node[slots[top]]
+        self._cand_b = best_nodes[top]
+        self._cand_dist = best_dist[top]
+
+    def _select_join(self, n: int) -> Optional[Tuple[int, int]]:
+        """Best live pair in the global candidate list (slots, lower first), or None if none is left"""
+        sa = self.node_slot[self._cand_a]
+        sb = self.node_slot[self._cand_b]
+        live = (sa >= 0) & (sb >= 0)
+        if not np.any(live):
+            return None
+
+        # Out-distances drift with every join, so refresh them for the candidates
+        touched = np.unique(np.concatenate((sa[live], sb[live])))
+        self.out_distance[touched] = self._compute_out_distances(touched)
+
+        crit = self._cand_dist - (
+            self.out_distance[np.maximum(sa, 0)] + self.out_distance[np.maximum(sb, 0)]
+        ) / (n - 2)
+        crit[~live] = np.inf
+        best = int(np.argmin(crit))
+        i, j = int(sa[best]), int(sb[best])
+        return (i, j) if i < j else (j, i)
+
+    def _join(self, i: int, j: int, n: int):
+        """Join clusters in slots i and j into a new cluster stored in slot i"""
+        node_a, node_b = int(self.slot_node[i]), int(self.slot_node[j])
+
+        # Branch lengths from exact out-distances of the two clusters
+        r_i, r_j = self._compute_out_distances(np.array([i, j]))
+        delta_ij = 1.0 - float(self.profiles[i] @ self.profiles[j])
+        self.distance_evaluations += 1
+        d_ij = delta_ij - self.up_distance[i] - self.up_distance[j]
+        v_i, v_j = NeighborJoining._branch_lengths_from_sums(d_ij, r_i, r_j, n)
+
+        new_node_id = self.tree.add_node([node_a, node_b], [v_i, v_j])
+
+        # Candidate hits of the new cluster: the merged lists of its children
+        merged = np.concatenate((self.hit_nodes[i], self.hit_nodes[j]))
+        merged = np.unique(merged[merged >= 0])
+        merged_slots = self.node_slot[merged]
+        merged_slots = merged_slots[(merged_slots >= 0) & (merged_slots != i) & (merged_slots != j)]
+
+        # Profile of the new cluster (average of children) and its up-distance
+        new_profile = 0.5 * (self.profiles[i] + self.profiles[j])
+        self.total_profile += new_profile - self.profiles[i] - self.profiles[j]
+        new_up = 0.5 * delta_ij
+        self.total_up += new_up - self.up_distance[i] - self.up_distance[j]
+
+        self.profiles[i] = new_profile
+        self.up_distance[i] = new_up
+        self.active[j] = False
+        self.n_active -= 1
+        self.node_slot[node_a] = -1
+        self.node_slot[node_b] = -1
+        self.node_slot[new_node_id] = i
+        self.slot_node[i] = new_node_id
+        self.slot_node[j] = -1
+        self.hit_nodes[j] = -1
+        self.hit_dist[j] = np.inf
+
+        if not len(merged_slots):
+            self._recompute_hits(i)
+        else:
+            dist = self._distances(i, merged_slots)
+            keep = min(self.top_hits, len(merged_slots))
+            order = np.argsort(dist, kind='stable')[:keep]
+            self._set_hits(i, merged_slots[order], dist[order])
+
+        # Offer the new cluster to its hits, replacing their worst or stale entry
+        hit_slots = self.node_slot[self.hit_nodes[i][self.hit_nodes[i] >= 0]]
+        hit_d = self.hit_dist[i][:len(hit_slots)]
+        lists = self.hit_nodes[hit_slots]
+        stale = (lists < 0) | (self.node_slot[np.maximum(lists, 0)] < 0)
+        entry_dist = np.where(stale, np.inf, self.hit_dist[hit_slots])
+        worst = np.argmax(entry_dist, axis=1)
+        rows = np.arange(len(hit_slots))
+        replace = hit_d < entry_dist[rows, worst]
+        self.hit_nodes[hit_slots[replace], worst[replace]] = new_node_id
+        self.hit_dist[hit_slots[replace], worst[replace]] = hit_d[replace]
+
+        # The new cluster's best hit becomes a candidate join
+        self.out_distance[i] = self._compute_out_distances(np.array([i]))[0]
+        best_node, best_dist, crit = self._visible_hits(np.array([i]), n - 1)
+        if np.isfinite(crit[0]):
+            self._cand_a = np.append(self._cand_a, new_node_id)
+            self._cand_b = np.append(self._cand_b, best_node[0])
+            self._cand_dist = np.append(self._cand_dist, best_dist[0])
+
+    def _finish_exact(self, slots: np.ndarray) -> int:
+        """Join the remaining clusters with exact NJ on their reduced distances"""
+        P = self.profiles[slots].astype(np.float64)
+        u = self.up_distance[slots]
+        D = 1.0 - P @ P.T - u[:, np.newaxis] - u[np.newaxis, :]
+        D = (D + D.T) / 2
+        np.fill_diagonal(D, 0.0)
+        self.distance_evaluations += len(slots) * (len(slots) - 1) // 2
+
+        nj = NeighborJoining(D, [str(k) for k in range(len(slots))])
+        nj.tree = self.tree
+        nj.active_nodes = self.slot_node[slots].tolist()
+        if self.progress_callback is not None:
+            done, total = self.iterations, self.n_original - 3
+            nj.progress_callback = lambda k, _: self.progress_callback(done + k, total)
+
+        root = nj.run()
+
+        self.iterations += nj.iterations
+        return root
+
+    def run(self) -> int:
+        """
+        Run approximate Neighbor-Joining
+        Returns the index of the root node in self.tree
+        """
+        logger.info(
+            f"Starting approximate NJ with {self.n_original} documents, top-hits m={self.top_hits}"
+        )
+
+        n = self.n_original
+
+        if n > EXACT_TAIL_SIZE:
+            self._build_top_hits()
+            self._refresh(n)
+            since_refresh = 0
+
+            while n > EXACT_TAIL_SIZE:
+                self.iterations += 1
+
+                pair = None if since_refresh >= self.top_hits else self._select_join(n)
+                if pair is None:
+                    self._refresh(n)
+                    since_refresh = 0
+                    pair = self._select_join(n)
+
+                self._join(pair[0], pair[1], n)
+                since_refresh += 1
+                n -= 1
+
+                if self.progress_callback is not None:
+                    self.progress_callback(self.iterations, self.n_original - 3)
+
+        root = self._finish_exact(np.flatnonzero(self.active))
+
+        logger.info(
+            f"Approximate NJ completed: {self.iterations} iterations, "
+            f"{self.distance_evaluations} distance evaluations"
+        )
+
+        return root
+
+    def get_newick(self) -> str:
+        """
+        Get the tree in Newick format
+        Must be called after run()
+        """
+        return self.tree.to_newick()
+
+    def get_statistics(self) -> Dict[str, Any]:
+        """Get algorithm execution statistics"""
+        n = self.n_original
+        return {
+            "algorithm": "approximate_nj",
+            "n_taxa": n,
+            "iterations": self.iterations,
+            "top_hits": self.top_hits,
+            "distance_evaluations": self.distance_evaluations,
+            "distance_evaluations_full": n * (n - 1) // 2,
+            "refreshes": self.refreshes,
+            "complexity": f"O(n·sqrt(n)·d) where n={n}"
+        }
+
+
+def build_approximate_tree(
+    embeddings: np.ndarray,
+    labels: List[str],
+    top_hits: Optional[int] = None,
+    progress_callback: Optional[Callable[[int, int], None]] = None
+) -> Dict[str, Any]:
+    """
+    Convenience function to build a tree with approximate Neighbor-Joining
+
+    Args:
+        embeddings: Embedding matrix (n x d); cosine distances are used
+        labels: List of labels for documents
+        top_hits: Length of the top-hit lists (default sqrt(n))
+        progress_callback: Called as (iterations_done, iterations_total) after each join
+
+    Returns:
+        Dictionary containing tree structure and metadata, as build_nj_tree
+    """
+    nj = ApproximateNeighborJoining(embeddings, labels, top_hits=top_hits)
+    nj.progress_callback = progress_callback
+    nj.run()
+
+    return {
+        "tree": nj.tree,
+        "newick": nj.get_newick(),
+        "statistics": nj.get_statistics()
+    }
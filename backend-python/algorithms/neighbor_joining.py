@@ -6,50 +6,19 @@ Optimized with NumPy for performance on large matrices
 
 import numpy as np
 import logging
-from typing import List, Dict, Tuple, Optional, Any
-from dataclasses import dataclass
-import json
+from typing import List, Dict, Tuple, Optional, Any, Callable
 
-logger = logging.getLogger(__name__)
-
-@dataclass
-class TreeNode:
-    """Represents a node in the phylogenetic tree"""
-    id: str
-    label: str
-    distance_to_parent: float = 0.0
-    children: List['TreeNode'] = None
-    is_leaf: bool = True
-
-    def __post_init__(self):
-        if self.children is None:
-            self.children = []
-
-    def to_dict(self) -> Dict:
-        """Convert node to dictionary representation"""
-        result = {
-            'id': self.id,
-            'label': self.label,
-            'distance': self.distance_to_parent,
-            'is_leaf': self.is_leaf
-        }
-        if self.children:
-            result['children'] = [child.to_dict() for child in self.children]
-        return result
-
-    def to_newick(self) -> str:
-        """Convert subtree to Newick format"""
-        if self.is_leaf:
-            return f"{self.label}:{self.distance_to_parent:.6f}"
-        else:
-            children_str = ",".join([child.to_newick() for child in self.children])
-            return f"({children_str}):{self.distance_to_parent:.6f}"
+from .tree_store import TreeStore
 
+logger = logging.getLogger(__name__)
 
 class NeighborJoining:
     """
     Neighbor-Joining algorithm implementation for phylogenetic tree reconstruction
     Complexity: O(n³) where n is the number of taxa
+
+    Each iteration is vectorized with NumPy and works on a single preallocated
+    distance buffer that is compacted in place, so memory stays at O(n²).
     """
 
     def __init__(self, distance_matrix: np.ndarray, labels: List[str]):
@@ -64,26 +33,41 @@ class NeighborJoining:
         self.labels = labels.copy()
         self.n_original = len(labels)
 
-        # Working copies
+        # Working buffer: the active taxa always occupy its leading (n x n) block,
+        # which is compacted in place after every join (see update_distance_matrix)
         self.distance_matrix = self.original_matrix.copy()
         self.current_labels = labels.copy()
-        self.nodes = {}  # Store all nodes by ID
-        self.next_node_id = self.n_original
 
-        # Initialize leaf nodes
-        for i, label in enumerate(labels):
-            self.nodes[str(i)] = TreeNode(id=str(i), label=label, is_leaf=True)
+        # Tree under construction; leaves are nodes 0..n-1 and each join adds one
+        self.tree = TreeStore(labels)
+        self.active_nodes = list(range(self.n_original))  # Node held by each matrix row
+
+        # Scratch space reused by every iteration (allocated once in run)
+        self._q_buffer: Optional[np.ndarray] = None
+        self._mask_buffer: Optional[np.ndarray] = None
+        self._index = np.arange(self.n_original)
 
         # Track computation statistics
         self.iterations = 0
         self.total_operations = 0
 
-    def calculate_q_matrix(self, dist_matrix: np.ndarray, n: int) -> np.ndarray:
+        # Optional progress_callback(iterations_done, iterations_total), called
+        # after every join; it may raise to abort the run
+        self.progress_callback: Optional[Callable[[int, int], None]] = None
+
+    def calculate_q_matrix(
+        self,
+        dist_matrix: np.ndarray,
+        n: int,
+        out: Optional[np.ndarray] = None
+    ) -> np.ndarray:
         """
         Calculate the Q matrix (also known as S matrix in some literature)
         Q(i,j) = (n-2) * D(i,j) - sum(D(i,k)) - sum(D(j,k))
 
-        This is the core of the NJ algorithm that adjusts distances
+        This is the core of the NJ algorithm that adjusts distances.
+        Computed with broadcasting, optionally into a preallocated (n x n) array.
+        Only the upper triangle is meaningful; find_minimum_q masks the rest.
         """
         if n <= 2:
             return dist_matrix
@@ -91,28 +75,36 @@ class NeighborJoining:
         # Calculate row sums efficiently using NumPy
         row_sums = np.sum(dist_matrix, axis=1)
 
-        # Create Q matrix using broadcasting
-        q_matrix = np.zeros_like(dist_matrix)
+        if out is None:
+            out = np.empty((n, n), dtype=np.float64)
+
+        # Same operation order as the scalar formula, so values match exactly
+        np.multiply(dist_matrix, n - 2, out=out)
+        np.subtract(out, row_sums[:, np.newaxis], out=out)
+        np.subtract(out, row_sums[np.newaxis, :], out=out)
 
-        for i in range(n):
-            for j in range(i + 1, n):
-                q_value = (n - 2) * dist_matrix[i, j] - row_sums[i] - row_sums[j]
-                q_matrix[i, j] = q_value
-                q_matrix[j, i] = q_value
-                self.total_operations += 3  # Count operations
+        self.total_operations += 3 * (n * (n - 1) // 2)  # Count operations
 
-        return q_matrix
+        return out
 
     def find_minimum_q(self, q_matrix: np.ndarray, n: int) -> Tuple[int, int]:
         """
         Find the indices of the minimum value in Q matrix
         Returns the pair of taxa to be joined
+
+        The diagonal and lower triangle are excluded, so ties resolve to the
+        first pair (i < j) in row-major order.
         """
-        # Set diagonal to infinity to exclude it
-        np.fill_diagonal(q_matrix, np.inf)
+        # Mask diagonal and lower triangle with infinity
+        if self._mask_buffer is not None and n <= self.n_original:
+            lower = self._mask_buffer[:n * n].reshape(n, n)
+            np.greater_equal.outer(self._index[:n], self._index[:n], out=lower)
+        else:
+            lower = np.tri(n, dtype=bool)
+        np.copyto(q_matrix, np.inf, where=lower)
 
         # Find minimum value
-        min_idx = np.argmin(q_matrix)
+        min_idx = int(np.argmin(q_matrix))
         min_i, min_j = divmod(min_idx, n)
 
         # Ensure i < j for consistency
@@ -138,7 +130,11 @@ class NeighborJoining:
         sum_i = np.sum(dist_matrix[i, :])
         sum_j = np.sum(dist_matrix[j, :])
 
-        # Calculate branch lengths
+        return self._branch_lengths_from_sums(d_ij, sum_i, sum_j, n)
+
+    @staticmethod
+    def _branch_lengths_from_sums(d_ij: float, sum_i: float, sum_j: float, n: int) -> Tuple[float, float]:
+        """Branch lengths to i and j given D(i,j) and the row sums of i and j"""
         v_i = 0.5 * d_ij + (sum_i - sum_j) / (2 * (n - 2))
         v_j = d_ij - v_i
 
@@ -154,61 +150,57 @@ class NeighborJoining:
         The new node replaces node i, and node j is removed
 
         New distance from k to new node u: D(k,u) = 0.5 * [D(k,i) + D(k,j) - D(i,j)]
-        """
-        # Create new matrix with one less row/column
-        new_matrix = np.zeros((n-1, n-1), dtype=np.float64)
 
-        # Indices for the new matrix
-        old_to_new = {}
-        new_idx = 0
-
-        for old_idx in range(n):
-            if old_idx != j:  # Skip j as it's being merged
-                old_to_new[old_idx] = new_idx
-                new_idx += 1
-
-        # Copy distances, updating for the new node
-        for old_i in range(n):
-            if old_i == j:
-                continue
+        The update is done in place: dist_matrix is a C-contiguous buffer whose
+        leading (n x n) block holds the active taxa. Row and column j are removed
+        by shifting the trailing data forward, so no new matrix is allocated.
+        Returns a view of the leading (n-1 x n-1) block.
+        """
+        buffer = dist_matrix
+        stride = buffer.shape[1]
+        flat = buffer.reshape(-1)
 
-            for old_j in range(old_i + 1, n):
-                if old_j == j:
-                    continue
+        # Distances from the merged node, for the taxa after i (entry j is discarded below)
+        d_ij = buffer[i, j]
+        buffer[i, i + 1:n] = 0.5 * (buffer[i, i + 1:n] + buffer[j, i + 1:n] - d_ij)
+        buffer[i + 1:n, i] = buffer[i, i + 1:n]
 
-                new_i = old_to_new[old_i]
-                new_j = old_to_new[old_j]
+        # Drop row j: shift the following rows up (1-D forward copy, no temporary)
+        flat[j * stride:(n - 1) * stride] = flat[(j + 1) * stride:n * stride]
 
-                if old_i == i:
-                    # Calculate new distance for the merged node
-                    # D(u,k) = 0.5 * [D(i,k) + D(j,k) - D(i,j)]
-                    new_dist = 0.5 * (dist_matrix[i, old_j] + dist_matrix[j, old_j] - dist_matrix[i, j])
-                else:
-                    # Copy existing distance
-                    new_dist = dist_matrix[old_i, old_j]
+        # Columns past j in rows before j come from the symmetric rows after j
+        buffer[:j, j:n - 1] = buffer[j:n - 1, :j].T
 
-                new_matrix[new_i, new_j] = new_dist
-                new_matrix[new_j, new_i] = new_dist
+        # Shift rows j.. left by one to drop column j; this also shifts their
+        # leading columns, which are then restored from the symmetric block above
+        flat[j * stride + j:(n - 2) * stride + n - 1] = flat[j * stride + j + 1:(n - 2) * stride + n]
+        buffer[j:n - 1, :j] = buffer[:j, j:n - 1].T
 
-        return new_matrix
+        return buffer[:n - 1, :n - 1]
 
-    def run(self) -> TreeNode:
+    def run(self) -> int:
         """
         Run the complete Neighbor-Joining algorithm
-        Returns the root node of the constructed tree
+        Returns the index of the root node in self.tree
         """
         logger.info(f"Starting NJ algorithm with {self.n_original} taxa")
 
         n = self.n_original
-        current_matrix = self.distance_matrix.copy()
-        active_nodes = list(self.nodes.keys())  # Track active node IDs
+        current_matrix = self.distance_matrix
+        active_nodes = list(self.active_nodes)  # Track active node IDs
+
+        if self._q_buffer is None:
+            self._q_buffer = np.empty(n * n, dtype=np.float64)
+            self._mask_buffer = np.empty(n * n, dtype=bool)
 
         while n > 3:
             self.iterations += 1
             logger.debug(f"Iteration {self.iterations}, n={n}")
 
             # Step 1: Calculate Q matrix
-            q_matrix = self.calculate_q_matrix(current_matrix, n)
+            q_matrix = self.calculate_q_matrix(
+                current_matrix, n, out=self._q_buffer[:n * n].reshape(n, n)
+            )
 
             # Step 2: Find minimum Q value (nodes to join)
             i, j = self.find_minimum_q(q_matrix, n)
@@ -217,32 +209,17 @@ class NeighborJoining:
             v_i, v_j = self.calculate_branch_lengths(current_matrix, i, j, n)
 
             # Step 4: Create new internal node
-            new_node_id = str(self.next_node_id)
-            self.next_node_id += 1
-
-            node_i = self.nodes[active_nodes[i]]
-            node_j = self.nodes[active_nodes[j]]
-
-            node_i.distance_to_parent = v_i
-            node_j.distance_to_parent = v_j
-
-            new_node = TreeNode(
-                id=new_node_id,
-                label=f"Node_{new_node_id}",
-                is_leaf=False,
-                children=[node_i, node_j]
-            )
-
-            self.nodes[new_node_id] = new_node
+            new_node_id = self._join_nodes(active_nodes[i], active_nodes[j], v_i, v_j)
 
             # Step 5: Update distance matrix
-            current_matrix = self.update_distance_matrix(current_matrix, i, j, n)
+            current_matrix = self.update_distance_matrix(self.distance_matrix, i, j, n)
 
             # Update active nodes list
             active_nodes[i] = new_node_id  # Replace i with new node
             del active_nodes[j]  # Remove j
 
             n -= 1
+            self._report_progress()
 
         # Final step: Connect remaining 3 nodes
         root = self._connect_final_nodes(current_matrix, active_nodes)
@@ -251,7 +228,18 @@ class NeighborJoining:
 
         return root
 
-    def _connect_final_nodes(self, dist_matrix: np.ndarray, active_nodes: List[str]) -> TreeNode:
+    def _report_progress(self):
+        if self.progress_callback is not None:
+            self.progress_callback(self.iterations, max(self.n_original - 3, 0))
+
+    def _join_nodes(self, node_i: int, node_j: int, v_i: float, v_j: float) -> int:
+        """
+        Create a new internal node with children node_i and node_j
+        Returns the index of the new node
+        """
+        return self.tree.add_node([node_i, node_j], [v_i, v_j])
+
+    def _connect_final_nodes(self, dist_matrix: np.ndarray, active_nodes: List[int]) -> int:
         """
         Connect the final 3 nodes to create the root of the tree
         Uses the three-point formula to calculate branch lengths
@@ -259,9 +247,6 @@ class NeighborJoining:
         if len(active_nodes) != 3:
             raise ValueError(f"Expected 3 nodes, got {len(active_nodes)}")
 
-        # Get the three remaining nodes
-        nodes = [self.nodes[node_id] for node_id in active_nodes]
-
         # Calculate branch lengths using three-point formula
         # For nodes A, B, C:
         # d_A = 0.5 * [D(A,B) + D(A,C) - D(B,C)]
@@ -272,33 +257,21 @@ class NeighborJoining:
         d_02 = dist_matrix[0, 2]
         d_12 = dist_matrix[1, 2]
 
-        nodes[0].distance_to_parent = max(0.0, 0.5 * (d_01 + d_02 - d_12))
-        nodes[1].distance_to_parent = max(0.0, 0.5 * (d_01 + d_12 - d_02))
-        nodes[2].distance_to_parent = max(0.0, 0.5 * (d_02 + d_12 - d_01))
+        lengths = [
+            max(0.0, 0.5 * (d_01 + d_02 - d_12)),
+            max(0.0, 0.5 * (d_01 + d_12 - d_02)),
+            max(0.0, 0.5 * (d_02 + d_12 - d_01))
+        ]
 
         # Create root node
-        root = TreeNode(
-            id="root",
-            label="root",
-            is_leaf=False,
-            children=nodes,
-            distance_to_parent=0.0
-        )
-
-        return root
+        return self.tree.set_root(active_nodes, lengths)
 
     def get_newick(self) -> str:
         """
         Get the tree in Newick format
         Must be called after run()
         """
-        if "root" not in self.nodes:
-            raise ValueError("Tree not yet constructed. Call run() first.")
-
-        root = self.nodes["root"]
-        # Build Newick string from children
-        children_str = ",".join([child.to_newick() for child in root.children])
-        return f"({children_str});"
+        return self.tree.to_newick()
 
     def get_statistics(self) -> Dict[str, Any]:
         """Get algorithm execution statistics"""
@@ -311,17 +284,32 @@ class NeighborJoining:
         }
 
 
-def build_nj_tree(distance_matrix: List[List[float]], labels: List[str]) -> Dict[str, Any]:
+def build_nj_tree(
+    distance_matrix: List[List[float]],
+    labels: List[str],
+    algorithm: str = "neighbor_joining",
+    progress_callback: Optional[Callable[[int, int], None]] = None
+) -> Dict[str, Any]:
     """
     Convenience function to build a tree using Neighbor-Joining
 
     Args:
         distance_matrix: Distance matrix as list of lists
         labels: List of labels for taxa
+        algorithm: 'neighbor_joining' (classic search) or 'rapid_nj' (bounded search)
+        progress_callback: Called as (iterations_done, iterations_total) after each join
 
     Returns:
-        Dictionary containing tree structure and metadata
+        Dictionary with the tree (TreeStore), its Newick string and statistics
     """
+    if algorithm == "neighbor_joining":
+        engine = NeighborJoining
+    elif algorithm == "rapid_nj":
+        from .rapid_nj import RapidNeighborJoining
+        engine = RapidNeighborJoining
+    else:
+        raise ValueError(f"Unsupported tree algorithm: {algorithm}")
+
     # Convert to numpy array
     dist_array = np.array(distance_matrix, dtype=np.float64)
 
@@ -338,14 +326,12 @@ def build_nj_tree(distance_matrix: List[List[float]], labels: List[str]) -> Dict
         dist_array = (dist_array + dist_array.T) / 2
 
     # Run NJ algorithm
-    nj = NeighborJoining(dist_array, labels)
-    root = nj.run()
-
-    # Store the root in the nodes dictionary for get_newick to work
-    nj.nodes["root"] = root
+    nj = engine(dist_array, labels)
+    nj.progress_callback = progress_callback
+    nj.run()
 
     return {
-        "tree": root.to_dict(),
+        "tree": nj.tree,
         "newick": nj.get_newick(),
         "statistics": nj.get_statistics()
     }
\ No newline at end of file
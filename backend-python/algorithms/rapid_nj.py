@@ -0,0 +1,242 @@
+"""
+RapidNJ-style Neighbor-Joining
+Exact NJ search using sorted distance rows and upper-bound pruning
+(Simonsen, Mailund and Pedersen, 2008)
+"""
+
+import numpy as np
+import logging
+from typing import List, Dict, Tuple, Any
+
+from .neighbor_joining import NeighborJoining
+
+logger = logging.getLogger(__name__)
+
+# Rows are sorted in blocks of this many taxa to bound temporary memory
+SORT_BLOCK_SIZE = 1024
+
+# Below this many clusters row sums are recomputed exactly every iteration.
+# Q values tie systematically at the end (e.g. complementary pairs when four
+# clusters remain), and exact sums break those ties like the classic engine.
+EXACT_ROW_SUMS_BELOW = 256
+
+# Relative slack on the pruning bound, so rounding never hides an exact tie
+BOUND_TOLERANCE = 1e-12
+
+
+class RapidNeighborJoining(NeighborJoining):
+    """
+    Neighbor-Joining with a bounded search for the minimum Q value
+
+    Every cluster keeps its distances to older clusters sorted in increasing
+    order. Since Q(i,j) >= (n-2) * D(i,j) - r_i - r_max, a row can be abandoned
+    as soon as this bound exceeds the best Q found so far, so most Q values
+    are never evaluated. The joins are the same as in the classic engine.
+
+    Rows are scanned column by column for all clusters at once, which keeps
+    the search vectorized. Entries pointing to joined clusters are skipped
+    lazily and purged whenever the number of active clusters halves.
+    """
+
+    def __init__(self, distance_matrix: np.ndarray, labels: List[str]):
+        """
+        Initialize RapidNJ with distance matrix and labels
+
+        Args:
+            distance_matrix: Symmetric distance matrix (n x n)
+            labels: List of labels for each taxon
+        """
+        super().__init__(distance_matrix, labels)
+
+        n = self.n_original
+
+        # Sorted rows: distances (padded with inf) and the matching slots
+        self._sorted_dist = np.full((n, n), np.inf, dtype=np.float64)
+        self._sorted_index = np.zeros((n, n), dtype=np.int32)
+        self._row_length = np.zeros(n, dtype=np.int64)
+
+        # Slot bookkeeping: a joined cluster takes the slot of its lower child
+        self._active = np.ones(n, dtype=bool)
+        self._birth = np.arange(n, dtype=np.int64)
+        self._next_birth = n
+        self._row_sums = np.zeros(n, dtype=np.float64)
+
+        self.q_evaluations = 0
+        self.q_evaluations_full = 0
+        self.rebuilds = 0
+
+    def _rebuild_rows(self, slots: np.ndarray):
+        """
+        Re-sort the rows of all active clusters and drop stale entries
+
+        Row a holds the clusters created before a, so each pair is stored once.
+        Row sums are recomputed exactly at the same time.
+        """
+        D = self.distance_matrix
+        m = len(slots)
+        birth = self._birth[slots]
+
+        for start in range(0, m, SORT_BLOCK_SIZE):
+            block = slots[start:start + SORT_BLOCK_SIZE]
+            sub = D[np.ix_(block, slots)]
+
+            self._row_sums[block] = np.sum(sub, axis=1)
+
+            older = birth[np.newaxis, :] < self._birth[block][:, np.newaxis]
+            sub[~older] = np.inf
+            order = np.argsort(sub, axis=1, kind='stable')
+
+            self._sorted_dist[block, :m] = np.take_along_axis(sub, order, axis=1)
+            self._sorted_dist[block, m:] = np.inf
+            self._sorted_index[block, :m] = slots[order]
+            self._row_length[block] = older.sum(axis=1)
+
+        self.rebuilds += 1
+
+    def _build_row(self, slot: int, slots: np.ndarray):
+        """Create the sorted row of a newly joined cluster"""
+        others = slots[slots != slot]
+        distances = self.distance_matrix[slot, others]
+        order = np.argsort(distances, kind='stable')
+        count = len(others)
+
+        self._sorted_dist[slot, :count] = distances[order]
+        self._sorted_dist[slot, count:self._row_length[slot]] = np.inf
+        self._sorted_index[slot, :count] = others[order]
+        self._row_length[slot] = count
+
+    def _search_pair(self, slots: np.ndarray, n: int) -> Tuple[int, int]:
+        """
+        Find the pair with minimum Q among the active clusters
+
+        Ties resolve to the lowest (i, j) slot pair, matching the row-major
+        order of the classic engine.
+        """
+        r = self._row_sums
+        r_max = np.max(r[slots])
+        scale = n - 2
+
+        rows = slots[self._row_length[slots] > 0]
+        best_q = np.inf
+        best_pair = None
+        depth = 0
+
+        while rows.size and depth < self.n_original:
+            d = self._sorted_dist[rows, depth]
+
+            # Abandon rows whose lower bound already exceeds the best Q
+            limit = best_q + BOUND_TOLERANCE * (abs(best_q) + 1.0)
+            keep = np.isfinite(d) & (scale * d - r[rows] - r_max <= limit)
+            rows = rows[keep]
+            if not rows.size:
+                break
+            d = d[keep]
+
+            cols = self._sorted_index[rows, depth]
+            valid = self._active[cols] & (self._birth[cols] < self._birth[rows])
+
+            if np.any(valid):
+                lo = np.minimum(rows, cols)[valid]
+                hi = np.maximum(rows, cols)[valid]
+                q = scale * d[valid] - r[lo] - r[hi]
+                self.q_evaluations += len(q)
+                self.total_operations += 3 * len(q)
+
+                q_step = np.min(q)
+                if q_step <= best_q:
+                    ties = np.flatnonzero(q == q_step)
+                    first = ties[np.lexsort((hi[ties], lo[ties]))[0]]
+                    pair = (int(lo[first]), int(hi[first]))
+                    if q_step < best_q or pair < best_pair:
+                        best_q = q_step
+                        best_pair = pair
+
+            depth += 1
+
+        return best_pair
+
+    def run(self) -> int:
+        """
+        Run Neighbor-Joining with the bounded search
+        Returns the index of the root node in self.tree
+        """
+        logger.info(f"Starting RapidNJ algorithm with {self.n_original} taxa")
+
+        D = self.distance_matrix
+        n = self.n_original
+        slot_nodes = list(self.active_nodes)  # Node currently held by each slot
+        slots = np.arange(n)
+
+        rebuilt_at = n
+        if n > 3:
+            self._rebuild_rows(slots)
+
+        while n > 3:
+            self.iterations += 1
+            self.q_evaluations_full += n * (n - 1) // 2
+            logger.debug(f"Iteration {self.iterations}, n={n}")
+
+            if n <= rebuilt_at // 2:
+                self._rebuild_rows(slots)
+                rebuilt_at = n
+            elif n <= EXACT_ROW_SUMS_BELOW:
+                self._row_sums[slots] = np.sum(D[np.ix_(slots, slots)], axis=1)
+
+            # Step 1-2: Bounded search for the pair to join
+            i, j = self._search_pair(slots, n)
+
+            # Step 3: Calculate branch lengths
+            sum_i = np.sum(D[i, slots])
+            sum_j = np.sum(D[j, slots])
+            v_i, v_j = self._branch_lengths_from_sums(D[i, j], sum_i, sum_j, n)
+
+            # Step 4: Create new internal node in the slot of i
+            slot_nodes[i] = self._join_nodes(slot_nodes[i], slot_nodes[j], v_i, v_j)
+
+            # Step 5: Update distances, following the classic recurrence
+            others = slots[(slots != i) & (slots != j)]
+            old_i = D[others, i]
+            old_j = D[others, j]
+
+            later = slots[slots > i]
+            D[i, later] = 0.5 * (D[i, later] + D[j, later] - D[i, j])
+            D[later, i] = D[i, later]
+
+            self._active[j] = False
+            self._row_length[j] = 0
+            slots = slots[slots != j]
+
+            # Step 6: Update row sums and the sorted row of the new cluster
+            self._row_sums[others] += D[others, i] - old_i - old_j
+            self._row_sums[i] = np.sum(D[i, slots])
+
+            self._birth[i] = self._next_birth
+            self._next_birth += 1
+            self._build_row(i, slots)
+
+            n -= 1
+            self._report_progress()
+
+        # Final step: Connect remaining 3 nodes
+        root = self._connect_final_nodes(D[np.ix_(slots, slots)], [slot_nodes[s] for s in slots])
+
+        logger.info(
+            f"RapidNJ completed: {self.iterations} iterations, "
+            f"{self.q_evaluations} of {self.q_evaluations_full} Q values evaluated"
+        )
+
+        return root
+
+    def get_statistics(self) -> Dict[str, Any]:
+        """Get algorithm execution statistics"""
+        stats = super().get_statistics()
+        stats.update({
+            "algorithm": "rapid_nj",
+            "q_evaluations": self.q_evaluations,
+            "q_evaluations_full": self.q_evaluations_full,
+            "q_evaluation_ratio": (
+                self.q_evaluations / self.q_evaluations_full if self.q_evaluations_full else 0.0
+            ),
+            "row_rebuilds": self.rebuilds
+        })
+        return stats
@@ -0,0 +1,185 @@
+"""
+Compact array-backed storage for phylogenetic trees
+Nodes live in NumPy arrays and are serialized iteratively, so trees of any
+depth (e.g. caterpillar-shaped NJ trees) never hit Python's recursion limit
+"""
+
+import json
+import numpy as np
+from typing import List, Dict, Sequence, Any
+
+
+class TreeStore:
+    """
+    Rooted tree stored as flat arrays
+
+    Leaves take indices 0..n-1 in label order and internal nodes are numbered
+    in creation order from n, which matches the node IDs of the NJ engines.
+    Each node costs a parent index, a branch length and a child entry, plus an
+    offset per internal node (about 20 bytes). Children of internal node k are
+    child_index[child_offsets[k - n]:child_offsets[k - n + 1]].
+    """
+
+    def __init__(self, labels: List[str]):
+        """
+        Initialize a tree holding only the leaves
+
+        Args:
+            labels: List of leaf labels
+        """
+        self.labels = list(labels)
+        self.n_leaves = len(self.labels)
+
+        # An unrooted binary tree closed by a three-way root has 2n - 2 nodes
+        capacity = max(2 * self.n_leaves - 2, self.n_leaves + 1)
+
+        self.parent = np.full(capacity, -1, dtype=np.int32)
+        self.branch_length = np.zeros(capacity, dtype=np.float64)
+        self.child_index = np.zeros(capacity - 1, dtype=np.int32)
+        self.child_offsets = np.zeros(capacity - self.n_leaves + 1, dtype=np.int64)
+
+        self.n_nodes = self.n_leaves
+        self.root = -1
+
+    def add_node(self, children: Sequence[int], lengths: Sequence[float]) -> int:
+        """
+        Create an internal node above the given children
+
+        Args:
+            children: Indices of the child nodes, in output order
+            lengths: Branch length from each child to the new node
+
+        Returns:
+            Index of the new node
+        """
+        node = self.n_nodes
+        if node >= len(self.parent):
+            raise ValueError("Tree capacity exceeded")
+
+        k = node - self.n_leaves
+        start = self.child_offsets[k]
+        end = start + len(children)
+
+        self.child_index[start:end] = children
+        self.child_offsets[k + 1] = end
+        self.parent[children] = node
+        self.branch_length[children] = lengths
+
+        self.n_nodes += 1
+        return node
+
+    def set_root(self, children: Sequence[int], lengths: Sequence[float]) -> int:
+        """Create the root node above the given children"""
+        self.root = self.add_node(children, lengths)
+        return self.root
+
+    def is_leaf(self, node: int) -> bool:
+        return node < self.n_leaves
+
+    def children(self, node: int) -> np.ndarray:
+        """Indices of the children of a node (empty for leaves)"""
+        if node < self.n_leaves:
+            return self.child_index[:0]
+        k = node - self.n_leaves
+        return self.child_index[self.child_offsets[k]:self.child_offsets[k + 1]]
+
+    def node_id(self, node: int) -> str:
+        return "root" if node == self.root else str(node)
+
+    def node_label(self, node: int) -> str:
+        if node < self.n_leaves:
+            return self.labels[node]
+        return "root" if node == self.root else f"Node_{node}"
+
+    @property
+    def nbytes(self) -> int:
+        """Memory used by the node arrays"""
+        return (self.parent.nbytes + self.branch_length.nbytes +
+                self.child_index.nbytes + self.child_offsets.nbytes)
+
+    def _check_root(self):
+        if self.root < 0:
+            raise ValueError("Tree not yet constructed. Call run() first.")
+
+    def to_newick(self) -> str:
+        """Convert the tree to Newick format"""
+        self._check_root()
+
+        lengths = self.branch_length
+        parts = []
+
+        # Pending work: node indices to open, or literal text to emit
+        stack: List[Any] = [self.root]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, str):
+                parts.append(item)
+            elif item < self.n_leaves:
+                parts.append(f"{self.labels[item]}:{lengths[item]:.6f}")
+            else:
+                parts.append("(")
+                stack.append(");" if item == self.root else f"):{lengths[item]:.6f}")
+                children = self.children(item).tolist()
+                for position in range(len(children) - 1, -1, -1):
+                    stack.append(children[position])
+                    if position:
+                        stack.append(",")
+
+        return "".join(parts)
+
+    def _node_fields(self, node: int) -> Dict[str, Any]:
+        return {
+            'id': self.node_id(node),
+            'label': self.node_label(node),
+            'distance': float(self.branch_length[node]) if node != self.root else 0.0,
+            'is_leaf': node < self.n_leaves
+        }
+
+    def to_dict(self) -> Dict:
+        """Convert the tree to nested dictionary representation"""
+        self._check_root()
+
+        root = self._node_fields(self.root)
+        stack = [(self.root, root)]
+        while stack:
+            node, result = stack.pop()
+            children = self.children(node).tolist()
+            if not children:
+                continue
+            result['children'] = []
+            for child in children:
+                child_dict = self._node_fields(child)
+                result['children'].append(child_dict)
+                stack.append((child, child_dict))
+
+        return root
+
+    def to_json(self) -> str:
+        """
+        Serialize the nested dictionary representation to a JSON string
+        Equivalent to json.dumps(self.to_dict()) but safe for any depth
+        """
+        self._check_root()
+
+        parts = []
+        stack: List[Any] = [self.root]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, str):
+                parts.append(item)
+                continue
+
+            fields = json.dumps(self._node_fields(item))[:-1]
+            children = self.children(item).tolist()
+            if not children:
+                parts.append(fields + "}")
+                continue
+
+            parts.append(fields + ', "children": [')
+            stack.append("]}")
+            for position in range(len(children) - 1, -1, -1):
+                stack.append(children[position])
+                if position:
+                    stack.append(", ")
+
+        return "".join(parts)
@@ -0,0 +1,586 @@
+"""
+Approximate nearest-neighbor index over document embeddings
+An IVF (inverted file) index in pure NumPy: documents are bucketed by their
+nearest k-means centroid and a query only scans the few closest buckets.
+Buckets hold raw float32 vectors (IVF-flat) or product-quantized residual
+codes (IVF-PQ), grow in place on inserts and are persisted as one .npz file
+"""
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+import logging
+
+from app.distance_engine import normalize_rows
+
+logger = logging.getLogger(__name__)
+
+# Training points per centroid below which k-means is unreliable
+MIN_POINTS_PER_LIST = 39
+
+# Centroids per product-quantization codebook (codes fit in uint8)
+PQ_CENTROIDS = 256
+
+# Seconds between full saves of a persisted document index
+SAVE_INTERVAL = 30.0
+
+# Training vectors sampled for k-means
+MAX_TRAINING_POINTS = 65536
+
+# Flat indexes are retrained once they grow this many times past their training set
+RETRAIN_GROWTH = 4
+
+
+def default_n_lists(n: int) -> int:
+    """About 4 sqrt(n) lists, with enough points per list to train on"""
+    return int(max(1, min(4 * np.sqrt(n), n // MIN_POINTS_PER_LIST)))
+
+
+def kmeans(x: np.ndarray, k: int, iterations: int = 10, seed: int = 0, chunk_rows: int = 8192) -> np.ndarray:
+    """
+    Lloyd's k-means with squared euclidean distances
+
+    Args:
+        x: (n x d) float32 training points
+        k: Number of centroids (at most n)
+        iterations: Lloyd iterations
+        seed: Seed of the initial centroid sample
+        chunk_rows: Rows assigned per step, bounding the (rows x k) temporaries
+
+    Returns:
+        (k x d) float32 centroids
+    """
+    rng = np.random.default_rng(seed)
+    k = min(k, len(x))
+    centroids = x[rng.choice(len(x), size=k, replace=False)].copy()
+
+    for _ in range(iterations):
+        assignment = assign(x, centroids, chunk_rows)
+        counts = np.bincount(assignment, minlength=k)
+        empty = counts == 0
+
+        # Sum the points of each cluster over contiguous runs of the sorted assignment
+        order = np.argsort(assignment, kind="stable")
+        starts = (np.cumsum(counts) - counts)[~empty]
+        sums = np.add.reduceat(x[order], starts, axis=0, dtype=np.float64)
+        centroids[~empty] = (sums / counts[~empty, None]).astype(np.float32)
+        if empty.any():
+            # Restart empty clusters from random points
+            centroids[empty] = x[rng.choice(len(x), size=int(empty.sum()), replace=False)]
+
+    return centroids
+
+
+def assign(x: np.ndarray, centroids: np.ndarray, chunk_rows: int = 8192) -> np.ndarray:
+    """Index of the nearest centroid (squared euclidean) of every row"""
+    centroid_norms = np.einsum("ij,ij->i", centroids, centroids)
+    result = np.empty(len(x), dtype=np.int64)
+    for start in range(0, len(x), chunk_rows):
+        block = x[start:start + chunk_rows]
+        scores = block @ centroids.T
+        scores *= -2.0
+        scores += centroid_norms
+        result[start:start + chunk_rows] = scores.argmin(axis=1)
+    return result
+
+
+class IVFIndex:
+    """
+    Inverted-file index for cosine distance
+
+    Vectors are unit-normalized on insert. Each list keeps its rows in
+    arrays with spare capacity, so inserts are amortized O(1) and searches
+    scan list prefixes without copying. Inserting a known ID replaces its
+    vector (swap-remove from its old list).
+
+    Until enough vectors for training have arrived (see min_training_points)
+    they are buffered raw in a single list that is searched exactly, so a
+    small first insert never fixes the centroids and codebooks.
+    """
+
+    def __init__(self, dim: int, n_lists: int = 0, pq_subvectors: int = 0, n_probe: int = 8, seed: int = 0):
+        """
+        Initialize an empty, untrained index
+
+        Args:
+            dim: Embedding dimension
+            n_lists: Number of inverted lists (0 sizes it from the first training set)
+            pq_subvectors: Product-quantization subvectors per code (0 stores raw vectors)
+            n_probe: Lists scanned per query by default
+            seed: Seed of the k-means initialization
+        """
+        if pq_subvectors and dim % pq_subvectors:
+            raise ValueError(f"Dimension {dim} is not divisible by {pq_subvectors} PQ subvectors")
+
+        self.dim = dim
+        self.n_lists = n_lists
+        self.pq_subvectors = pq_subvectors
+        self.n_probe = n_probe
+        self.seed = seed
+
+        self.centroids: Optional[np.ndarray] = None
+        self.codebooks: Optional[np.ndarray] = None
+        self.trained_size = 0
+
+        self.ids: List[str] = []
+        self._labels_by_id: Dict[str, int] = {}
+        # Position of each label: (list, row)
+        self._positions: Dict[int, Tuple[int, int]] = {}
+
+        # Untrained: one list of raw vectors
+        self._data: List[np.ndarray] = [np.empty((0, dim), dtype=np.float32)]
+        self._labels: List[np.ndarray] = [np.empty(0, dtype=np.int64)]
+        self._counts: List[int] = [0]
+
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._labels_by_id
+
+    @property
+    def min_training_points(self) -> int:
+        """Vectors buffered before training: enough for every coarse list and PQ codebook entry"""
+        clusters = max(self.n_lists, PQ_CENTROIDS if self.pq_subvectors else 1)
+        return MIN_POINTS_PER_LIST * clusters
+
+    @property
+    def _row_shape(self) -> Tuple[Tuple[int, ...], np.dtype]:
+        if self.pq_subvectors:
+            return (self.pq_subvectors,), np.dtype(np.uint8)
+        return (self.dim,), np.dtype(np.float32)
+
+    def train(self, vectors: np.ndarray):
+        """
+        Train the coarse centroids (and PQ codebooks) and reset the lists
+
+        Args:
+            vectors: (n x dim) training vectors
+        """
+        x = normalize_rows(vectors)
+        self.trained_size = len(x)
+        n_lists = self.n_lists or default_n_lists(len(x))
+        if len(x) > MAX_TRAINING_POINTS:
+            rng = np.random.default_rng(self.seed)
+            x = x[np.sort(rng.choice(len(x), size=MAX_TRAINING_POINTS, replace=False))]
+        self.centroids = kmeans(x, n_lists, seed=self.seed)
+        self.n_lists = len(self.centroids)
+
+        if self.pq_subvectors:
+            residuals = x - self.centroids[assign(x, self.centroids)]
+            sub_dim = self.dim // self.pq_subvectors
+            self.codebooks = np.stack([
+                kmeans(np.ascontiguousarray(residuals[:, j * sub_dim:(j + 1) * sub_dim]),
+                       PQ_CENTROIDS, seed=self.seed + j)
+                for j in range(self.pq_subvectors)
+            ])
+
+        shape, dtype = self._row_shape
+        self._data = [np.empty((0,) + shape, dtype=dtype) for _ in range(self.n_lists)]
+        self._labels = [np.empty(0, dtype=np.int64) for _ in range(self.n_lists)]
+        self._counts = [0] * self.n_lists
+        self._positions = {}
+
+    def _encode(self, residuals: np.ndarray) -> np.ndarray:
+        """PQ codes of residual vectors"""
+        sub_dim = self.dim // self.pq_subvectors
+        codes = np.empty((len(residuals), self.pq_subvectors), dtype=np.uint8)
+        for j in range(self.pq_subvectors):
+            part = np.ascontiguousarray(residuals[:, j * sub_dim:(j + 1) * sub_dim])
+            codes[:, j] = assign(part, self.codebooks[j])
+        return codes
+
+    def _remove(self, label: int):
+        """Swap-remove a label from its list"""
+        list_id, row = self._positions.pop(label)
+        last = self._counts[list_id] - 1
+        if row != last:
+            moved = int(self._labels[list_id][last])
+            self._data[list_id][row] = self._data[list_id][last]
+            self._labels[list_id][row] = moved
+            self._positions[moved] = (list_id, row)
+        self._counts[list_id] = last
+
+    def _append(self, list_id: int, labels: np.ndarray, rows: np.ndarray):
+        count = self._counts[list_id]
+        needed = count + len(labels)
+        if needed > len(self._labels[list_id]):
+            capacity = max(needed, 2 * len(self._labels[list_id]), 16)
+            data = np.empty((capacity,) + rows.shape[1:], dtype=rows.dtype)
+            data[:count] = self._data[list_id][:count]
+            list_labels = np.empty(capacity, dtype=np.int64)
+            list_labels[:count] = self._labels[list_id][:count]
+            self._data[list_id], self._labels[list_id] = data, list_labels
+
+        self._data[list_id][count:needed] = rows
+        self._labels[list_id][count:needed] = labels
+        for offset, label in enumerate(labels.tolist()):
+            self._positions[label] = (list_id, count + offset)
+        self._counts[list_id] = needed
+
+    def add(self, ids: Sequence[str], vectors: np.ndarray):
+        """
+        Insert (or replace) vectors; an untrained index trains once it holds min_training_points
+
+        Args:
+            ids: Document ID of each row
+            vectors: (n x dim) embeddings
+        """
+        if len(ids) != len(vectors):
+            raise ValueError("Number of IDs and vectors differ")
+        if not len(ids):
+            return
+
+        x = normalize_rows(vectors)
+        if x.shape[1] != self.dim:
+            raise ValueError(f"Expected {self.dim}-dimensional vectors, got {x.shape[1]}")
+
+        labels = np.empty(len(ids), dtype=np.int64)
+        for position, doc_id in enumerate(ids):
+            label = self._labels_by_id.get(doc_id)
+            if label is None:
+                label = len(self.ids)
+                self.ids.append(doc_id)
+                self._labels_by_id[doc_id] = label
+            elif label in self._positions:
+                self._remove(label)
+            labels[position] = label
+
+        # The last occurrence of a repeated ID wins
+        _, last = np.unique(labels[::-1], return_index=True)
+        keep = np.sort(len(labels) - 1 - last)
+        labels, x = labels[keep], x[keep]
+
+        if not self.is_trained:
+            self._append(0, labels, x)
+            if len(self) >= self.min_training_points:
+                count = self._counts[0]
+                labels, x = self._labels[0][:count].copy(), self._data[0][:count].copy()
+                self.train(x)
+                self._insert(labels, x)
+            return
+        self._insert(labels, x)
+
+    def _insert(self, labels: np.ndarray, x: np.ndarray):
+        """Append unit vectors to the lists of their nearest centroids"""
+        list_ids = assign(x, self.centroids)
+        rows = self._encode(x - self.centroids[list_ids]) if self.pq_subvectors else x
+        order = np.argsort(list_ids, kind="stable")
+        boundaries = np.flatnonzero(np.diff(list_ids[order])) + 1
+        for group in np.split(order, boundaries):
+            self._append(int(list_ids[group[0]]), labels[group], rows[group])
+
+    def reconstruct(self, doc_id: str) -> np.ndarray:
+        """Stored vector of a document (approximate for PQ indexes)"""
+        label = self._labels_by_id.get(doc_id)
+        if label is None or label not in self._positions:
+            raise KeyError(doc_id)
+
+        list_id, row = self._positions[label]
+        stored = self._data[list_id][row]
+        if not self.pq_subvectors or not self.is_trained:
+            return stored.copy()
+        residual = np.concatenate([self.codebooks[j][stored[j]] for j in range(self.pq_subvectors)])
+        return self.centroids[list_id] + residual
+
+    def search(
+        self,
+        queries: np.ndarray,
+        k: int = 10,
+        n_probe: Optional[int] = None,
+        exclude: Optional[Sequence[Optional[str]]] = None
+    ) -> List[List[Tuple[str, float]]]:
+        """
+        Approximate k nearest documents of each query
+
+        Args:
+            queries: (q x dim) query embeddings
+            k: Results per query
+            n_probe: Lists scanned per query (default: the index setting)
+            exclude: Optional document ID to leave out of each query's results
+
+        Returns:
+            For each query, (document ID, cosine distance) pairs, nearest first
+        """
+        if not len(self):
+            return [[] for _ in range(len(queries))]
+
+        q = normalize_rows(np.atleast_2d(queries))
+        quantized = self.pq_subvectors and self.is_trained
+        if self.is_trained:
+            n_probe = min(n_probe or self.n_probe, self.n_lists)
+            coarse = q @ self.centroids.T
+            # Lists were assigned by euclidean distance: |q - c|^2 = 1 - 2 q.c + |c|^2
+            closeness = 2.0 * coarse - np.einsum("ij,ij->i", self.centroids, self.centroids)
+            probes = np.argpartition(-closeness, n_probe - 1, axis=1)[:, :n_probe]
+        else:
+            # Exact scan of the raw training buffer
+            probes = np.zeros((len(q), 1), dtype=np.int64)
+        sub_dim = self.dim // self.pq_subvectors if self.pq_subvectors else 0
+
+        results = []
+        for qi, query in enumerate(q):
+            if quantized:
+                # Inner products of every codebook entry with the query subvector
+                tables = np.einsum("jcs,js->jc", self.codebooks, query.reshape(self.pq_subvectors, sub_dim))
+                columns = np.arange(self.pq_subvectors)
+
+            scores, labels = [], []
+            for list_id in probes[qi]:
+                count = self._counts[list_id]
+                if not count:
+                    continue
+                data = self._data[list_id][:count]
+                if quantized:
+                    scores.append(coarse[qi, list_id] + tables[columns, data].sum(axis=1))
+                else:
+                    scores.append(data @ query)
+                labels.append(self._labels[list_id][:count])
+
+            if not scores:
+                results.append([])
+                continue
+
+            scores = np.concatenate(scores)
+            labels = np.concatenate(labels)
+            if exclude is not None and exclude[qi] in self._labels_by_id:
+                keep = labels != self._labels_by_id[exclude[qi]]
+                scores, labels = scores[keep], labels[keep]
+
+            top = min(k, len(scores))
+            if not top:
+                results.append([])
+                continue
+            best = np.argpartition(-scores, top - 1)[:top]
+            best = best[np.argsort(-scores[best], kind="stable")]
+            results.append([
+                (self.ids[label], float(max(0.0, 1.0 - score)))
+                for label, score in zip(labels[best].tolist(), scores[best].tolist())
+            ])
+
+        return results
+
+    def needs_retrain(self) -> bool:
+        """Whether a flat index outgrew its training set enough to be retrained"""
+        return (not self.pq_subvectors and self.is_trained and
+                len(self) >= RETRAIN_GROWTH * max(self.trained_size, MIN_POINTS_PER_LIST) and
+                default_n_lists(len(self)) > self.n_lists)
+
+    def retrained(self) -> "IVFIndex":
+        """A copy trained on every stored vector (flat indexes only)"""
+        if self.pq_subvectors:
+            raise ValueError("PQ indexes must be rebuilt from the original embeddings")
+
+        ids = [self.ids[label] for label in sorted(self._positions)]
+        vectors = np.stack([self.reconstruct(doc_id) for doc_id in ids])
+        index = IVFIndex(self.dim, pq_subvectors=0, n_probe=self.n_probe, seed=self.seed)
+        index.add(ids, vectors)
+        return index
+
+    def save(self, path: str, **metadata: str):
+        """
+        Write the index atomically to an .npz file
+
+        Args:
+            path: Destination file
+            metadata: Extra string fields stored with the index (e.g. model name)
+        """
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        shape, dtype = self._row_shape
+        lists = range(len(self._counts))
+        offsets = np.zeros(len(lists) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([self._counts[l] for l in lists])
+        data = (np.concatenate([self._data[l][:self._counts[l]] for l in lists])
+                if lists else np.empty((0,) + shape, dtype=dtype))
+        labels = (np.concatenate([self._labels[l][:self._counts[l]] for l in lists])
+                  if lists else np.empty(0, dtype=np.int64))
+
+        arrays = {
+            "config": np.array([self.dim, self.n_lists, self.pq_subvectors, self.n_probe,
+                                self.seed, self.trained_size], dtype=np.int64),
+            "ids": np.array(self.ids, dtype=str),
+            "offsets": offsets,
+            "data": data,
+            "labels": labels
+        }
+        if self.centroids is not None:
+            arrays["centroids"] = self.centroids
+        if self.codebooks is not None:
+            arrays["codebooks"] = self.codebooks
+        for key, value in metadata.items():
+            arrays[f"meta_{key}"] = np.array(value, dtype=str)
+
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> Tuple["IVFIndex", Dict[str, str]]:
+        """Read an index written by save(); returns (index, metadata)"""
+        with np.load(path, allow_pickle=False) as arrays:
+            dim, n_lists, pq_subvectors, n_probe, seed, trained_size = arrays["config"].tolist()
+            index = cls(dim, n_lists=n_lists, pq_subvectors=pq_subvectors, n_probe=n_probe, seed=seed)
+            index.ids = arrays["ids"].tolist()
+            index._labels_by_id = {doc_id: label for label, doc_id in enumerate(index.ids)}
+            index.trained_size = trained_size
+            metadata = {key[5:]: str(arrays[key]) for key in arrays.files if key.startswith("meta_")}
+
+            if "centroids" in arrays.files:
+                index.centroids = arrays["centroids"]
+                index.codebooks = arrays["codebooks"] if "codebooks" in arrays.files else None
+
+            # Trained lists, or the raw buffer of an untrained index
+            offsets, data, labels = arrays["offsets"], arrays["data"], arrays["labels"]
+            if len(offsets) > 1:
+                index._data, index._labels, index._counts = [], [], []
+                for list_id in range(len(offsets) - 1):
+                    start, end = offsets[list_id], offsets[list_id + 1]
+                    index._data.append(data[start:end].copy())
+                    index._labels.append(labels[start:end].copy())
+                    index._counts.append(int(end - start))
+                    for row, label in enumerate(labels[start:end].tolist()):
+                        index._positions[label] = (list_id, row)
+
+        return index, metadata
+
+    def stats(self) -> Dict[str, Any]:
+        counts = np.array(self._counts) if self._counts else np.zeros(1)
+        return {
+            "documents": len(self),
+            "dimension": self.dim,
+            "n_lists": self.n_lists,
+            "n_probe": self.n_probe,
+            "pq_subvectors": self.pq_subvectors,
+            "trained_size": self.trained_size,
+            "largest_list": int(counts.max()),
+            "nbytes": int(sum(data.nbytes + labels.nbytes for data, labels in zip(self._data, self._labels)))
+        }
+
+
+class DocumentIndex:
+    """
+    Thread-safe, persisted IVF index of the documents of one embedding model
+
+    Inserts are written back to disk at most once per save_interval (a full
+    rewrite of the .npz file); flush() saves the rest, e.g. on shutdown. An
+    index saved for another model, backend, quantization or dimension is
+    discarded on load.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str],
+        model_name: str,
+        dim: int,
+        pq_subvectors: int = 0,
+        n_probe: int = 8,
+        backend: str = "torch",
+        quantization: Optional[str] = None,
+        save_interval: float = SAVE_INTERVAL
+    ):
+        """
+        Initialize the index, loading it from disk when compatible
+
+        Args:
+            path: .npz file of the index (None keeps it in memory only)
+            model_name: Model that produced the embeddings
+            dim: Embedding dimension
+            pq_subvectors: Product-quantization subvectors (0 for IVF-flat)
+            n_probe: Lists scanned per query by default
+            backend: Inference backend that produced the embeddings ('torch' or 'onnx')
+            quantization: Weight quantization of that model (None for full precision)
+            save_interval: Shortest time in seconds between two saves
+        """
+        self.path = path
+        self.model_name = model_name
+        self.metadata = {"model_name": model_name, "backend": backend, "quantization": quantization or "none"}
+        self.save_interval = save_interval
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._saved_at: Optional[float] = None
+        self._stats: Dict[str, Any] = {}
+        self.index = IVFIndex(dim, pq_subvectors=pq_subvectors, n_probe=n_probe)
+
+        if path and os.path.exists(path):
+            try:
+                index, metadata = IVFIndex.load(path)
+                compatible = all(metadata.get(key) == value for key, value in self.metadata.items())
+                if compatible and index.dim == dim:
+                    self.index = index
+                    logger.info(f"Loaded ANN index with {len(index)} documents from {path}")
+                else:
+                    logger.warning(f"ANN index at {path} was built for another model or backend, starting a new one")
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"Could not load ANN index from {path}: {e}")
+        self._publish_stats()
+
+    @classmethod
+    def from_env(cls, model_name: str, dim: int, backend: str = "torch", quantization: Optional[str] = None) -> "DocumentIndex":
+        """Create the index from ANN_INDEX_PATH, ANN_PQ_SUBVECTORS, ANN_NPROBE and ANN_SAVE_INTERVAL_S"""
+        path = os.getenv("ANN_INDEX_PATH", "./ann_index/index.npz")
+        return cls(
+            path or None,
+            model_name,
+            dim,
+            pq_subvectors=int(os.getenv("ANN_PQ_SUBVECTORS", "0")),
+            n_probe=int(os.getenv("ANN_NPROBE", "8")),
+            backend=backend,
+            quantization=quantization,
+            save_interval=float(os.getenv("ANN_SAVE_INTERVAL_S", str(SAVE_INTERVAL)))
+        )
+
+    def add(self, ids: Sequence[str], vectors: np.ndarray) -> int:
+        """Insert or replace documents, saving if the last save is save_interval old; returns the index size"""
+        with self._lock:
+            self.index.add(ids, vectors)
+            if self.index.needs_retrain():
+                logger.info(f"Retraining ANN index on {len(self.index)} documents")
+                self.index = self.index.retrained()
+            self._dirty = True
+            if self._saved_at is None or time.monotonic() - self._saved_at >= self.save_interval:
+                self._save()
+            self._publish_stats()
+            return len(self.index)
+
+    def flush(self):
+        """Save inserts not yet written to disk"""
+        with self._lock:
+            if self._dirty:
+                self._save()
+
+    def _save(self):
+        if self.path:
+            self.index.save(self.path, **self.metadata)
+        self._dirty = False
+        self._saved_at = time.monotonic()
+
+    def search(
+        self,
+        queries: np.ndarray,
+        k: int = 10,
+        n_probe: Optional[int] = None,
+        exclude: Optional[Sequence[Optional[str]]] = None
+    ) -> List[List[Tuple[str, float]]]:
+        with self._lock:
+            return self.index.search(queries, k=k, n_probe=n_probe, exclude=exclude)
+
+    def search_document(self, doc_id: str, k: int = 10, n_probe: Optional[int] = None) -> List[Tuple[str, float]]:
+        """Nearest documents of an indexed document (itself excluded)"""
+        with self._lock:
+            vector = self.index.reconstruct(doc_id)
+            return self.index.search(vector[None], k=k, n_probe=n_probe, exclude=[doc_id])[0]
+
+    def _publish_stats(self):
+        self._stats = {"model_name": self.model_name, "path": self.path, **self.index.stats()}
+
+    def stats(self) -> Dict[str, Any]:
+        """Stats as of the last insert (never waits for an insert in progress)"""
+        return dict(self._stats)
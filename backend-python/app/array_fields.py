@@ -0,0 +1,114 @@
+"""
+NumPy-backed request fields
+Matrix fields of the projection requests are parsed straight into NumPy
+arrays and checked with vectorized operations (shape, finiteness, symmetry,
+sign) instead of per-element Pydantic validators. Handlers receive the
+parsed arrays and never convert the nested lists again.
+
+Usage: D_high: Optional[DistanceMatrix] = Field(default=None, ...)
+"""
+from typing import Annotated, Any, Optional
+import numpy as np
+from pydantic import GetCoreSchemaHandler, GetJsonSchemaHandler
+from pydantic_core import core_schema
+
+# Absolute tolerance of the symmetry check
+SYMMETRY_ATOL = 1e-6
+
+# Rows compared per block in the symmetry check
+SYMMETRY_BLOCK_ROWS = 512
+
+
+def is_symmetric(matrix: np.ndarray, atol: float = SYMMETRY_ATOL) -> bool:
+    """Whether |M - M^T| <= atol everywhere, compared in row blocks to avoid a full transposed copy"""
+    n = matrix.shape[0]
+    for start in range(0, n, SYMMETRY_BLOCK_ROWS):
+        end = min(start + SYMMETRY_BLOCK_ROWS, n)
+        if np.abs(matrix[start:end] - matrix[:, start:end].T).max(initial=0.0) > atol:
+            return False
+    return True
+
+
+def check_distance_matrix(name: str, matrix: np.ndarray):
+    """
+    Raise ValueError unless matrix is a square, symmetric distance matrix
+
+    Args:
+        name: Field name used in the error message
+        matrix: Candidate matrix
+    """
+    if matrix.ndim != 2 or matrix.shape[0] != matrix.shape[1]:
+        raise ValueError(f"{name} must be a square matrix")
+    if not np.isfinite(matrix).all():
+        raise ValueError(f"{name} must contain finite distances")
+    if (matrix < 0).any():
+        raise ValueError(f"{name} must contain non-negative distances")
+    if not is_symmetric(matrix):
+        raise ValueError(f"{name} must be symmetric")
+
+
+def check_points(name: str, points: np.ndarray):
+    """Raise ValueError unless points is a finite (N x d) coordinate array"""
+    if points.ndim != 2 or points.shape[1] < 1:
+        raise ValueError(f"{name} must be an (N x d) array of coordinates")
+    if not np.all(np.isfinite(points)):
+        raise ValueError(f"{name} must contain finite coordinates")
+
+
+class NumpyArray:
+    """
+    Annotated marker turning a field into a parsed NumPy array
+
+    JSON lists and binary-body arrays (see wire_format) go through the same
+    parse: one conversion to dtype, then the vectorized check. The JSON
+    schema stays that of nested number lists.
+    """
+
+    def __init__(self, ndim: int = 2, dtype: Any = np.float64, distances: bool = False):
+        """
+        Args:
+            ndim: Number of dimensions (nesting depth of the JSON lists)
+            dtype: dtype of the parsed array
+            distances: Check a square, symmetric, non-negative matrix instead of (N x d) points
+        """
+        self.ndim = ndim
+        self.dtype = np.dtype(dtype)
+        self.distances = distances
+
+    def parse(self, value: Any, name: Optional[str] = None) -> np.ndarray:
+        """Array of value in the field's dtype, raising ValueError if it fails the checks"""
+        name = name or "value"
+        try:
+            array = np.asarray(value, dtype=self.dtype)
+        except (ValueError, TypeError):
+            raise ValueError(f"{name} must be a rectangular {self.ndim}-dimensional array of numbers")
+        if array.ndim != self.ndim:
+            raise ValueError(f"{name} must be a {self.ndim}-dimensional array, got {array.ndim} dimensions")
+
+        if self.distances:
+            check_distance_matrix(name, array)
+        else:
+            check_points(name, array)
+        return array
+
+    def __get_pydantic_core_schema__(self, source: Any, handler: GetCoreSchemaHandler) -> core_schema.CoreSchema:
+        return core_schema.with_info_plain_validator_function(
+            lambda value, info: self.parse(value, info.field_name),
+            serialization=core_schema.plain_serializer_function_ser_schema(lambda array: array.tolist())
+        )
+
+    def __get_pydantic_json_schema__(self, schema: core_schema.CoreSchema, handler: GetJsonSchemaHandler):
+        json_schema = {"type": "number"}
+        for _ in range(self.ndim):
+            json_schema = {"type": "array", "items": json_schema}
+        return json_schema
+
+
+# Square, symmetric, non-negative and finite (N x N) float64 matrix
+DistanceMatrix = Annotated[np.ndarray, NumpyArray(distances=True)]
+
+# Finite (N x d) float64 coordinates
+PointArray = Annotated[np.ndarray, NumpyArray()]
+
+# Finite (N x d) float32 embeddings
+EmbeddingArray = Annotated[np.ndarray, NumpyArray(dtype=np.float32)]
@@ -0,0 +1,202 @@
+"""
+Blocked pairwise distance engine
+Computes n x n distance matrices tile by tile in float32, so the peak
+temporary memory stays within a configurable budget and the output can be
+a preallocated or memory-mapped array. Also builds sparse k-nearest-neighbor
+graphs without materializing the full matrix
+"""
+import os
+from typing import Optional, Tuple
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+METRICS = ("cosine", "euclidean")
+
+
+def normalize_rows(embeddings: np.ndarray, dtype=np.float32) -> np.ndarray:
+    """
+    Unit-normalize rows, skipping the copy when they already have unit norm
+
+    Args:
+        embeddings: (n x d) array
+        dtype: Output dtype
+
+    Returns:
+        C-contiguous (n x d) array of unit rows (zero rows stay zero)
+    """
+    x = np.ascontiguousarray(embeddings, dtype=dtype)
+    norms = np.sqrt(np.einsum("ij,ij->i", x, x))
+    if np.allclose(norms, 1.0, atol=1e-4):
+        return x
+    return x / np.maximum(norms, 1e-12)[:, None]
+
+
+def _prepare(embeddings: np.ndarray, metric: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """Rows used by the band kernel and their squared norms (euclidean only)"""
+    if metric not in METRICS:
+        raise ValueError(f"Unsupported distance metric: {metric}")
+
+    embeddings = np.asarray(embeddings)
+    if embeddings.ndim != 2:
+        raise ValueError("Embeddings must be a 2D array")
+
+    if metric == "cosine":
+        return normalize_rows(embeddings), None
+    # Squared norms in float64 keep the expansion accurate for close points
+    x = np.ascontiguousarray(embeddings, dtype=np.float64)
+    return x, np.einsum("ij,ij->i", x, x)
+
+
+def _band(x: np.ndarray, squared_norms: Optional[np.ndarray], rows: slice, cols: slice) -> np.ndarray:
+    """Distances between x[rows] and x[cols] (cosine if squared_norms is None)"""
+    band = x[rows] @ x[cols].T
+    if squared_norms is None:
+        np.subtract(1.0, band, out=band)
+    else:
+        band *= -2.0
+        band += squared_norms[rows, None]
+        band += squared_norms[None, cols]
+        np.maximum(band, 0.0, out=band)
+        np.sqrt(band, out=band)
+    np.maximum(band, 0.0, out=band)
+    return band
+
+
+class DistanceEngine:
+    """
+    Tiled pairwise distances with bounded temporaries
+
+    Only row bands of the upper triangle are computed (one GEMM per band,
+    run by the multi-threaded BLAS); each band is written to the output and
+    mirrored below the diagonal, so the result is exactly symmetric with a
+    zero diagonal.
+    """
+
+    def __init__(self, memory_budget_bytes: int = 256 * 1024 * 1024, dtype=np.float32):
+        """
+        Initialize the engine
+
+        Args:
+            memory_budget_bytes: Upper bound of the temporaries of one tile
+            dtype: Dtype of the output matrix
+        """
+        self.memory_budget_bytes = memory_budget_bytes
+        self.dtype = np.dtype(dtype)
+
+    @classmethod
+    def from_env(cls) -> "DistanceEngine":
+        """Create the engine with a budget of DISTANCE_MEMORY_MB (default 256)"""
+        memory_mb = int(os.getenv("DISTANCE_MEMORY_MB", "256"))
+        return cls(memory_budget_bytes=memory_mb * 1024 * 1024)
+
+    def tile_rows(self, n: int) -> int:
+        """Rows per band so that a band of n columns (float64 worst case) fits the budget"""
+        return int(max(1, min(n, self.memory_budget_bytes // (8 * max(n, 1)))))
+
+    def allocate(self, n: int, path: Optional[str] = None) -> np.ndarray:
+        """
+        Output array for n documents
+
+        Args:
+            n: Number of documents
+            path: File to memory-map the matrix into (None keeps it in RAM)
+        """
+        if path is None:
+            return np.empty((n, n), dtype=self.dtype)
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        return np.lib.format.open_memmap(path, mode="w+", dtype=self.dtype, shape=(n, n))
+
+    def pairwise(
+        self,
+        embeddings: np.ndarray,
+        metric: str = "cosine",
+        out: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        """
+        Compute the pairwise distance matrix
+
+        Args:
+            embeddings: (n x d) embeddings
+            metric: 'cosine' (dot products of unit rows) or 'euclidean'
+            out: Optional preallocated (n x n) array or memmap to write into
+
+        Returns:
+            The (n x n) distance matrix (out, if given)
+        """
+        x, squared_norms = _prepare(embeddings, metric)
+        n = x.shape[0]
+
+        if out is None:
+            out = self.allocate(n)
+        elif out.shape != (n, n):
+            raise ValueError(f"Output shape {out.shape} does not match {n} documents")
+
+        rows = self.tile_rows(n)
+        for start in range(0, n, rows):
+            end = min(start + rows, n)
+            band = _band(x, squared_norms, slice(start, end), slice(start, n))
+
+            # Mirror the diagonal block so it is exactly symmetric
+            block = band[:, :end - start]
+            lower = np.tril_indices(end - start, -1)
+            block[lower] = block.T[lower]
+            np.fill_diagonal(block, 0.0)
+
+            out[start:end, start:] = band
+            out[start:, start:end] = band.T
+
+        if isinstance(out, np.memmap):
+            out.flush()
+        return out
+
+    def knn(
+        self,
+        embeddings: np.ndarray,
+        k: int,
+        metric: str = "cosine"
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Sparse k-nearest-neighbor graph in CSR form
+
+        Each row band is reduced to its k smallest distances (self excluded)
+        before the next band is computed, so memory stays O(nk) plus one band.
+
+        Args:
+            embeddings: (n x d) embeddings
+            k: Neighbors per document (capped at n - 1)
+            metric: 'cosine' or 'euclidean'
+
+        Returns:
+            indptr: (n + 1) row offsets
+            indices: (n * k) neighbor indices, nearest first within each row
+            distances: (n * k) float32 distances matching indices
+        """
+        if k < 1:
+            raise ValueError("k must be at least 1")
+
+        x, squared_norms = _prepare(embeddings, metric)
+        n = x.shape[0]
+        k = min(k, max(n - 1, 0))
+
+        indices = np.empty((n, k), dtype=np.int64)
+        distances = np.empty((n, k), dtype=np.float32)
+
+        rows = self.tile_rows(n)
+        for start in range(0, n, rows):
+            end = min(start + rows, n)
+            band = _band(x, squared_norms, slice(start, end), slice(0, n))
+            local = np.arange(end - start)
+            band[local, start + local] = np.inf
+
+            nearest = np.argpartition(band, max(k - 1, 0), axis=1)[:, :k]
+            nearest_distances = np.take_along_axis(band, nearest, axis=1)
+            order = np.argsort(nearest_distances, axis=1, kind="stable")
+
+            indices[start:end] = np.take_along_axis(nearest, order, axis=1)
+            distances[start:end] = np.take_along_axis(nearest_distances, order, axis=1)
+
+        indptr = np.arange(n + 1, dtype=np.int64) * k
+        return indptr, indices.ravel(), distances.ravel()
@@ -0,0 +1,260 @@
+"""
+Content-addressed embedding cache
+Embeddings are keyed by (model name, encoding config, text) and kept in an
+in-memory LRU tier with a byte budget, backed by memory-mapped files on disk
+that survive restarts
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Sequence, Tuple
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Length of the SHA-256 digests used as keys
+KEY_SIZE = 32
+
+# Rows added to a disk store whenever it has to grow
+DISK_GROWTH_ROWS = 4096
+
+
+def cache_key(model_name: str, config: Dict[str, Any], text: str) -> bytes:
+    """Key of one text: SHA-256 over model name, canonical config and text"""
+    digest = hashlib.sha256()
+    digest.update(model_name.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(json.dumps(config, sort_keys=True).encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(text.encode("utf-8"))
+    return digest.digest()
+
+
+class DiskStore:
+    """
+    Append-only memory-mapped store for embeddings of one dimension
+
+    vectors.f32 holds the rows and keys.bin the key of each row. A row is
+    written before its key, so an interrupted write leaves at most an
+    unreferenced row behind.
+    """
+
+    def __init__(self, directory: str, dim: int):
+        self.directory = directory
+        self.dim = dim
+        os.makedirs(directory, exist_ok=True)
+
+        self._vectors_path = os.path.join(directory, "vectors.f32")
+        self._keys_path = os.path.join(directory, "keys.bin")
+
+        keys = b""
+        if os.path.exists(self._keys_path):
+            with open(self._keys_path, "rb") as f:
+                keys = f.read()
+        count = len(keys) // KEY_SIZE
+        if len(keys) != count * KEY_SIZE:
+            # Drop a partially written key so later appends stay aligned
+            with open(self._keys_path, "r+b") as f:
+                f.truncate(count * KEY_SIZE)
+        self.index: Dict[bytes, int] = {
+            keys[k * KEY_SIZE:(k + 1) * KEY_SIZE]: k for k in range(count)
+        }
+        self.rows = count
+
+        row_bytes = 4 * dim
+        if not os.path.exists(self._vectors_path) or os.path.getsize(self._vectors_path) < count * row_bytes:
+            # Rows without a matching file region cannot be trusted
+            self.index = {}
+            self.rows = 0
+            open(self._keys_path, "wb").close()
+            open(self._vectors_path, "wb").close()
+
+        self._vectors: Optional[np.memmap] = None
+        self._map()
+
+    def _capacity(self) -> int:
+        return os.path.getsize(self._vectors_path) // (4 * self.dim)
+
+    def _map(self):
+        capacity = self._capacity()
+        self._vectors = (
+            np.memmap(self._vectors_path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+            if capacity else None
+        )
+
+    def get(self, rows: np.ndarray) -> np.ndarray:
+        return np.array(self._vectors[rows])
+
+    def append(self, keys: Sequence[bytes], vectors: np.ndarray):
+        """Store new rows (keys must not be present yet)"""
+        count = len(keys)
+        if not count:
+            return
+
+        needed = self.rows + count
+        if needed > self._capacity():
+            if self._vectors is not None:
+                self._vectors.flush()
+            capacity = needed + DISK_GROWTH_ROWS
+            with open(self._vectors_path, "r+b") as f:
+                f.truncate(capacity * 4 * self.dim)
+            self._map()
+
+        self._vectors[self.rows:needed] = vectors
+        self._vectors.flush()
+        with open(self._keys_path, "ab") as f:
+            f.write(b"".join(keys))
+
+        for offset, key in enumerate(keys):
+            self.index[key] = self.rows + offset
+        self.rows = needed
+
+    @property
+    def nbytes(self) -> int:
+        return self.rows * 4 * self.dim
+
+
+class EmbeddingCache:
+    """
+    Two-tier embedding cache (memory LRU + memory-mapped disk files)
+
+    Thread-safe, since encoding runs in the worker thread pool. Disk tier
+    files live in one subdirectory per embedding dimension.
+    """
+
+    def __init__(self, directory: Optional[str] = None, memory_budget_bytes: int = 256 * 1024 * 1024):
+        """
+        Initialize the cache
+
+        Args:
+            directory: Directory of the disk tier (None keeps the cache in memory only)
+            memory_budget_bytes: Byte budget of the in-memory LRU tier
+        """
+        self.directory = directory
+        self.memory_budget_bytes = memory_budget_bytes
+
+        self._memory: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        self._memory_bytes = 0
+        self._disk: Dict[int, DiskStore] = {}
+        self._lock = threading.Lock()
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_env(cls) -> "EmbeddingCache":
+        """Create the cache from EMBEDDING_CACHE_DIR and EMBEDDING_CACHE_MEMORY_MB"""
+        directory = os.getenv("EMBEDDING_CACHE_DIR", "./embeddings_cache")
+        memory_mb = int(os.getenv("EMBEDDING_CACHE_MEMORY_MB", "256"))
+        return cls(directory=directory or None, memory_budget_bytes=memory_mb * 1024 * 1024)
+
+    @staticmethod
+    def make_keys(model_name: str, config: Dict[str, Any], texts: Sequence[str]) -> list:
+        """Cache keys of a list of texts encoded by one model with one config"""
+        return [cache_key(model_name, config, text) for text in texts]
+
+    def _disk_store(self, dim: int) -> Optional[DiskStore]:
+        if self.directory is None:
+            return None
+        if dim not in self._disk:
+            self._disk[dim] = DiskStore(os.path.join(self.directory, f"dim_{dim}"), dim)
+        return self._disk[dim]
+
+    def _remember(self, key: bytes, vector: np.ndarray):
+        """Insert into the LRU tier, evicting the least recently used entries"""
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            return
+        if vector.nbytes > self.memory_budget_bytes:
+            return
+
+        self._memory[key] = vector
+        self._memory_bytes += vector.nbytes
+        while self._memory_bytes > self.memory_budget_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= evicted.nbytes
+
+    def lookup(self, keys: Sequence[bytes], dim: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Look up embeddings for a list of keys
+
+        Returns:
+            embeddings: (n x dim) float32 array, rows of misses are left at zero
+            missing: Indices of the keys that were not found
+        """
+        result = np.zeros((len(keys), dim), dtype=np.float32)
+        missing = []
+
+        with self._lock:
+            disk = self._disk_store(dim)
+            disk_positions, disk_rows = [], []
+
+            for position, key in enumerate(keys):
+                vector = self._memory.get(key)
+                if vector is not None and vector.shape[0] == dim:
+                    self._memory.move_to_end(key)
+                    result[position] = vector
+                    self.memory_hits += 1
+                elif disk is not None and key in disk.index:
+                    disk_positions.append(position)
+                    disk_rows.append(disk.index[key])
+                else:
+                    missing.append(position)
+
+            if disk_positions:
+                vectors = disk.get(np.array(disk_rows))
+                result[disk_positions] = vectors
+                self.disk_hits += len(disk_positions)
+                for position, vector in zip(disk_positions, vectors):
+                    self._remember(keys[position], vector.copy())
+
+            self.misses += len(missing)
+
+        return result, np.array(missing, dtype=np.int64)
+
+    def store(self, keys: Sequence[bytes], vectors: np.ndarray):
+        """Add freshly computed embeddings to both tiers"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if not len(keys):
+            return
+
+        with self._lock:
+            disk = self._disk_store(vectors.shape[1])
+            new_keys, new_rows = {}, []
+            for k, key in enumerate(keys):
+                self._remember(key, vectors[k].copy())
+                if disk is not None and key not in disk.index and key not in new_keys:
+                    new_keys[key] = k
+                    new_rows.append(k)
+
+            if disk is not None and new_keys:
+                try:
+                    disk.append(list(new_keys), vectors[new_rows])
+                except OSError as e:
+                    logger.warning(f"Could not write embeddings to disk cache: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Hit/miss counters and tier sizes
+
+        Read without the lock, which is held during disk I/O, so a scrape
+        never waits; values may be a lookup apart.
+        """
+        memory_hits, disk_hits, misses = self.memory_hits, self.disk_hits, self.misses
+        lookups = memory_hits + disk_hits + misses
+        disk = list(self._disk.values())
+        return {
+            "memory_hits": memory_hits,
+            "disk_hits": disk_hits,
+            "misses": misses,
+            "hit_ratio": (memory_hits + disk_hits) / lookups if lookups else 0.0,
+            "memory_entries": len(self._memory),
+            "memory_bytes": self._memory_bytes,
+            "memory_budget_bytes": self.memory_budget_bytes,
+            "disk_entries": sum(store.rows for store in disk),
+            "disk_bytes": sum(store.nbytes for store in disk)
+        }
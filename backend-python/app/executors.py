@@ -0,0 +1,167 @@
+"""
+Worker pools for CPU-bound endpoint work
+Keeps heavy computations off the event loop so one large request does not
+stall every other client (including /health)
+"""
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Executor, Future, ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class WorkerPool:
+    """
+    Lazily created executor with queue-depth accounting
+
+    Tasks are counted from submission until their future resolves, so
+    in-flight work beyond the worker count is reported as queued.
+    """
+
+    def __init__(self, name: str, factory: Callable[[int], Executor], max_workers: int):
+        self.name = name
+        self.max_workers = max_workers
+        self._factory = factory
+        self._executor: Optional[Executor] = None
+        self._lock = threading.Lock()
+
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def _get_executor(self) -> Executor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = self._factory(self.max_workers)
+                logger.info(f"Started {self.name} pool with {self.max_workers} workers")
+            return self._executor
+
+    def _on_done(self, future: Future):
+        with self._lock:
+            self.in_flight -= 1
+            if future.cancelled() or future.exception() is not None:
+                self.failed += 1
+            else:
+                self.completed += 1
+
+            # A crashed worker breaks the whole process pool; start a new one next time
+            if not future.cancelled() and isinstance(future.exception(), BrokenProcessPool):
+                logger.error(f"{self.name} pool is broken, it will be restarted")
+                self._executor = None
+
+    def submit(self, func: Callable, *args, **kwargs) -> Future:
+        """Submit a call to the pool and track it"""
+        executor = self._get_executor()
+        with self._lock:
+            self.submitted += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+        try:
+            future = executor.submit(func, *args, **kwargs)
+        except Exception:
+            with self._lock:
+                self.in_flight -= 1
+                self.failed += 1
+            raise
+
+        future.add_done_callback(self._on_done)
+        return future
+
+    async def run(self, func: Callable, *args, **kwargs) -> Any:
+        """Run a call in the pool and await its result"""
+        return await asyncio.wrap_future(self.submit(func, *args, **kwargs))
+
+    def stats(self) -> Dict[str, int]:
+        """Queue-depth metrics for this pool"""
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "in_flight": self.in_flight,
+                "queue_depth": max(0, self.in_flight - self.max_workers),
+                "max_in_flight": self.max_in_flight,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed
+            }
+
+    def shutdown(self, wait: bool = True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+
+class WorkerPools:
+    """
+    Executors used by the endpoints
+
+    - thread pool: NumPy/SciPy/torch work, which releases the GIL
+    - process pool: pure-Python-bound work such as Neighbor-Joining
+
+    Process workers are spawned rather than forked, so they never inherit
+    torch or BLAS thread state from the server process.
+    """
+
+    def __init__(self, thread_workers: Optional[int] = None, process_workers: Optional[int] = None):
+        """
+        Initialize the pools (executors start on first use)
+
+        Args:
+            thread_workers: Size of the thread pool (default: CPU count)
+            process_workers: Size of the process pool (default: half the CPU count)
+        """
+        cpu_count = os.cpu_count() or 1
+        thread_workers = thread_workers or cpu_count
+        process_workers = process_workers or max(1, cpu_count // 2)
+
+        self.threads = WorkerPool(
+            "thread",
+            lambda workers: ThreadPoolExecutor(max_workers=workers, thread_name_prefix="compute"),
+            thread_workers
+        )
+        self.processes = WorkerPool(
+            "process",
+            lambda workers: ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+            ),
+            process_workers
+        )
+
+    @classmethod
+    def from_env(cls) -> "WorkerPools":
+        """Create pools sized by THREAD_POOL_WORKERS and PROCESS_POOL_WORKERS"""
+        def env_int(name: str) -> Optional[int]:
+            value = os.getenv(name)
+            return int(value) if value else None
+
+        return cls(
+            thread_workers=env_int("THREAD_POOL_WORKERS"),
+            process_workers=env_int("PROCESS_POOL_WORKERS")
+        )
+
+    async def run_in_thread(self, func: Callable, *args, **kwargs) -> Any:
+        """Run NumPy/torch work in the thread pool"""
+        return await self.threads.run(func, *args, **kwargs)
+
+    async def run_in_process(self, func: Callable, *args, **kwargs) -> Any:
+        """Run pure-Python-bound work in the process pool (arguments must be picklable)"""
+        return await self.processes.run(func, *args, **kwargs)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Queue-depth metrics of every pool"""
+        return {
+            "thread_pool": self.threads.stats(),
+            "process_pool": self.processes.stats()
+        }
+
+    def shutdown(self, wait: bool = True):
+        self.threads.shutdown(wait=wait)
+        self.processes.shutdown(wait=wait)
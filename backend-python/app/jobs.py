@@ -0,0 +1,334 @@
+"""
+Asynchronous job subsystem for long-running tree reconstructions
+Jobs are persisted in a local SQLite queue (no external broker), so queued
+and interrupted jobs survive a restart and clients poll instead of holding
+an HTTP connection open for minutes
+"""
+import asyncio
+import os
+import sqlite3
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+JOB_STATUSES = ("queued", "running", "completed", "failed", "cancelled")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL,
+    stage TEXT,
+    progress_current INTEGER NOT NULL DEFAULT 0,
+    progress_total INTEGER NOT NULL DEFAULT 0,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    payload TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    created_at TEXT NOT NULL,
+    started_at TEXT,
+    finished_at TEXT
+)
+"""
+
+_STATUS_COLUMNS = (
+    "id, kind, status, stage, progress_current, progress_total, "
+    "cancel_requested, error, created_at, started_at, finished_at"
+)
+
+
+class JobCancelled(Exception):
+    """Raised inside a job when its cancellation was requested"""
+
+
+def _now() -> str:
+    return datetime.now().isoformat()
+
+
+class JobStore:
+    """
+    SQLite-backed job queue
+
+    Every call opens its own connection, so the store can be used from the
+    event loop, worker threads and worker processes alike.
+    """
+
+    def __init__(self, path: str):
+        """
+        Initialize the store, creating the database if needed
+
+        Args:
+            path: Path of the SQLite database file
+        """
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(_SCHEMA)
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+        job = dict(row)
+        job["cancel_requested"] = bool(job["cancel_requested"])
+        return job
+
+    def create(self, kind: str, payload: str) -> str:
+        """Queue a new job and return its ID"""
+        job_id = uuid.uuid4().hex
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, kind, status, payload, created_at) VALUES (?, ?, 'queued', ?, ?)",
+                (job_id, kind, payload, _now())
+            )
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Status of a job (without payload and result), or None if unknown"""
+        with self._connect() as conn:
+            row = conn.execute(f"SELECT {_STATUS_COLUMNS} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def list(self, limit: int = 100) -> List[Dict[str, Any]]:
+        """Most recent jobs first"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT {_STATUS_COLUMNS} FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def get_payload(self, job_id: str) -> Optional[str]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT payload FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return row["payload"] if row else None
+
+    def get_result(self, job_id: str) -> Optional[str]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT result FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return row["result"] if row else None
+
+    def claim_next(self) -> Optional[Tuple[str, str]]:
+        """Atomically move the oldest queued job to running; returns (id, kind)"""
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT id, kind FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = 'running', started_at = ? WHERE id = ?",
+                (_now(), row["id"])
+            )
+            conn.execute("COMMIT")
+        return row["id"], row["kind"]
+
+    def update_progress(
+        self,
+        job_id: str,
+        current: int,
+        total: int,
+        stage: Optional[str] = None
+    ) -> bool:
+        """Record progress; returns True if cancellation was requested"""
+        with self._connect() as conn:
+            if stage is None:
+                conn.execute(
+                    "UPDATE jobs SET progress_current = ?, progress_total = ? WHERE id = ?",
+                    (current, total, job_id)
+                )
+            else:
+                conn.execute(
+                    "UPDATE jobs SET stage = ?, progress_current = ?, progress_total = ? WHERE id = ?",
+                    (stage, current, total, job_id)
+                )
+            row = conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return bool(row and row["cancel_requested"])
+
+    def finish(self, job_id: str, status: str, result: Optional[str] = None, error: Optional[str] = None):
+        """Mark a job completed, failed or cancelled"""
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ? WHERE id = ?",
+                (status, result, error, _now(), job_id)
+            )
+
+    def request_cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Cancel a job: queued jobs are cancelled at once, running jobs are
+        flagged and stop at their next progress report
+        """
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "UPDATE jobs SET status = 'cancelled', cancel_requested = 1, finished_at = ? "
+                "WHERE id = ? AND status = 'queued'",
+                (_now(), job_id)
+            )
+            conn.execute(
+                "UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = 'running'",
+                (job_id,)
+            )
+            conn.execute("COMMIT")
+        return self.get(job_id)
+
+    def requeue_running(self) -> int:
+        """Put jobs interrupted by a restart back in the queue"""
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'cancelled', finished_at = ? "
+                "WHERE status = 'running' AND cancel_requested = 1",
+                (_now(),)
+            )
+            cursor = conn.execute(
+                "UPDATE jobs SET status = 'queued', stage = NULL, progress_current = 0, "
+                "progress_total = 0, started_at = NULL WHERE status = 'running'"
+            )
+        return cursor.rowcount
+
+
+class JobProgress:
+    """
+    Progress reporter handed to a running job
+
+    Picklable, so it can be passed to engines running in worker processes
+    as their progress callback. Writes are throttled to one per interval;
+    each write also checks for cancellation and raises JobCancelled.
+    """
+
+    def __init__(self, db_path: str, job_id: str, interval: float = 0.5):
+        self.db_path = db_path
+        self.job_id = job_id
+        self.interval = interval
+        self._store: Optional[JobStore] = None
+        self._last_write = 0.0
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_store"] = None
+        return state
+
+    @property
+    def store(self) -> JobStore:
+        if self._store is None:
+            self._store = JobStore(self.db_path)
+        return self._store
+
+    def set_stage(self, stage: str, total: int = 0):
+        """Start a new stage of the job (also checks for cancellation)"""
+        self._last_write = time.monotonic()
+        if self.store.update_progress(self.job_id, 0, total, stage=stage):
+            raise JobCancelled(self.job_id)
+
+    def __call__(self, current: int, total: int):
+        """Report that `current` of `total` steps of the stage are done"""
+        now = time.monotonic()
+        if now - self._last_write < self.interval and current < total:
+            return
+        self._last_write = now
+        if self.store.update_progress(self.job_id, current, total):
+            raise JobCancelled(self.job_id)
+
+
+JobHandler = Callable[[str, JobProgress], Awaitable[str]]
+
+
+class JobManager:
+    """
+    Runs queued jobs with a fixed number of asyncio workers
+
+    Handlers receive the job payload and a JobProgress and return the
+    serialized result. They do their heavy lifting in the worker pools.
+    """
+
+    def __init__(self, store: JobStore, handlers: Dict[str, JobHandler], workers: int = 1):
+        """
+        Initialize the manager
+
+        Args:
+            store: Persistent job store
+            handlers: Coroutine for each job kind
+            workers: Number of jobs run concurrently
+        """
+        self.store = store
+        self.handlers = handlers
+        self.workers = max(1, workers)
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+
+    async def start(self):
+        """Requeue interrupted jobs and start the workers"""
+        requeued = self.store.requeue_running()
+        if requeued:
+            logger.info(f"Requeued {requeued} interrupted jobs")
+
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, kind: str, payload: str) -> str:
+        """Queue a job and return its ID"""
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+
+        job_id = self.store.create(kind, payload)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job_id
+
+    def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self.store.request_cancel(job_id)
+
+    async def _worker(self):
+        while True:
+            claimed = self.store.claim_next()
+            if claimed is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=1.0)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            await self._run(*claimed)
+
+    async def _run(self, job_id: str, kind: str):
+        logger.info(f"Running {kind} job {job_id}")
+        progress = JobProgress(self.store.path, job_id)
+
+        try:
+            result = await self.handlers[kind](self.store.get_payload(job_id), progress)
+        except JobCancelled:
+            logger.info(f"Job {job_id} cancelled")
+            self.store.finish(job_id, "cancelled")
+            return
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Job {job_id} failed: {e}")
+            self.store.finish(job_id, "failed", error=str(e))
+            return
+
+        job = self.store.get(job_id)
+        if job and job["cancel_requested"]:
+            self.store.finish(job_id, "cancelled")
+        else:
+            self.store.finish(job_id, "completed", result=result)
+            logger.info(f"Job {job_id} completed")
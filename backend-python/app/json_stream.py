@@ -0,0 +1,311 @@
+"""
+Streaming JSON request bodies
+Large list fields of a JSON body (distance-matrix rows, documents) are
+parsed element by element while the body streams in: matrix rows are
+written into a preallocated NumPy array and documents are validated one at
+a time, so the whole body and its Python object tree are never held at
+once. The other fields form a small skeleton document validated as usual.
+
+Bodies are bounded in bytes and in elements per streamed field; requests
+over a limit are rejected with 413 as soon as the limit is crossed (from
+Content-Length when it is given).
+"""
+import os
+import re
+import typing
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple, Type
+import numpy as np
+import pydantic_core
+from fastapi import HTTPException, Request
+from fastapi.exceptions import RequestValidationError
+from pydantic import BaseModel, TypeAdapter, ValidationError
+
+# Bytes the scanner reacts to: string delimiters, escapes and nesting
+_STRUCTURAL = re.compile(rb'["\\\[\]{}]')
+
+# Tail of the skeleton right before a top-level value: "key":
+_KEY = re.compile(rb'"((?:[^"\\]|\\.)*)"\s*:\s*$')
+
+# Longest key (with quotes and colon) recognized as a streamed field
+MAX_KEY_BYTES = 256
+
+# Bytes allowed between the elements of a streamed list
+_SEPARATORS = re.compile(rb'[\s,]*')
+
+# Fewest JSON bytes per matrix entry: one digit and a separator
+MIN_BYTES_PER_NUMBER = 2
+
+
+class BodyLimits:
+    """Size limits of a request body"""
+
+    def __init__(self, max_body_bytes: int = 1024 * 1024 * 1024, max_items: int = 50_000):
+        """
+        Args:
+            max_body_bytes: Largest accepted body
+            max_items: Most elements (documents, matrix rows) in one streamed field
+        """
+        self.max_body_bytes = max_body_bytes
+        self.max_items = max_items
+
+    @classmethod
+    def from_env(cls) -> "BodyLimits":
+        """Limits from MAX_BODY_MB (default 1024) and MAX_REQUEST_ITEMS (default 50000)"""
+        return cls(
+            max_body_bytes=int(os.getenv("MAX_BODY_MB", "1024")) * 1024 * 1024,
+            max_items=int(os.getenv("MAX_REQUEST_ITEMS", "50000"))
+        )
+
+    def check_content_length(self, header: Optional[str]):
+        """Reject a body whose declared length is over the limit before reading it"""
+        if header is not None and header.isdigit() and int(header) > self.max_body_bytes:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Request body of {header} bytes exceeds the limit of {self.max_body_bytes}"
+            )
+
+    def check_matrix(self, field: str, n: int):
+        """Reject an n x n matrix before allocating it if it cannot fit in the body or item limits"""
+        if n > self.max_items:
+            raise HTTPException(
+                status_code=413,
+                detail=f"{field} has {n} columns, more than the limit of {self.max_items}"
+            )
+        if n * n * MIN_BYTES_PER_NUMBER > self.max_body_bytes:
+            raise HTTPException(
+                status_code=413,
+                detail=f"A {n} x {n} {field} cannot fit in the body limit of {self.max_body_bytes} bytes"
+            )
+
+
+async def limited_stream(http_request: Request, limits: BodyLimits) -> AsyncIterator[bytes]:
+    """Body chunks of a request, raising 413 once more than max_body_bytes arrive"""
+    limits.check_content_length(http_request.headers.get("content-length"))
+    received = 0
+    async for chunk in http_request.stream():
+        received += len(chunk)
+        if received > limits.max_body_bytes:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Request body exceeds the limit of {limits.max_body_bytes} bytes"
+            )
+        if chunk:
+            yield chunk
+
+
+async def read_body(http_request: Request, limits: BodyLimits) -> bytes:
+    """Whole body of a request within the byte limit"""
+    return b"".join([chunk async for chunk in limited_stream(http_request, limits)])
+
+
+class StreamingJSONObject:
+    """
+    Incremental splitter of a JSON object body
+
+    Chunks are scanned for structural bytes only; text in between is copied
+    by slices. Elements of the top-level lists named in streamed are passed
+    to on_element(field, index, raw_bytes) as soon as they close, and those
+    lists are left empty in the skeleton. Elements must be arrays or objects.
+    """
+
+    def __init__(self, streamed: Tuple[str, ...], on_element: Callable[[str, int, bytes], None]):
+        self.streamed = set(streamed)
+        self.on_element = on_element
+
+        self.skeleton = bytearray()
+        self.seen: Dict[str, int] = {}
+
+        self._depth = 0
+        self._in_string = False
+        self._escaped_at = -1
+        self._offset = 0
+
+        self._field: Optional[str] = None
+        self._element = bytearray()
+
+    def _route(self, data: bytes):
+        """Send bytes to the skeleton, the open element or the separator check"""
+        if self._field is None:
+            self.skeleton += data
+        elif self._depth >= 3:
+            self._element += data
+        elif not _SEPARATORS.fullmatch(data):
+            raise ValueError(f"{self._field} must be a list of arrays or objects")
+
+    def feed(self, chunk: bytes):
+        """Scan the next chunk of the body"""
+        mark = 0
+        for match in _STRUCTURAL.finditer(chunk):
+            pos = match.start()
+            char = chunk[pos]
+
+            if self._in_string:
+                if self._offset + pos == self._escaped_at:
+                    continue
+                if char == 0x5C:  # backslash: the next byte is escaped
+                    self._escaped_at = self._offset + pos + 1
+                elif char == 0x22:
+                    self._in_string = False
+                continue
+
+            if char == 0x22:
+                self._in_string = True
+            elif char in (0x5B, 0x7B):  # [ {
+                if self._depth == 1 and char == 0x5B:
+                    self.skeleton += chunk[mark:pos]
+                    mark = pos
+                    key = _KEY.search(self.skeleton[-MAX_KEY_BYTES:])
+                    name = key.group(1).decode() if key else None
+                    if name in self.streamed:
+                        # The list stays empty in the skeleton; its elements are streamed
+                        self.skeleton += b"["
+                        self._field = name
+                        self.seen[name] = 0
+                        mark = pos + 1
+                elif self._depth == 2 and self._field is not None:
+                    self._route(chunk[mark:pos])
+                    mark = pos
+                self._depth += 1
+            elif char in (0x5D, 0x7D):  # ] }
+                self._depth -= 1
+                if self._field is not None and self._depth == 2:
+                    self._element += chunk[mark:pos + 1]
+                    mark = pos + 1
+                    index = self.seen[self._field]
+                    self.seen[self._field] = index + 1
+                    self.on_element(self._field, index, bytes(self._element))
+                    self._element.clear()
+                elif self._field is not None and self._depth == 1:
+                    self._route(chunk[mark:pos])
+                    self.skeleton += b"]"
+                    mark = pos + 1
+                    self._field = None
+
+        self._route(chunk[mark:])
+        self._offset += len(chunk)
+
+    def close(self) -> bytes:
+        """Skeleton document once the body has ended"""
+        if self._depth != 0 or self._in_string:
+            raise ValueError("Truncated JSON body")
+        return bytes(self.skeleton)
+
+
+def _list_item(annotation: Any) -> Any:
+    """Element type of a List[...] annotation (Optional unwrapped), or None if it is no list"""
+    if typing.get_origin(annotation) is typing.Union:
+        annotation = next(arg for arg in typing.get_args(annotation) if arg is not type(None))
+    if typing.get_origin(annotation) is not list:
+        return None
+    return typing.get_args(annotation)[0]
+
+
+class _MatrixRows:
+    """Collects List[List[float]] rows into a square float64 array allocated from the first row"""
+
+    def __init__(self, field: str, limits: BodyLimits):
+        self.field = field
+        self.limits = limits
+        self.array: Optional[np.ndarray] = None
+
+    def add(self, index: int, raw: bytes):
+        try:
+            row = np.asarray(pydantic_core.from_json(raw))
+        except ValueError:
+            raise _element_error(self.field, index, "Input should be a list of numbers")
+        if row.ndim != 1 or row.dtype.kind not in "biuf":
+            raise _element_error(self.field, index, "Input should be a list of numbers")
+
+        if self.array is None:
+            # Sized from the first row, so a single wide row must not allocate n x n
+            self.limits.check_matrix(self.field, len(row))
+            self.array = np.empty((len(row), len(row)), dtype=np.float64)
+        if index >= len(self.array) or len(row) != self.array.shape[1]:
+            raise _element_error(self.field, index, "Matrix must be square")
+        self.array[index] = row
+
+    def result(self, count: int) -> np.ndarray:
+        if self.array is None:
+            return np.empty((0, 0), dtype=np.float64)
+        if count != len(self.array):
+            raise _element_error(self.field, count, "Matrix must be square")
+        return self.array
+
+
+class _Items:
+    """Validates list elements one at a time"""
+
+    def __init__(self, field: str, item_type: Any):
+        self.field = field
+        self.adapter = TypeAdapter(item_type)
+        self.items: List[Any] = []
+
+    def add(self, index: int, raw: bytes):
+        try:
+            self.items.append(self.adapter.validate_json(raw))
+        except ValidationError as e:
+            raise RequestValidationError([
+                {**error, "loc": ("body", self.field, index) + tuple(error["loc"])}
+                for error in e.errors(include_url=False)
+            ])
+
+    def result(self, count: int) -> List[Any]:
+        return self.items
+
+
+def _element_error(field: str, index: int, message: str) -> RequestValidationError:
+    return RequestValidationError([{"type": "value_error", "loc": ("body", field, index), "msg": message, "input": None}])
+
+
+async def parse_streamed(
+    model: Type[BaseModel],
+    chunks: AsyncIterator[bytes],
+    streamed: Tuple[str, ...],
+    limits: BodyLimits
+) -> BaseModel:
+    """
+    Build a request model from a streamed JSON body
+
+    List[List[float]] fields named in streamed become square float64 NumPy
+    arrays; other streamed List[...] fields are validated element by
+    element. The remaining fields are validated as usual.
+
+    Args:
+        model: Request model
+        chunks: Body chunks (see limited_stream)
+        streamed: Names of the top-level list fields to stream
+        limits: Size limits (max_items applies to each streamed field)
+    """
+    collectors = {}
+    for name in streamed:
+        item_type = _list_item(model.model_fields[name].annotation)
+        if _list_item(item_type) is float:
+            collectors[name] = _MatrixRows(name, limits)
+        else:
+            collectors[name] = _Items(name, item_type)
+
+    def on_element(field: str, index: int, raw: bytes):
+        if index >= limits.max_items:
+            raise HTTPException(
+                status_code=413,
+                detail=f"{field} has more than the limit of {limits.max_items} elements"
+            )
+        collectors[field].add(index, raw)
+
+    parser = StreamingJSONObject(streamed, on_element)
+    try:
+        async for chunk in chunks:
+            parser.feed(chunk)
+        skeleton = parser.close()
+    except ValueError as e:
+        raise RequestValidationError([{"type": "json_invalid", "loc": ("body",), "msg": str(e), "input": None}])
+
+    try:
+        instance = model.model_validate_json(skeleton)
+    except ValidationError as e:
+        raise RequestValidationError([
+            {**error, "loc": ("body",) + tuple(error["loc"])} for error in e.errors(include_url=False)
+        ])
+
+    values = {name: collectors[name].result(count) for name, count in parser.seen.items()}
+    return instance.model_copy(update=values)
@@ -0,0 +1,335 @@
+"""
+Service metrics in the Prometheus text format
+Counters, gauges and histograms are updated in place (thread-safe, no I/O)
+and rendered on scrape. Collectors turn the stats() dicts of the caches,
+pools and stores into gauges at scrape time. MetricsMiddleware counts
+requests per endpoint, their latency and the requests in flight.
+
+Usage:
+    with STAGE_DURATION.time(pipeline="full", stage="encode"):
+        ...
+    text = REGISTRY.render()
+"""
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from starlette.routing import Match
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Latency buckets in seconds, from fast metric calls up to long tree reconstructions
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+# (name, type, help, [(labels, value)])
+Family = Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if math.isnan(value):
+        return "NaN"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    """Metric family with a fixed set of label names"""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], Any] = {}
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labels):
+            raise ValueError(f"{self.name} takes labels {self.labels}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        """(sample name, labels, value) of every labelled series"""
+        with self._lock:
+            return [(self.name, dict(zip(self.labels, key)), value) for key, value in self._values.items()]
+
+
+class Counter(_Metric):
+    """Monotonically increasing count"""
+
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+
+class Gauge(_Metric):
+    """Value that goes up and down"""
+
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+
+class Histogram(_Metric):
+    """Observations counted into cumulative buckets, with their sum and count"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["counts"][i] += 1
+                    break
+            series["sum"] += value
+            series["count"] += 1
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        """Observe the wall time of a block (also when it raises)"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def snapshot(self, **labels) -> Dict[str, Any]:
+        """Counts per bucket (not cumulative), sum and count of one series"""
+        with self._lock:
+            series = self._values.get(self._key(labels))
+            if series is None:
+                return {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            return {"counts": list(series["counts"]), "sum": series["sum"], "count": series["count"]}
+
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        rows = []
+        with self._lock:
+            for key, series in self._values.items():
+                labels = dict(zip(self.labels, key))
+                cumulative = 0
+                for bound, count in zip(self.buckets, series["counts"]):
+                    cumulative += count
+                    rows.append((f"{self.name}_bucket", {**labels, "le": _format_value(bound)}, cumulative))
+                rows.append((f"{self.name}_bucket", {**labels, "le": "+Inf"}, series["count"]))
+                rows.append((f"{self.name}_sum", labels, series["sum"]))
+                rows.append((f"{self.name}_count", labels, series["count"]))
+        return rows
+
+
+class MetricsRegistry:
+    """Metrics and scrape-time collectors rendered together"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], Iterable[Family]]] = []
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> Any:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric already registered: {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labels: Tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(name, help, labels))
+
+    def gauge(self, name: str, help: str, labels: Tuple[str, ...] = ()) -> Gauge:
+        return self._register(Gauge(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help, labels, buckets))
+
+    def add_collector(self, collect: Callable[[], Iterable[Family]]):
+        """Register a callable returning metric families at scrape time"""
+        self._collectors.append(collect)
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+        for collect in self._collectors:
+            try:
+                families = list(collect())
+            except Exception:
+                # A failing collector must not break the scrape
+                continue
+            for name, kind, help, samples in families:
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def stats_families(prefix: str, stats: Optional[Dict[str, Any]], label: Optional[str] = None) -> List[Family]:
+    """
+    Gauges from a stats() dict
+
+    Numeric values become '<prefix>_<key>' gauges (strings and None are
+    skipped). With label, the top-level keys are label values and the nested
+    dicts hold the values (e.g. pool="thread_pool").
+    """
+    if not stats:
+        return []
+    groups = stats.items() if label else [(None, stats)]
+
+    families: Dict[str, Family] = {}
+    for group, values in groups:
+        if not isinstance(values, dict):
+            continue
+        labels = {label: group} if label else {}
+        for key, value in values.items():
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            name = f"{prefix}_{key}"
+            family = families.setdefault(name, (name, "gauge", f"{prefix} {key.replace('_', ' ')}", []))
+            family[3].append((labels, float(value)))
+    return list(families.values())
+
+
+def process_families() -> List[Family]:
+    """Resident memory, CPU time and threads of this process (non-blocking psutil reads)"""
+    import psutil
+
+    process = psutil.Process()
+    cpu = process.cpu_times()
+    return [
+        ("process_resident_memory_bytes", "gauge", "Resident memory size in bytes", [({}, process.memory_info().rss)]),
+        ("process_cpu_seconds_total", "counter", "User and system CPU time in seconds", [({}, cpu.user + cpu.system)]),
+        ("process_threads", "gauge", "Number of OS threads", [({}, process.num_threads())]),
+        ("process_start_time_seconds", "gauge", "Start time since the epoch in seconds", [({}, process.create_time())])
+    ]
+
+
+# ---------------------------------------------------------------- service metrics
+
+REGISTRY = MetricsRegistry()
+
+HTTP_REQUESTS = REGISTRY.counter(
+    "http_requests_total", "HTTP requests by endpoint and status", ("method", "endpoint", "status")
+)
+HTTP_DURATION = REGISTRY.histogram(
+    "http_request_duration_seconds", "HTTP request latency by endpoint", ("method", "endpoint")
+)
+HTTP_IN_FLIGHT = REGISTRY.gauge(
+    "http_requests_in_flight", "HTTP requests being served by endpoint", ("endpoint",)
+)
+STAGE_DURATION = REGISTRY.histogram(
+    "pipeline_stage_duration_seconds",
+    "Time per stage (preprocess, encode, distance, nj, serialize) of the tree and full pipelines",
+    ("pipeline", "stage")
+)
+MODEL_TEXTS = REGISTRY.counter(
+    "embedding_model_texts_total", "Texts run through the embedding model (cache misses only)", ("backend",)
+)
+MODEL_DURATION = REGISTRY.histogram(
+    "embedding_model_inference_seconds", "Embedding model time per encode call", ("backend",)
+)
+
+
+def endpoint_of(scope: Dict[str, Any]) -> str:
+    """Path template of the route serving a request ('unmatched' if none), keeping label cardinality bounded"""
+    app = scope.get("app")
+    partial = None
+    for route in getattr(app, "routes", ()):
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+        if match == Match.PARTIAL and partial is None:
+            partial = route.path
+    return partial or "unmatched"
+
+
+class MetricsMiddleware:
+    """ASGI middleware counting requests, their latency and the requests in flight per endpoint"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        endpoint = endpoint_of(scope)
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc(endpoint=endpoint)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_IN_FLIGHT.dec(endpoint=endpoint)
+            HTTP_DURATION.observe(time.perf_counter() - start, method=method, endpoint=endpoint)
+            HTTP_REQUESTS.inc(method=method, endpoint=endpoint, status=status)
+
+
+def model_throughput_families() -> List[Family]:
+    """Texts per second of model time since start, per backend"""
+    samples = []
+    for _, labels, texts in MODEL_TEXTS.samples():
+        seconds = MODEL_DURATION.snapshot(**labels)["sum"]
+        samples.append((labels, texts / seconds if seconds > 0 else 0.0))
+    return [("embedding_model_texts_per_second", "gauge", "Embedding model throughput in texts per second", samples)]
+
+
+REGISTRY.add_collector(model_throughput_families)
+REGISTRY.add_collector(process_families)
@@ -3,13 +3,194 @@ Projection quality metrics module
 Vectorized implementations for performance with large datasets
 """
 import numpy as np
-from scipy.spatial import Delaunay
-from scipy.spatial.distance import squareform, pdist
+from scipy.spatial import Delaunay, cKDTree
+from scipy.spatial.distance import squareform, pdist, cdist
 from typing import List, Dict, Tuple, Optional, Any
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Temporaries of one row block of a rank matrix
+RANK_BLOCK_BYTES = 64 * 1024 * 1024
+
+
+def rank_matrix(D: np.ndarray, memory_budget_bytes: int = RANK_BLOCK_BYTES) -> np.ndarray:
+    """
+    Rank of every column in the ascending order of each row
+
+    ranks[i, j] is the position of j in D[i].argsort(kind='stable'), so
+    ties are broken by index. Rows are argsorted once, one block at a time,
+    so temporaries stay within the budget; ranks are stored as uint16 when
+    n <= 65536 (uint32 otherwise).
+
+    Args:
+        D: (n x n) distance matrix
+        memory_budget_bytes: Upper bound of the temporaries of one row block
+
+    Returns:
+        (n x n) rank matrix
+    """
+    n = D.shape[0]
+    ranks = np.empty((n, n), dtype=np.uint16 if n <= 1 << 16 else np.uint32)
+    positions = np.broadcast_to(np.arange(n, dtype=ranks.dtype), (n, n))
+
+    rows = int(max(1, memory_budget_bytes // (16 * max(n, 1))))
+    for start in range(0, n, rows):
+        end = min(start + rows, n)
+        order = np.argsort(D[start:end], axis=1, kind='stable')
+        np.put_along_axis(ranks[start:end], order, positions[:end - start], axis=1)
+    return ranks
+
+
+def upper_triangle_blocks(*matrices: np.ndarray, memory_budget_bytes: int = RANK_BLOCK_BYTES):
+    """
+    Strict upper-triangle values of square matrices, one row block at a time
+
+    Yields one float64 array per matrix for each block, in the same order
+    as D[np.triu_indices(n, k=1)], without materializing the index arrays.
+    """
+    n = matrices[0].shape[0]
+    rows = int(max(1, memory_budget_bytes // (32 * max(n, 1) * len(matrices))))
+    for start in range(0, n, rows):
+        end = min(start + rows, n)
+        mask = np.triu(np.ones((end - start, n - start), dtype=bool), 1)
+        yield tuple(np.asarray(M[start:end, start:], dtype=np.float64)[mask] for M in matrices)
+
+
+def pairwise_from_points(points: np.ndarray, memory_budget_bytes: int = RANK_BLOCK_BYTES) -> np.ndarray:
+    """
+    Dense euclidean distance matrix of low-dimensional coordinates
+
+    Rows are filled by cdist one block at a time, so the only N x N array
+    is the result (exactly symmetric, zero diagonal).
+    """
+    n = points.shape[0]
+    D = np.empty((n, n))
+    rows = int(max(1, memory_budget_bytes // (8 * max(n, 1))))
+    for start in range(0, n, rows):
+        end = min(start + rows, n)
+        D[start:end] = cdist(points[start:end], points)
+    return D
+
+
+def pair_ranks(
+    D: np.ndarray,
+    source: np.ndarray,
+    target: np.ndarray,
+    memory_budget_bytes: int = RANK_BLOCK_BYTES
+) -> np.ndarray:
+    """
+    rank_matrix(D)[source, target] without the rank matrix
+
+    The rank of a pair is the number of entries of its row that sort before
+    it: smaller distances, and equal distances at a lower index. Pairs are
+    processed in blocks of rows, so temporaries stay within the budget.
+
+    Returns:
+        ranks: int64 array aligned with source and target
+    """
+    n = D.shape[0]
+    ranks = np.empty(len(source), dtype=np.int64)
+    columns = np.arange(n)
+    block = int(max(1, memory_budget_bytes // (10 * max(n, 1))))
+    for start in range(0, len(source), block):
+        end = min(start + block, len(source))
+        rows = D[source[start:end]]
+        tgt = target[start:end]
+        value = rows[np.arange(end - start), tgt][:, None]
+        ranks[start:end] = ((rows < value) | ((rows == value) & (columns < tgt[:, None]))).sum(axis=1)
+    return ranks
+
+
+def knn_from_points(points: np.ndarray, k: int) -> np.ndarray:
+    """
+    k nearest neighbors of every point from a KD-tree (self excluded, nearest first)
+
+    Returns:
+        neighbors: (N, k) array of neighbor indices
+    """
+    n = points.shape[0]
+    if k >= n:
+        raise ValueError(f"k_neighbors must be smaller than the number of points ({n})")
+
+    _, indices = cKDTree(points).query(points, k=k + 1)
+    indices = indices.reshape(n, k + 1)
+    is_self = indices == np.arange(n)[:, None]
+    # Duplicate points can push a point out of its own result; drop the farthest instead
+    is_self[~is_self.any(axis=1), k] = True
+    return indices[~is_self].reshape(n, k)
+
+
+class CoordinateArtifacts:
+    """
+    Artifact cache for D_low matrices computed from coordinates
+
+    kNN lists of those matrices are answered by a KD-tree over the points
+    instead of a scan of the dense rows; everything else is delegated to
+    the wrapped cache.
+    """
+
+    def __init__(self, pairs: List[Tuple[np.ndarray, np.ndarray]], artifacts: Optional[Any] = None):
+        """
+        Args:
+            pairs: (D_low, points) of each coordinate-derived matrix
+            artifacts: Wrapped artifact cache (None computes directly)
+        """
+        self.pairs = pairs
+        self.artifacts = artifacts
+
+    def get(self, matrix: np.ndarray, kind: str, compute, *params) -> np.ndarray:
+        if kind == "knn":
+            for D_low, points in self.pairs:
+                if matrix is D_low:
+                    compute = lambda: knn_from_points(points, params[0])
+                    break
+        return derived(self.artifacts, matrix, kind, compute, *params)
+
+    def peek(self, matrix: np.ndarray, kind: str, *params) -> Optional[np.ndarray]:
+        return cached(self.artifacts, matrix, kind, *params)
+
+
+class ArtifactMemo:
+    """Artifacts memoized for the duration of one computation (keyed by array identity)"""
+
+    def __init__(self):
+        self._items: Dict[Tuple, Tuple[np.ndarray, np.ndarray]] = {}
+
+    def peek(self, matrix: np.ndarray, kind: str, *params) -> Optional[np.ndarray]:
+        item = self._items.get((id(matrix), kind) + params)
+        return item[1] if item is not None else None
+
+    def get(self, matrix: np.ndarray, kind: str, compute, *params) -> np.ndarray:
+        key = (id(matrix), kind) + params
+        if key not in self._items:
+            # Holding the matrix keeps its id from being reused
+            self._items[key] = (matrix, compute())
+        return self._items[key][1]
+
+
+def derived(artifacts: Optional[Any], matrix: np.ndarray, kind: str, compute, *params) -> np.ndarray:
+    """
+    Artifact of a matrix, memoized when an artifact cache is given
+
+    Args:
+        artifacts: Cache with get(matrix, kind, compute, *params), e.g. a
+            session's SessionArtifacts (None computes directly)
+        matrix: Array the artifact is derived from
+        kind: Artifact kind
+        compute: Builds the artifact
+        *params: Parameters the artifact depends on
+    """
+    if artifacts is None:
+        return compute()
+    return artifacts.get(matrix, kind, compute, *params)
+
+
+def cached(artifacts: Optional[Any], matrix: np.ndarray, kind: str, *params) -> Optional[np.ndarray]:
+    """Artifact of a matrix if the cache already holds it, else None (never computes)"""
+    peek = getattr(artifacts, "peek", None)
+    return peek(matrix, kind, *params) if peek is not None else None
+
 
 class ProjectionQualityMetrics:
     """
@@ -61,13 +242,72 @@ class ProjectionQualityMetrics:
         return errors, stats
 
     @staticmethod
-    def find_k_nearest_neighbors(D: np.ndarray, k: int) -> np.ndarray:
+    def find_k_nearest_neighbors(D: np.ndarray, k: int, artifacts: Optional[Any] = None) -> np.ndarray:
         """
         Find k nearest neighbors for each point
 
         Returns:
             neighbors: (N, k) array of neighbor indices
         """
+        return derived(artifacts, D, "knn", lambda: ProjectionQualityMetrics._k_nearest_neighbors(D, k), k)
+
+    @staticmethod
+    def distances_from_points(points: np.ndarray, artifacts: Optional[Any] = None) -> Tuple[np.ndarray, CoordinateArtifacts]:
+        """
+        Dense D_low of low-dimensional coordinates plus an artifact cache for it
+
+        Returns:
+            D_low: (N, N) euclidean distances (memoized by the given cache)
+            artifacts: Cache answering kNN queries of D_low with a KD-tree
+        """
+        D_low = derived(artifacts, points, "distances", lambda: pairwise_from_points(points))
+        return D_low, CoordinateArtifacts([(D_low, points)], artifacts)
+
+    @staticmethod
+    def compute_rank_matrix(D: np.ndarray, artifacts: Optional[Any] = None) -> np.ndarray:
+        """
+        Rank of each point in every row's neighbor order (see rank_matrix)
+
+        Returns:
+            ranks: (N, N) array, ranks[i, j] = position of j in D[i].argsort(kind='stable')
+        """
+        return derived(artifacts, D, "rank", lambda: rank_matrix(D))
+
+    @staticmethod
+    def find_rank_neighbors(D: np.ndarray, k: int, artifacts: Optional[Any] = None) -> np.ndarray:
+        """
+        k nearest neighbors in the tie order of the rank matrix (self excluded, nearest first)
+
+        Trustworthiness, continuity and the quality curves take their kNN
+        lists from here, so tied distances are resolved the same way in all.
+
+        Returns:
+            neighbors: (N, k) array of neighbor indices
+        """
+        return derived(
+            artifacts, D, "rank_knn",
+            lambda: ProjectionQualityMetrics._neighbors_from_ranks(
+                ProjectionQualityMetrics.compute_rank_matrix(D, artifacts), k
+            ),
+            k
+        )
+
+    @staticmethod
+    def _neighbors_from_ranks(ranks: np.ndarray, k: int) -> np.ndarray:
+        n = ranks.shape[0]
+        neighbors = np.empty((n, k), dtype=np.int64)
+        rows = int(max(1, RANK_BLOCK_BYTES // (24 * n)))
+        for start in range(0, n, rows):
+            end = min(start + rows, n)
+            block = ProjectionQualityMetrics._neighbor_ranks(ranks[start:end], start)
+            # Neighbor ranks of a row are a permutation of 1..n-1, so the k smallest are ranks 1..k
+            nearest = np.argpartition(block, k - 1, axis=1)[:, :k]
+            order = np.argsort(np.take_along_axis(block, nearest, axis=1), axis=1)
+            neighbors[start:end] = np.take_along_axis(nearest, order, axis=1)
+        return neighbors
+
+    @staticmethod
+    def _k_nearest_neighbors(D: np.ndarray, k: int) -> np.ndarray:
         n = D.shape[0]
         neighbors = np.zeros((n, k), dtype=int)
 
@@ -82,68 +322,81 @@ class ProjectionQualityMetrics:
         return neighbors
 
     @staticmethod
-    def compute_false_neighbors(
+    def compute_false_neighbor_pairs(
         D_high: np.ndarray,
-        D_low: np.ndarray,
+        D_low: Optional[np.ndarray],
         points_2d: np.ndarray,
-        k: int = 10
-    ) -> Tuple[List[Dict], List[Tuple[int, int]], Dict[str, float]]:
+        k: int = 10,
+        artifacts: Optional[Any] = None,
+        points_low: Optional[np.ndarray] = None
+    ) -> Tuple[Dict[str, np.ndarray], np.ndarray, Dict[str, float]]:
         """
-        Identify false neighbors using k-NN comparison and Delaunay triangulation
+        False neighbors and Delaunay edges as columnar arrays
 
         False neighbors: points that are neighbors in low-D but not in high-D
 
+        Membership of each low-D neighbor in the high-D kNN list is a single
+        (N x k x k) comparison, and distances of all false pairs are gathered
+        at once. Their ranks are looked up in a cached rank matrix when the
+        artifacts hold one, and otherwise counted per row block (pair_ranks),
+        so no N x N rank matrix is built for them. Without D_low, low-D
+        neighbors come from a KD-tree over points_low and only the distances
+        of the false pairs are computed (no dense D_low); rank_low is then the
+        position in the sorted neighbor list.
+
         Returns:
-            false_neighbors: List of false neighbor pairs with details
-            delaunay_edges: Edges from Delaunay triangulation
+            pairs: 'source', 'target', 'rank_high', 'rank_low', 'distance_high',
+                'distance_low' and 'error' arrays, in the order of the kNN lists
+            delaunay_edges: (E x 2) unique edges (i < j) of the triangulation
             metrics: False neighbors metrics
         """
         n = D_high.shape[0]
 
         # Find k-nearest neighbors in both spaces
-        neighbors_high = ProjectionQualityMetrics.find_k_nearest_neighbors(D_high, k)
-        neighbors_low = ProjectionQualityMetrics.find_k_nearest_neighbors(D_low, k)
+        neighbors_high = ProjectionQualityMetrics.find_k_nearest_neighbors(D_high, k, artifacts)
+        if D_low is not None:
+            neighbors_low = ProjectionQualityMetrics.find_k_nearest_neighbors(D_low, k, artifacts)
+        else:
+            neighbors_low = derived(artifacts, points_low, "knn", lambda: knn_from_points(points_low, k), k)
+
+        # False neighbors: in the low-D list but not in the high-D list
+        in_high = (neighbors_low[:, :, None] == neighbors_high[:, None, :]).any(axis=2)
+        source, position = np.nonzero(~in_high)
+        target = neighbors_low[source, position].astype(np.int64)
+
+        distance_high = D_high[source, target].astype(np.float64)
+        if D_low is not None:
+            rank_low = ProjectionQualityMetrics._pair_ranks(D_low, source, target, artifacts)
+            distance_low = D_low[source, target].astype(np.float64)
+        else:
+            rank_low = position + 1
+            distance_low = np.linalg.norm(points_low[source] - points_low[target], axis=1)
 
-        # Find false neighbors
-        false_neighbors = []
-        false_count = 0
-
-        for i in range(n):
-            high_set = set(neighbors_high[i])
-            low_set = set(neighbors_low[i])
-
-            # False neighbors: in low_set but not in high_set
-            false_for_i = low_set - high_set
-
-            for j in false_for_i:
-                false_count += 1
-                false_neighbors.append({
-                    'source': int(i),
-                    'target': int(j),
-                    'rank_high': int(np.where(D_high[i].argsort() == j)[0][0]) if j < n else -1,
-                    'rank_low': int(np.where(D_low[i].argsort() == j)[0][0]) if j < n else -1,
-                    'distance_high': float(D_high[i, j]),
-                    'distance_low': float(D_low[i, j]),
-                    'error': float((D_low[i, j] - D_high[i, j]) / max(D_high[i, j], D_low[i, j]))
-                })
+        with np.errstate(divide='ignore', invalid='ignore'):
+            error = (distance_low - distance_high) / np.maximum(distance_high, distance_low)
+
+        pairs = {
+            'source': source,
+            'target': target,
+            'rank_high': ProjectionQualityMetrics._pair_ranks(D_high, source, target, artifacts),
+            'rank_low': rank_low,
+            'distance_high': distance_high,
+            'distance_low': distance_low,
+            'error': error
+        }
 
         # Compute Delaunay triangulation for visualization
-        delaunay_edges = []
+        delaunay_edges = np.empty((0, 2), dtype=np.int64)
         if points_2d.shape[0] >= 3:
             try:
-                tri = Delaunay(points_2d)
-                edges_set = set()
-
-                for simplex in tri.simplices:
-                    for i in range(3):
-                        edge = tuple(sorted([simplex[i], simplex[(i + 1) % 3]]))
-                        edges_set.add(edge)
-
-                delaunay_edges = list(edges_set)
+                simplices = Delaunay(points_2d).simplices
+                edges = simplices[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2)
+                delaunay_edges = np.unique(np.sort(edges, axis=1), axis=0).astype(np.int64)
             except Exception as e:
                 logger.warning(f"Delaunay triangulation failed: {e}")
 
         # Compute metrics
+        false_count = len(source)
         total_neighbors = n * k
         metrics = {
             'total_false_neighbors': false_count,
@@ -152,59 +405,157 @@ class ProjectionQualityMetrics:
             'n_delaunay_edges': len(delaunay_edges)
         }
 
+        return pairs, delaunay_edges, metrics
+
+    @staticmethod
+    def _pair_ranks(D: np.ndarray, source: np.ndarray, target: np.ndarray, artifacts: Optional[Any]) -> np.ndarray:
+        """Ranks of pairs from a cached rank matrix, or counted without one"""
+        ranks = cached(artifacts, D, "rank")
+        if ranks is not None:
+            return ranks[source, target].astype(np.int64)
+        return pair_ranks(D, source, target)
+
+    @staticmethod
+    def compute_false_neighbors(
+        D_high: np.ndarray,
+        D_low: Optional[np.ndarray],
+        points_2d: np.ndarray,
+        k: int = 10,
+        artifacts: Optional[Any] = None,
+        points_low: Optional[np.ndarray] = None
+    ) -> Tuple[List[Dict], List[Tuple[int, int]], Dict[str, float]]:
+        """
+        Identify false neighbors using k-NN comparison and Delaunay triangulation
+        (record view of compute_false_neighbor_pairs)
+
+        Returns:
+            false_neighbors: List of false neighbor pairs with details
+            delaunay_edges: Edges from Delaunay triangulation
+            metrics: False neighbors metrics
+        """
+        pairs, edges, metrics = ProjectionQualityMetrics.compute_false_neighbor_pairs(
+            D_high, D_low, points_2d, k, artifacts, points_low
+        )
+        false_neighbors, delaunay_edges = ProjectionQualityMetrics.false_neighbor_records(pairs, edges)
+
         return false_neighbors, delaunay_edges, metrics
 
     @staticmethod
-    def compute_missing_neighbors_graph(
+    def false_neighbor_records(
+        pairs: Dict[str, np.ndarray],
+        edges: np.ndarray
+    ) -> Tuple[List[Dict], List[Tuple[int, int]]]:
+        """One dict per false pair and a list of edge tuples from the columnar arrays"""
+        columns = {name: array.tolist() for name, array in pairs.items()}
+        false_neighbors = [dict(zip(columns, values)) for values in zip(*columns.values())]
+        return false_neighbors, [tuple(edge) for edge in edges.tolist()]
+
+    @staticmethod
+    def compute_missing_neighbors_edges(
         D_high: np.ndarray,
-        D_low: np.ndarray,
+        D_low: Optional[np.ndarray],
         k: int = 10,
-        threshold: float = 0.5
-    ) -> Tuple[Dict[int, List[int]], Dict[int, int], Dict[str, float]]:
+        threshold: float = 0.5,
+        artifacts: Optional[Any] = None,
+        points_low: Optional[np.ndarray] = None
+    ) -> Tuple[Dict[str, np.ndarray], np.ndarray, Dict[str, float]]:
         """
-        Build graph of missing neighbors
+        Missing neighbors as edge arrays
 
         Missing neighbors: points that are neighbors in high-D but far in low-D
+        (percentile rank of their low-D distance above threshold)
+
+        Each low-D row is sorted once, with the point itself excluded, and the
+        percentile ranks of all k high-D neighbors of the row are found
+        together with searchsorted. Rows are processed in blocks; without
+        D_low they are computed from points_low, so no dense D_low is built.
 
         Returns:
-            graph: Adjacency list of missing neighbors
-            missing_count: Count of missing neighbors per point
+            edges: 'source', 'target', 'rank_low' (points at most as far in
+                low-D) and 'percentile' arrays, in the order of the kNN lists
+            missing_count: (N,) number of missing neighbors per point
             stats: Missing neighbors statistics
         """
         n = D_high.shape[0]
 
         # Find k-nearest neighbors in high-D
-        neighbors_high = ProjectionQualityMetrics.find_k_nearest_neighbors(D_high, k)
-
-        # Build missing neighbors graph
-        graph = {i: [] for i in range(n)}
-        missing_count = {i: 0 for i in range(n)}
-        total_missing = 0
-
-        for i in range(n):
-            for j in neighbors_high[i]:
-                # Check if j is far in low-D (above threshold percentile)
-                low_distances = D_low[i].copy()
-                low_distances[i] = np.inf
-                percentile_rank = np.sum(low_distances <= D_low[i, j]) / (n - 1)
-
-                if percentile_rank > threshold:
-                    graph[i].append(int(j))
-                    missing_count[i] += 1
-                    total_missing += 1
+        neighbors_high = ProjectionQualityMetrics.find_k_nearest_neighbors(D_high, k, artifacts)
+
+        # Low-D rank of every high-D neighbor
+        ranks = np.empty(neighbors_high.shape, dtype=np.int64)
+        rows = int(max(1, RANK_BLOCK_BYTES // (16 * max(n, 1))))
+        for start in range(0, n, rows):
+            end = min(start + rows, n)
+            if D_low is not None:
+                block = np.array(D_low[start:end], dtype=np.float64)
+            else:
+                block = cdist(points_low[start:end], points_low)
+            local = np.arange(end - start)
+            block[local, start + local] = np.inf
+
+            values = np.take_along_axis(block, neighbors_high[start:end], axis=1)
+            block.sort(axis=1)
+            for r in local:
+                ranks[start + r] = np.searchsorted(block[r], values[r], side='right')
+
+        percentile = ranks / (n - 1)
+        missing = percentile > threshold
+        source, position = np.nonzero(missing)
+        edges = {
+            'source': source,
+            'target': neighbors_high[source, position].astype(np.int64),
+            'rank_low': ranks[source, position],
+            'percentile': percentile[source, position]
+        }
+        missing_count = missing.sum(axis=1)
 
         # Compute statistics
-        missing_values = list(missing_count.values())
+        total_missing = len(source)
         stats = {
             'total_missing_neighbors': total_missing,
             'missing_neighbors_ratio': total_missing / (n * k) if n * k > 0 else 0,
-            'avg_missing_per_point': np.mean(missing_values) if missing_values else 0,
-            'max_missing_per_point': max(missing_values) if missing_values else 0,
-            'points_with_missing': sum(1 for v in missing_values if v > 0)
+            'avg_missing_per_point': float(np.mean(missing_count)) if n else 0,
+            'max_missing_per_point': int(missing_count.max()) if n else 0,
+            'points_with_missing': int(np.count_nonzero(missing_count))
         }
 
+        return edges, missing_count, stats
+
+    @staticmethod
+    def compute_missing_neighbors_graph(
+        D_high: np.ndarray,
+        D_low: Optional[np.ndarray],
+        k: int = 10,
+        threshold: float = 0.5,
+        artifacts: Optional[Any] = None,
+        points_low: Optional[np.ndarray] = None
+    ) -> Tuple[Dict[int, List[int]], Dict[int, int], Dict[str, float]]:
+        """
+        Build graph of missing neighbors (adjacency-list view of compute_missing_neighbors_edges)
+
+        Returns:
+            graph: Adjacency list of missing neighbors
+            missing_count: Count of missing neighbors per point
+            stats: Missing neighbors statistics
+        """
+        edges, counts, stats = ProjectionQualityMetrics.compute_missing_neighbors_edges(
+            D_high, D_low, k, threshold, artifacts, points_low
+        )
+        graph, missing_count = ProjectionQualityMetrics.missing_neighbors_adjacency(edges, counts)
+
         return graph, missing_count, stats
 
+    @staticmethod
+    def missing_neighbors_adjacency(
+        edges: Dict[str, np.ndarray],
+        counts: np.ndarray
+    ) -> Tuple[Dict[int, List[int]], Dict[int, int]]:
+        """Adjacency list and per-point counts from missing neighbor edge arrays"""
+        graph = {i: [] for i in range(len(counts))}
+        for source, target in zip(edges['source'].tolist(), edges['target'].tolist()):
+            graph[source].append(target)
+        return graph, dict(enumerate(counts.tolist()))
+
     @staticmethod
     def analyze_groups(
         D_high: np.ndarray,
@@ -214,94 +565,71 @@ class ProjectionQualityMetrics:
         """
         Analyze projection quality per group
 
+        Group sums come from matrix products with the one-hot group matrix G:
+        (M @ G)[i, g] sums row i over group g, and G.T @ M @ G sums every
+        block of group pairs, so all per-group values take one BLAS pass per
+        matrix (distance matrices are assumed symmetric).
+
         Returns:
             group_metrics: List of metrics for each group
             confusion_matrix: Group confusion matrix
             global_metrics: Global quality metrics
         """
-        unique_groups = np.unique(groups)
+        unique_groups, labels = np.unique(groups, return_inverse=True)
         n_groups = len(unique_groups)
-        group_metrics = []
-
-        # Compute projection errors
-        errors, _ = ProjectionQualityMetrics.compute_projection_errors(D_high, D_low)
-
-        for group_id in unique_groups:
-            mask = groups == group_id
-            indices = np.where(mask)[0]
-            size = len(indices)
-
-            if size == 0:
-                continue
-
-            # Intra-group metrics
-            intra_errors = []
-            intra_high = []
-            intra_low = []
-
-            for i in range(size):
-                for j in range(i + 1, size):
-                    idx_i, idx_j = indices[i], indices[j]
-                    intra_errors.append(errors[idx_i, idx_j])
-                    intra_high.append(D_high[idx_i, idx_j])
-                    intra_low.append(D_low[idx_i, idx_j])
-
-            # Inter-group metrics
-            inter_errors = []
-            inter_high = []
-            inter_low = []
-
-            other_indices = np.where(groups != group_id)[0]
-            for i in indices:
-                for j in other_indices:
-                    inter_errors.append(errors[i, j])
-                    inter_high.append(D_high[i, j])
-                    inter_low.append(D_low[i, j])
-
-            # Cohesion (avg intra-group distance) and Separation (avg inter-group distance)
-            cohesion_high = np.mean(intra_high) if intra_high else 0
-            cohesion_low = np.mean(intra_low) if intra_low else 0
-            separation_high = np.mean(inter_high) if inter_high else 0
-            separation_low = np.mean(inter_low) if inter_low else 0
+        G = ProjectionQualityMetrics._one_hot(labels, n_groups)
+        sizes = G.sum(axis=0)
+
+        # Group sums of the projection errors, one row block at a time (no N x N error matrix)
+        n = len(labels)
+        error_sums = np.empty((n, n_groups))
+        rows = int(max(1, RANK_BLOCK_BYTES // (32 * max(n, 1))))
+        for start in range(0, n, rows):
+            end = min(start + rows, n)
+            error_sums[start:end] = ProjectionQualityMetrics._error_block(D_high, D_low, start, end) @ G
+
+        group_sums = {'error': error_sums, 'high': D_high @ G, 'low': D_low @ G}
+        diagonals = {'error': np.zeros(n), 'high': np.diagonal(D_high), 'low': np.diagonal(D_low)}
+
+        # Mean over pairs i < j within each group and over (i in g, j not in g)
+        intra_pairs = sizes * (sizes - 1) / 2
+        inter_pairs = sizes * (n - sizes)
+        means = {}
+        for name, sums in group_sums.items():
+            within = np.diag(G.T @ sums)
+            intra = (within - G.T @ diagonals[name]) / 2
+            inter = G.T @ sums.sum(axis=1) - within
+            with np.errstate(divide='ignore', invalid='ignore'):
+                means[name] = (
+                    np.where(intra_pairs > 0, intra / intra_pairs, 0),
+                    np.where(inter_pairs > 0, inter / inter_pairs, 0)
+                )
 
+        group_metrics = []
+        for g, group_id in enumerate(unique_groups):
             group_metrics.append({
                 'group_id': int(group_id),
-                'size': int(size),
-                'intra_group_error': float(np.mean(intra_errors)) if intra_errors else 0,
-                'inter_group_error': float(np.mean(inter_errors)) if inter_errors else 0,
-                'cohesion_high': float(cohesion_high),
-                'cohesion_low': float(cohesion_low),
-                'separation_high': float(separation_high),
-                'separation_low': float(separation_low)
+                'size': int(sizes[g]),
+                'intra_group_error': float(means['error'][0][g]),
+                'inter_group_error': float(means['error'][1][g]),
+                'cohesion_high': float(means['high'][0][g]),
+                'cohesion_low': float(means['low'][0][g]),
+                'separation_high': float(means['high'][1][g]),
+                'separation_low': float(means['low'][1][g])
             })
 
-        # Build confusion matrix based on nearest group assignment
+        # Confusion matrix: each point is assigned the group with the smallest mean low-D distance
+        predicted = np.argmin(group_sums['low'] / sizes, axis=1)
         confusion_matrix = np.zeros((n_groups, n_groups))
-
-        for i, true_group in enumerate(groups):
-            # Find nearest group centroid in low-D
-            min_dist = np.inf
-            pred_group = true_group
-
-            for group_id in unique_groups:
-                group_indices = np.where(groups == group_id)[0]
-                if len(group_indices) > 0:
-                    avg_dist = np.mean([D_low[i, j] for j in group_indices])
-                    if avg_dist < min_dist:
-                        min_dist = avg_dist
-                        pred_group = group_id
-
-            true_idx = np.where(unique_groups == true_group)[0][0]
-            pred_idx = np.where(unique_groups == pred_group)[0][0]
-            confusion_matrix[true_idx, pred_idx] += 1
+        np.add.at(confusion_matrix, (labels, predicted), 1)
 
         # Normalize confusion matrix
         row_sums = confusion_matrix.sum(axis=1, keepdims=True)
-        confusion_matrix = np.divide(confusion_matrix, row_sums, where=row_sums != 0)
+        confusion_matrix = np.divide(confusion_matrix, row_sums, out=np.zeros_like(confusion_matrix), where=row_sums != 0)
 
         # Global metrics
-        silhouette_high = ProjectionQualityMetrics._compute_silhouette(D_high, groups)
-        silhouette_low = ProjectionQualityMetrics._compute_silhouette(D_low, groups)
+        silhouette_high = ProjectionQualityMetrics._compute_silhouette(D_high, groups, group_sums['high'])
+        silhouette_low = ProjectionQualityMetrics._compute_silhouette(D_low, groups, group_sums['low'])
 
         global_metrics = {
             'silhouette_high': float(silhouette_high),
@@ -317,50 +645,66 @@ class ProjectionQualityMetrics:
         return group_metrics, confusion_matrix.tolist(), global_metrics
 
     @staticmethod
-    def _compute_silhouette(D: np.ndarray, groups: np.ndarray) -> float:
-        """Compute silhouette coefficient"""
+    def _error_block(D_high: np.ndarray, D_low: np.ndarray, start: int, end: int) -> np.ndarray:
+        """Rows start:end of the error matrix of compute_projection_errors"""
+        high = D_high[start:end]
+        low = D_low[start:end]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            max_distances = np.maximum(high, low)
+            block = np.where(max_distances > 1e-10, (low - high) / max_distances, 0.0)
+        local = np.arange(end - start)
+        block[local, start + local] = 0
+        return block
+
+    @staticmethod
+    def _one_hot(labels: np.ndarray, n_groups: int) -> np.ndarray:
+        """(N, n_groups) indicator matrix of group labels 0..n_groups-1"""
+        G = np.zeros((len(labels), n_groups))
+        G[np.arange(len(labels)), labels] = 1.0
+        return G
+
+    @staticmethod
+    def _compute_silhouette(D: np.ndarray, groups: np.ndarray, group_sums: Optional[np.ndarray] = None) -> float:
+        """Compute silhouette coefficient (group_sums: precomputed D @ one-hot groups)"""
         n = len(groups)
-        silhouettes = []
+        if n == 0:
+            return 0
 
-        for i in range(n):
-            group_i = groups[i]
+        unique_groups, labels = np.unique(groups, return_inverse=True)
+        G = ProjectionQualityMetrics._one_hot(labels, len(unique_groups))
+        sizes = G.sum(axis=0)
+        rows = np.arange(n)
 
-            # a(i): avg distance to same group
-            same_group = np.where((groups == group_i) & (np.arange(n) != i))[0]
-            if len(same_group) > 0:
-                a_i = np.mean(D[i, same_group])
-            else:
-                a_i = 0
-
-            # b(i): min avg distance to other groups
-            b_i = np.inf
-            for group_j in np.unique(groups):
-                if group_j != group_i:
-                    other_group = np.where(groups == group_j)[0]
-                    if len(other_group) > 0:
-                        avg_dist = np.mean(D[i, other_group])
-                        b_i = min(b_i, avg_dist)
-
-            if b_i == np.inf:
-                b_i = 0
-
-            # Silhouette coefficient
-            if max(a_i, b_i) > 0:
-                s_i = (b_i - a_i) / max(a_i, b_i)
-            else:
-                s_i = 0
+        # Mean distance of every point to every group
+        if group_sums is None:
+            group_sums = D @ G
+
+        # a(i): avg distance to same group (itself excluded)
+        same_size = sizes[labels] - 1
+        with np.errstate(divide='ignore', invalid='ignore'):
+            a = np.where(same_size > 0, (group_sums[rows, labels] - D[rows, rows]) / same_size, 0)
+
+        # b(i): min avg distance to other groups
+        mean_to_group = group_sums / sizes
+        mean_to_group[rows, labels] = np.inf
+        b = mean_to_group.min(axis=1)
+        b[np.isinf(b)] = 0
 
-            silhouettes.append(s_i)
+        # Silhouette coefficient
+        scale = np.maximum(a, b)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            silhouettes = np.where(scale > 0, (b - a) / scale, 0)
 
-        return np.mean(silhouettes) if silhouettes else 0
+        return np.mean(silhouettes)
 
     @staticmethod
     def compare_projections(
         D_high: np.ndarray,
-        projections: Dict[str, np.ndarray]
+        projections: Dict[str, np.ndarray],
+        artifacts: Optional[Any] = None
     ) -> Tuple[List[Dict], Dict[str, List[str]], str, np.ndarray]:
         """
-        Compare multiple projection methods
+        Compare multiple projection methods (sequentially; see ProjectionComparison)
 
         Returns:
             projection_metrics: List of metrics for each projection
@@ -368,43 +712,271 @@ class ProjectionQualityMetrics:
             best_projection: Name of best projection
             comparison_matrix: Pairwise similarity between projections
         """
-        projection_metrics = []
+        comparison = ProjectionComparison(D_high, artifacts=artifacts)
+        comparison.prepare()
+        results = [comparison.evaluate(name, D_low) for name, D_low in projections.items()]
+        return comparison.summarize(results)
+
+    @staticmethod
+    def compute_quality_curves(
+        D_high: np.ndarray,
+        D_low: np.ndarray,
+        max_k: int = 30,
+        artifacts: Optional[Any] = None
+    ) -> Dict[str, List[float]]:
+        """
+        Trustworthiness, continuity and false/missing-neighbor ratios for k = 1..max_k
+
+        Every pair (i, j) only matters while its neighbor rank is at most
+        max_k in one of the spaces, and its contribution is the same for a
+        whole interval of k (e.g. a low-D neighbor of rank b that has rank a
+        in high-D is a false neighbor for b <= k < a, with penalty a - k).
+        These intervals are accumulated as difference arrays over k from the
+        two rank matrices, so the whole curve costs about as much as one k.
+
+        Returns:
+            curves: 'k' plus one list per metric, aligned with k
+        """
         n = D_high.shape[0]
+        K = min(max_k, n - 1)
+        if K < 1:
+            raise ValueError("At least 2 points required for quality curves")
+
+        ranks_high = ProjectionQualityMetrics.compute_rank_matrix(D_high, artifacts)
+        ranks_low = ProjectionQualityMetrics.compute_rank_matrix(D_low, artifacts)
+
+        # [count, rank sum] difference arrays over k of false (trust) and missing (continuity) pairs
+        false_diff = np.zeros((2, K + 2))
+        missing_diff = np.zeros((2, K + 2))
+
+        rows = int(max(1, RANK_BLOCK_BYTES // (48 * n)))
+        for start in range(0, n, rows):
+            end = min(start + rows, n)
+            a = ProjectionQualityMetrics._neighbor_ranks(ranks_high[start:end], start)
+            b = ProjectionQualityMetrics._neighbor_ranks(ranks_low[start:end], start)
+
+            for diff, near, far in ((false_diff, b, a), (missing_diff, a, b)):
+                # Neighbor in one space from k = near, in both from k = far
+                mask = (near <= K) & (far > near)
+                first = near[mask]
+                last = np.minimum(far[mask], K + 1)
+                weights = far[mask].astype(np.float64)
+                diff[0] += np.bincount(first, minlength=K + 2) - np.bincount(last, minlength=K + 2)
+                diff[1] += (np.bincount(first, weights, minlength=K + 2)
+                            - np.bincount(last, weights, minlength=K + 2))
+
+        k = np.arange(1, K + 1)
+        false_count, false_ranks = np.cumsum(false_diff, axis=1)[:, 1:K + 1]
+        missing_count, missing_ranks = np.cumsum(missing_diff, axis=1)[:, 1:K + 1]
 
-        for name, D_low in projections.items():
-            # Stress (Kruskal)
-            stress = ProjectionQualityMetrics._compute_stress(D_high, D_low)
-
-            # Trustworthiness and Continuity
-            k = min(10, n - 1)
-            trust = ProjectionQualityMetrics._compute_trustworthiness(D_high, D_low, k)
-            cont = ProjectionQualityMetrics._compute_continuity(D_high, D_low, k)
-
-            # Error metrics
-            errors, stats = ProjectionQualityMetrics.compute_projection_errors(D_high, D_low)
-
-            # False/Missing neighbors
-            neighbors_high = ProjectionQualityMetrics.find_k_nearest_neighbors(D_high, k)
-            neighbors_low = ProjectionQualityMetrics.find_k_nearest_neighbors(D_low, k)
-
-            false_count = 0
-            missing_count = 0
-
-            for i in range(n):
-                high_set = set(neighbors_high[i])
-                low_set = set(neighbors_low[i])
-                false_count += len(low_set - high_set)
-                missing_count += len(high_set - low_set)
-
-            projection_metrics.append({
-                'name': name,
-                'stress': float(stress),
-                'trustworthiness': float(trust),
-                'continuity': float(cont),
-                'avg_error': float(stats['mean_error']),
-                'false_neighbors_ratio': float(false_count / (n * k)) if n * k > 0 else 0,
-                'missing_neighbors_ratio': float(missing_count / (n * k)) if n * k > 0 else 0
-            })
+        max_sum = (n * k * (2 * n - 3 * k - 1)) / 2
+        with np.errstate(divide='ignore', invalid='ignore'):
+            trust = np.where(max_sum > 0, 1 - 2 * (false_ranks - k * false_count) / max_sum, 1.0)
+            cont = np.where(max_sum > 0, 1 - 2 * (missing_ranks - k * missing_count) / max_sum, 1.0)
+
+        return {
+            'k': k.tolist(),
+            'trustworthiness': trust.tolist(),
+            'continuity': cont.tolist(),
+            'false_neighbors_ratio': (false_count / (n * k)).tolist(),
+            'missing_neighbors_ratio': (missing_count / (n * k)).tolist()
+        }
+
+    @staticmethod
+    def _neighbor_ranks(ranks: np.ndarray, start: int) -> np.ndarray:
+        """1-based neighbor ranks of a row block with the point itself excluded (self gets n)"""
+        n = ranks.shape[1]
+        local = np.arange(ranks.shape[0])
+        block = ranks.astype(np.int64)
+        self_rank = block[local, start + local]
+        block += block < self_rank[:, None]
+        block[local, start + local] = n
+        return block
+
+    @staticmethod
+    def _compute_stress(D_high: np.ndarray, D_low: np.ndarray) -> float:
+        """Compute Kruskal stress"""
+        numerator = 0.0
+        denominator = 0.0
+        for d_high, d_low in upper_triangle_blocks(D_high, D_low):
+            numerator += np.sum((d_high - d_low) ** 2)
+            denominator += np.sum(d_high ** 2)
+
+        return np.sqrt(numerator / denominator) if denominator > 0 else 0
+
+    @staticmethod
+    def _rank_penalty(
+        neighbors: np.ndarray,
+        reference_neighbors: np.ndarray,
+        reference_ranks: np.ndarray,
+        k: int
+    ) -> float:
+        """Sum of max(0, rank - k) over neighbors missing from the reference kNN lists (ranks as in _neighbor_ranks)"""
+        rows = np.arange(neighbors.shape[0])[:, None]
+        shared = (neighbors[:, :, None] == reference_neighbors[:, None, :]).any(axis=2)
+        ranks = reference_ranks[rows, neighbors].astype(np.int64)
+        ranks += ranks < reference_ranks[rows, rows].astype(np.int64)
+        return float(np.maximum(ranks - k, 0)[~shared].sum())
+
+    @staticmethod
+    def _compute_trustworthiness(D_high: np.ndarray, D_low: np.ndarray, k: int, artifacts: Optional[Any] = None) -> float:
+        """Compute trustworthiness metric"""
+        n = D_high.shape[0]
+        neighbors_high = ProjectionQualityMetrics.find_rank_neighbors(D_high, k, artifacts)
+        neighbors_low = ProjectionQualityMetrics.find_rank_neighbors(D_low, k, artifacts)
+
+        # Rank in high-D of low-D neighbors that are not high-D neighbors
+        ranks_high = ProjectionQualityMetrics.compute_rank_matrix(D_high, artifacts)
+        trust_sum = ProjectionQualityMetrics._rank_penalty(neighbors_low, neighbors_high, ranks_high, k)
+
+        max_sum = (n * k * (2 * n - 3 * k - 1)) / 2
+        return 1 - (2 * trust_sum / max_sum) if max_sum > 0 else 1
+
+    @staticmethod
+    def _compute_continuity(D_high: np.ndarray, D_low: np.ndarray, k: int, artifacts: Optional[Any] = None) -> float:
+        """Compute continuity metric"""
+        n = D_high.shape[0]
+        neighbors_high = ProjectionQualityMetrics.find_rank_neighbors(D_high, k, artifacts)
+        neighbors_low = ProjectionQualityMetrics.find_rank_neighbors(D_low, k, artifacts)
+
+        # Rank in low-D of high-D neighbors that are not low-D neighbors
+        ranks_low = ProjectionQualityMetrics.compute_rank_matrix(D_low, artifacts)
+        cont_sum = ProjectionQualityMetrics._rank_penalty(neighbors_high, neighbors_low, ranks_low, k)
+
+        max_sum = (n * k * (2 * n - 3 * k - 1)) / 2
+        return 1 - (2 * cont_sum / max_sum) if max_sum > 0 else 1
+
+    @staticmethod
+    def _procrustes_similarity(D1: np.ndarray, D2: np.ndarray) -> float:
+        """Compute similarity between two distance matrices using Procrustes"""
+        # Correlation of the upper triangular parts, accumulated block by block
+        count = 0
+        sum1 = 0.0
+        sum2 = 0.0
+        for d1, d2 in upper_triangle_blocks(D1, D2):
+            count += len(d1)
+            sum1 += np.sum(d1)
+            sum2 += np.sum(d2)
+        if count == 0:
+            return 0
+
+        mean1, mean2 = sum1 / count, sum2 / count
+        var1 = var2 = cov = 0.0
+        for d1, d2 in upper_triangle_blocks(D1, D2):
+            c1 = d1 - mean1
+            c2 = d2 - mean2
+            var1 += np.dot(c1, c1)
+            var2 += np.dot(c2, c2)
+            cov += np.dot(c1, c2)
+
+        if var1 <= 0 or var2 <= 0:
+            return 0
+        similarity = cov / np.sqrt(var1 * var2)
+        return max(0, similarity)  # Ensure non-negative
+
+
+class ProjectionComparison:
+    """
+    Comparison engine for candidate projections of one D_high
+
+    prepare() computes every D_high artifact once (kNN lists, rank matrix,
+    sum of squared distances). evaluate() only reads them, so candidates can
+    be evaluated concurrently in a worker pool; each evaluation also keeps
+    its standardized upper triangle (float32), from which summarize() builds
+    the whole Procrustes similarity matrix as one Gram product.
+    """
+
+    # Elements of the upper-triangle vectors per float64 Gram chunk
+    GRAM_CHUNK = 1 << 20
+
+    def __init__(self, D_high: np.ndarray, k: Optional[int] = None, artifacts: Optional[Any] = None):
+        """
+        Initialize the comparison
+
+        Args:
+            D_high: High-dimensional distance matrix
+            k: Neighbors for trustworthiness, continuity and false/missing ratios (default min(10, N-1))
+            artifacts: Artifact cache (e.g. a session's); per-comparison memo if None
+        """
+        self.D_high = D_high
+        self.n = D_high.shape[0]
+        self.k = min(10, self.n - 1) if k is None else k
+        self.artifacts = artifacts if artifacts is not None else ArtifactMemo()
+
+        self.neighbors_high: Optional[np.ndarray] = None
+        self.ranks_high: Optional[np.ndarray] = None
+        self.high_sum_squares = 0.0
+
+    def prepare(self):
+        """Compute the D_high artifacts shared by all candidates"""
+        self.neighbors_high = ProjectionQualityMetrics.find_rank_neighbors(self.D_high, self.k, self.artifacts)
+        self.ranks_high = ProjectionQualityMetrics.compute_rank_matrix(self.D_high, self.artifacts)
+        self.high_sum_squares = sum(float(np.dot(d, d)) for d, in upper_triangle_blocks(self.D_high))
+
+    def evaluate(self, name: str, D_low: np.ndarray) -> Dict[str, Any]:
+        """
+        Metrics of one candidate (thread-safe once prepare() has run)
+
+        Returns:
+            {'metrics': metrics dict, 'upper': standardized upper triangle of D_low}
+        """
+        n, k = self.n, self.k
+        m = n * (n - 1) // 2
+
+        # One pass over the upper triangles: stress, mean error and the flattened D_low
+        upper = np.empty(m, dtype=np.float32)
+        stress_sum = 0.0
+        error_sum = 0.0
+        offset = 0
+        for d_high, d_low in upper_triangle_blocks(self.D_high, D_low):
+            stress_sum += float(np.sum((d_high - d_low) ** 2))
+            max_distances = np.maximum(d_high, d_low)
+            mask = max_distances > 1e-10
+            error_sum += float(np.sum((d_low[mask] - d_high[mask]) / max_distances[mask]))
+            upper[offset:offset + len(d_low)] = d_low
+            offset += len(d_low)
+
+        stress = np.sqrt(stress_sum / self.high_sum_squares) if self.high_sum_squares > 0 else 0
+        mean_error = error_sum / m if m else 0.0
+
+        # Standardize so that dot products are Pearson correlations
+        if m:
+            upper -= upper.mean(dtype=np.float64)
+            norm = np.sqrt(sum(float(np.dot(chunk.astype(np.float64), chunk))
+                               for chunk in np.array_split(upper, max(1, m // self.GRAM_CHUNK))))
+            if norm > 0:
+                upper /= norm
+
+        # Trustworthiness and Continuity
+        neighbors_low = ProjectionQualityMetrics.find_rank_neighbors(D_low, k, self.artifacts)
+        ranks_low = ProjectionQualityMetrics.compute_rank_matrix(D_low, self.artifacts)
+        max_sum = (n * k * (2 * n - 3 * k - 1)) / 2
+        trust_sum = ProjectionQualityMetrics._rank_penalty(neighbors_low, self.neighbors_high, self.ranks_high, k)
+        cont_sum = ProjectionQualityMetrics._rank_penalty(self.neighbors_high, neighbors_low, ranks_low, k)
+
+        # False/Missing neighbors
+        false_count = int((~(neighbors_low[:, :, None] == self.neighbors_high[:, None, :]).any(axis=2)).sum())
+        missing_count = int((~(self.neighbors_high[:, :, None] == neighbors_low[:, None, :]).any(axis=2)).sum())
+
+        metrics = {
+            'name': name,
+            'stress': float(stress),
+            'trustworthiness': float(1 - (2 * trust_sum / max_sum) if max_sum > 0 else 1),
+            'continuity': float(1 - (2 * cont_sum / max_sum) if max_sum > 0 else 1),
+            'avg_error': float(mean_error),
+            'false_neighbors_ratio': float(false_count / (n * k)) if n * k > 0 else 0,
+            'missing_neighbors_ratio': float(missing_count / (n * k)) if n * k > 0 else 0
+        }
+        return {'metrics': metrics, 'upper': upper}
+
+    def summarize(self, results: List[Dict[str, Any]]) -> Tuple[List[Dict], Dict[str, List[str]], str, List[List[float]]]:
+        """
+        Rankings, combined scores and Procrustes similarities of evaluated candidates
+
+        Returns:
+            projection_metrics, rankings, best_projection, comparison_matrix (as compare_projections)
+        """
+        projection_metrics = [result['metrics'] for result in results]
 
         # Compute rankings
         metrics_to_rank = ['stress', 'trustworthiness', 'continuity', 'avg_error',
@@ -434,88 +1006,15 @@ class ProjectionQualityMetrics:
 
         best_projection = max(projection_metrics, key=lambda x: x['combined_score'])['name']
 
-        # Compute pairwise similarity between projections
-        proj_names = list(projections.keys())
-        n_proj = len(proj_names)
-        comparison_matrix = np.zeros((n_proj, n_proj))
-
-        for i in range(n_proj):
-            for j in range(n_proj):
-                if i == j:
-                    comparison_matrix[i, j] = 1.0
-                else:
-                    # Compare using Procrustes distance
-                    D1 = projections[proj_names[i]]
-                    D2 = projections[proj_names[j]]
-                    similarity = ProjectionQualityMetrics._procrustes_similarity(D1, D2)
-                    comparison_matrix[i, j] = similarity
-
-        return projection_metrics, rankings, best_projection, comparison_matrix.tolist()
-
-    @staticmethod
-    def _compute_stress(D_high: np.ndarray, D_low: np.ndarray) -> float:
-        """Compute Kruskal stress"""
-        upper_tri = np.triu_indices(D_high.shape[0], k=1)
-        d_high = D_high[upper_tri]
-        d_low = D_low[upper_tri]
-
-        numerator = np.sum((d_high - d_low) ** 2)
-        denominator = np.sum(d_high ** 2)
+        # Pairwise similarity: correlations of the standardized upper triangles, accumulated in float64
+        n_proj = len(results)
+        gram = np.zeros((n_proj, n_proj))
+        m = len(results[0]['upper']) if results else 0
+        for start in range(0, m, self.GRAM_CHUNK):
+            chunk = np.stack([result['upper'][start:start + self.GRAM_CHUNK] for result in results]).astype(np.float64)
+            gram += chunk @ chunk.T
 
-        return np.sqrt(numerator / denominator) if denominator > 0 else 0
-
-    @staticmethod
-    def _compute_trustworthiness(D_high: np.ndarray, D_low: np.ndarray, k: int) -> float:
-        """Compute trustworthiness metric"""
-        n = D_high.shape[0]
-        neighbors_high = ProjectionQualityMetrics.find_k_nearest_neighbors(D_high, k)
-        neighbors_low = ProjectionQualityMetrics.find_k_nearest_neighbors(D_low, k)
-
-        trust_sum = 0
-        for i in range(n):
-            low_set = set(neighbors_low[i])
-            for j in low_set:
-                if j not in neighbors_high[i]:
-                    # Rank of j in high-D
-                    rank_high = np.where(D_high[i].argsort() == j)[0][0]
-                    trust_sum += max(0, rank_high - k)
+        comparison_matrix = np.maximum(gram, 0)  # Ensure non-negative
+        np.fill_diagonal(comparison_matrix, 1.0)
 
-        max_sum = (n * k * (2 * n - 3 * k - 1)) / 2
-        return 1 - (2 * trust_sum / max_sum) if max_sum > 0 else 1
-
-    @staticmethod
-    def _compute_continuity(D_high: np.ndarray, D_low: np.ndarray, k: int) -> float:
-        """Compute continuity metric"""
-        n = D_high.shape[0]
-        neighbors_high = ProjectionQualityMetrics.find_k_nearest_neighbors(D_high, k)
-        neighbors_low = ProjectionQualityMetrics.find_k_nearest_neighbors(D_low, k)
-
-        cont_sum = 0
-        for i in range(n):
-            high_set = set(neighbors_high[i])
-            for j in high_set:
-                if j not in neighbors_low[i]:
-                    # Rank of j in low-D
-                    rank_low = np.where(D_low[i].argsort() == j)[0][0]
-                    cont_sum += max(0, rank_low - k)
-
-        max_sum = (n * k * (2 * n - 3 * k - 1)) / 2
-        return 1 - (2 * cont_sum / max_sum) if max_sum > 0 else 1
-
-    @staticmethod
-    def _procrustes_similarity(D1: np.ndarray, D2: np.ndarray) -> float:
-        """Compute similarity between two distance matrices using Procrustes"""
-        # Flatten upper triangular parts
-        upper_tri = np.triu_indices(D1.shape[0], k=1)
-        d1 = D1[upper_tri]
-        d2 = D2[upper_tri]
-
-        # Normalize
-        d1_norm = (d1 - np.mean(d1)) / np.std(d1) if np.std(d1) > 0 else d1
-        d2_norm = (d2 - np.mean(d2)) / np.std(d2) if np.std(d2) > 0 else d2
-
-        # Compute correlation as similarity
-        if len(d1_norm) > 0:
-            similarity = np.corrcoef(d1_norm, d2_norm)[0, 1]
-            return max(0, similarity)  # Ensure non-negative
-        return 0
\ No newline at end of file
+        return projection_metrics, rankings, best_projection, comparison_matrix.tolist()
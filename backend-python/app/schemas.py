@@ -1,34 +1,55 @@
 """
 Pydantic schemas for projection quality metrics
 """
-from pydantic import BaseModel, Field, field_validator
-from typing import List, Dict, Optional, Tuple, Any
+from pydantic import BaseModel, Field, field_validator, model_validator
+from typing import List, Dict, Optional, Tuple, Any, Literal
 import numpy as np
+from app.array_fields import DistanceMatrix, PointArray, EmbeddingArray
 
 
-class ProjectionErrorsRequest(BaseModel):
-    """Request for computing projection errors"""
-    D_high: List[List[float]] = Field(..., description="High-dimensional distance matrix (NxN)")
-    D_low: List[List[float]] = Field(..., description="Low-dimensional distance matrix (NxN)")
+SESSION_ID_DESCRIPTION = "Matrix session supplying the matrices omitted from this request"
+POINTS_LOW_DESCRIPTION = "Low-dimensional coordinates (Nxd); D_low is computed server-side when D_low is not given"
 
-    @field_validator('D_high', 'D_low')
-    @classmethod
-    def validate_square_matrix(cls, v):
-        n = len(v)
-        for row in v:
-            if len(row) != n:
-                raise ValueError("Matrix must be square")
-        return v
 
-    @field_validator('D_high', 'D_low')
-    @classmethod
-    def validate_symmetric(cls, v):
-        n = len(v)
-        for i in range(n):
-            for j in range(i+1, n):
-                if abs(v[i][j] - v[j][i]) > 1e-10:
-                    raise ValueError("Matrix must be symmetric")
-        return v
+class SessionCreateRequest(BaseModel):
+    """Request for uploading matrices into a server-side session"""
+    D_high: Optional[DistanceMatrix] = Field(default=None, description="High-dimensional distance matrix (NxN)")
+    D_low: Optional[DistanceMatrix] = Field(default=None, description="Low-dimensional distance matrix (NxN)")
+    embeddings: Optional[EmbeddingArray] = Field(
+        default=None,
+        description="Embeddings (Nxd); D_high is computed from them when it is not given"
+    )
+    distance_metric: Literal["cosine", "euclidean"] = Field(
+        default="cosine",
+        description="Metric of the D_high computed from embeddings"
+    )
+    points_2d: Optional[PointArray] = Field(default=None, description="2D coordinates (Nx2)")
+    points_low: Optional[PointArray] = Field(default=None, description=POINTS_LOW_DESCRIPTION)
+    projections: Optional[Dict[str, DistanceMatrix]] = Field(
+        default=None,
+        description="Dictionary of projection_name -> D_low matrix"
+    )
+    projection_points: Optional[Dict[str, PointArray]] = Field(
+        default=None,
+        description="Dictionary of projection_name -> low-dimensional coordinates"
+    )
+
+
+class SessionResponse(BaseModel):
+    """Description of a matrix session"""
+    session_id: str
+    arrays: Dict[str, List[int]] = Field(..., description="Shape of each stored array")
+    artifacts: List[str] = Field(..., description="Cached derived artifacts (kind:array:params)")
+    nbytes: int = Field(..., description="Memory held by arrays and artifacts")
+    created_at: float
+
+
+class ProjectionErrorsRequest(BaseModel):
+    """Request for computing projection errors"""
+    D_high: Optional[DistanceMatrix] = Field(default=None, description="High-dimensional distance matrix (NxN)")
+    D_low: Optional[DistanceMatrix] = Field(default=None, description="Low-dimensional distance matrix (NxN)")
+    points_low: Optional[PointArray] = Field(default=None, description=POINTS_LOW_DESCRIPTION)
+    session_id: Optional[str] = Field(default=None, description=SESSION_ID_DESCRIPTION)
 
 
 class ProjectionErrorsResponse(BaseModel):
@@ -39,38 +60,93 @@ class ProjectionErrorsResponse(BaseModel):
 
 class FalseNeighborsRequest(BaseModel):
     """Request for computing false neighbors"""
-    D_high: List[List[float]] = Field(..., description="High-dimensional distance matrix")
-    D_low: List[List[float]] = Field(..., description="Low-dimensional distance matrix")
-    points_2d: List[List[float]] = Field(..., description="2D coordinates for visualization")
+    D_high: Optional[DistanceMatrix] = Field(default=None, description="High-dimensional distance matrix")
+    D_low: Optional[DistanceMatrix] = Field(default=None, description="Low-dimensional distance matrix")
+    points_low: Optional[PointArray] = Field(default=None, description=POINTS_LOW_DESCRIPTION)
+    points_2d: Optional[PointArray] = Field(
+        default=None,
+        description="2D coordinates for visualization (defaults to 2D points_low)"
+    )
+    session_id: Optional[str] = Field(default=None, description=SESSION_ID_DESCRIPTION)
     k_neighbors: int = Field(default=10, ge=1, le=100, description="Number of neighbors to consider")
+    output: Literal["records", "columns"] = Field(
+        default="records", description="One object per false pair or columnar pair arrays"
+    )
+
+
+class FalseNeighborPairs(BaseModel):
+    """False neighbors as parallel arrays"""
+    source: List[int] = Field(..., description="Point whose low-D neighbor is false")
+    target: List[int] = Field(..., description="The false neighbor")
+    rank_high: List[int] = Field(..., description="Rank of target among the neighbors of source in high-D")
+    rank_low: List[int] = Field(..., description="Rank of target among the neighbors of source in low-D")
+    distance_high: List[float] = Field(..., description="High-D distance of the pair")
+    distance_low: List[float] = Field(..., description="Low-D distance of the pair")
+    error: List[float] = Field(..., description="Normalized distance error of the pair")
 
 
 class FalseNeighborsResponse(BaseModel):
     """Response with false neighbors analysis"""
-    false_neighbors: List[Dict[str, Any]] = Field(..., description="List of false neighbor pairs")
+    false_neighbors: Optional[List[Dict[str, Any]]] = Field(default=None, description="List of false neighbor pairs (records output)")
+    false_neighbor_pairs: Optional[FalseNeighborPairs] = Field(default=None, description="Pair arrays (columns output)")
     delaunay_edges: List[Tuple[int, int]] = Field(..., description="Delaunay triangulation edges")
     metrics: Dict[str, float] = Field(..., description="False neighbors metrics")
 
 
 class MissingNeighborsRequest(BaseModel):
     """Request for missing neighbors graph"""
-    D_high: List[List[float]] = Field(..., description="High-dimensional distance matrix")
-    D_low: List[List[float]] = Field(..., description="Low-dimensional distance matrix")
+    D_high: Optional[DistanceMatrix] = Field(default=None, description="High-dimensional distance matrix")
+    D_low: Optional[DistanceMatrix] = Field(default=None, description="Low-dimensional distance matrix")
+    points_low: Optional[PointArray] = Field(default=None, description=POINTS_LOW_DESCRIPTION)
+    session_id: Optional[str] = Field(default=None, description=SESSION_ID_DESCRIPTION)
     k_neighbors: int = Field(default=10, ge=1, le=100, description="Number of neighbors")
     threshold: float = Field(default=0.5, ge=0, le=1, description="Distance threshold")
+    output: Literal["graph", "edges"] = Field(
+        default="graph", description="Adjacency-list graph or columnar edge arrays"
+    )
+
+
+class MissingNeighborEdges(BaseModel):
+    """Missing neighbors as parallel edge arrays"""
+    source: List[int] = Field(..., description="Point whose high-D neighbor is missing in low-D")
+    target: List[int] = Field(..., description="The missing neighbor")
+    rank_low: List[int] = Field(..., description="Number of points at most as far from source in low-D")
+    percentile: List[float] = Field(..., description="rank_low / (N - 1)")
+    missing_count: List[int] = Field(..., description="Count of missing neighbors per point")
 
 
 class MissingNeighborsResponse(BaseModel):
     """Response with missing neighbors graph"""
-    graph: Dict[int, List[int]] = Field(..., description="Adjacency list of missing neighbors")
-    missing_count: Dict[int, int] = Field(..., description="Count of missing neighbors per point")
+    graph: Optional[Dict[int, List[int]]] = Field(default=None, description="Adjacency list of missing neighbors (graph output)")
+    missing_count: Optional[Dict[int, int]] = Field(default=None, description="Count of missing neighbors per point (graph output)")
+    edges: Optional[MissingNeighborEdges] = Field(default=None, description="Edge arrays (edges output)")
     stats: Dict[str, float] = Field(..., description="Missing neighbors statistics")
 
 
+class QualityCurvesRequest(BaseModel):
+    """Request for quality-vs-k curves"""
+    D_high: Optional[DistanceMatrix] = Field(default=None, description="High-dimensional distance matrix")
+    D_low: Optional[DistanceMatrix] = Field(default=None, description="Low-dimensional distance matrix")
+    points_low: Optional[PointArray] = Field(default=None, description=POINTS_LOW_DESCRIPTION)
+    session_id: Optional[str] = Field(default=None, description=SESSION_ID_DESCRIPTION)
+    max_k: int = Field(default=30, ge=1, le=500, description="Largest number of neighbors (curves cover 1..max_k)")
+
+
+class QualityCurvesResponse(BaseModel):
+    """Response with quality metrics for every k"""
+    k: List[int] = Field(..., description="Neighborhood sizes 1..max_k (capped at N-1)")
+    trustworthiness: List[float] = Field(..., description="Trustworthiness for each k")
+    continuity: List[float] = Field(..., description="Continuity for each k")
+    false_neighbors_ratio: List[float] = Field(..., description="Ratio of false neighbors for each k")
+    missing_neighbors_ratio: List[float] = Field(..., description="Ratio of missing neighbors for each k")
+
+
 class GroupAnalysisRequest(BaseModel):
     """Request for group-based projection analysis"""
-    D_high: List[List[float]] = Field(..., description="High-dimensional distance matrix")
-    D_low: List[List[float]] = Field(..., description="Low-dimensional distance matrix")
+    D_high: Optional[DistanceMatrix] = Field(default=None, description="High-dimensional distance matrix")
+    D_low: Optional[DistanceMatrix] = Field(default=None, description="Low-dimensional distance matrix")
+    points_low: Optional[PointArray] = Field(default=None, description=POINTS_LOW_DESCRIPTION)
+    session_id: Optional[str] = Field(default=None, description=SESSION_ID_DESCRIPTION)
     groups: List[int] = Field(..., description="Group labels for each point")
 
     @field_validator('groups')
@@ -104,18 +180,23 @@ class GroupAnalysisResponse(BaseModel):
 
 class ProjectionCompareRequest(BaseModel):
     """Request for comparing multiple projections"""
-    D_high: List[List[float]] = Field(..., description="High-dimensional distance matrix")
-    projections: Dict[str, List[List[float]]] = Field(
-        ...,
+    D_high: Optional[DistanceMatrix] = Field(default=None, description="High-dimensional distance matrix")
+    projections: Optional[Dict[str, DistanceMatrix]] = Field(
+        default=None,
         description="Dictionary of projection_name -> D_low matrix"
     )
-
-    @field_validator('projections')
-    @classmethod
-    def validate_projections(cls, v):
-        if len(v) < 2:
-            raise ValueError("At least 2 projections required for comparison")
-        return v
+    projection_points: Optional[Dict[str, PointArray]] = Field(
+        default=None,
+        description="Dictionary of projection_name -> low-dimensional coordinates (instead of projections)"
+    )
+    session_id: Optional[str] = Field(default=None, description=SESSION_ID_DESCRIPTION)
+
+    @model_validator(mode='after')
+    def validate_projections(self):
+        if self.projections is not None or self.projection_points is not None:
+            if len(self.projections or {}) + len(self.projection_points or {}) < 2:
+                raise ValueError("At least 2 projections required for comparison")
+        return self
 
 
 class ProjectionMetrics(BaseModel):
@@ -0,0 +1,231 @@
+"""
+Server-side matrix sessions
+Distance matrices, embeddings and projections are uploaded once and then
+referenced by ID from the projection-quality endpoints. Each session also
+caches artifacts derived from its arrays (kNN lists, rank matrices), and
+the store evicts least recently used sessions to stay within a byte budget
+"""
+import os
+import time
+import uuid
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class MatrixSession:
+    """Arrays uploaded under one session ID plus the artifacts derived from them"""
+
+    def __init__(self, session_id: str, arrays: Dict[str, np.ndarray]):
+        self.session_id = session_id
+        self.arrays = dict(arrays)
+        self.artifacts: Dict[Tuple, np.ndarray] = {}
+        self.created_at = time.time()
+
+    @property
+    def nbytes(self) -> int:
+        return sum(a.nbytes for a in self.arrays.values()) + sum(a.nbytes for a in self.artifacts.values())
+
+    def name_of(self, matrix: np.ndarray) -> Optional[str]:
+        """
+        Name of the session array or artifact that is this very object
+
+        Artifacts are named by their joined key (e.g. 'distances:points_low'),
+        so artifacts of derived matrices are cached as well. Arrays sent
+        inline with a request have no name.
+        """
+        for name, array in self.arrays.items():
+            if array is matrix:
+                return name
+        for key, artifact in list(self.artifacts.items()):
+            if artifact is matrix:
+                return ":".join(str(part) for part in key)
+        return None
+
+    def describe(self) -> Dict[str, Any]:
+        """Shapes, artifacts and size of the session"""
+        return {
+            "session_id": self.session_id,
+            "arrays": {name: list(array.shape) for name, array in self.arrays.items()},
+            "artifacts": [":".join(str(part) for part in key) for key in self.artifacts],
+            "nbytes": self.nbytes,
+            "created_at": self.created_at
+        }
+
+
+class SessionArtifacts:
+    """
+    Artifact cache handed to ProjectionQualityMetrics
+
+    Artifacts of session arrays are memoized in the session; artifacts of
+    arrays sent inline with a request are computed without caching.
+    """
+
+    def __init__(self, store: "SessionStore", session: MatrixSession):
+        self.store = store
+        self.session = session
+
+    def get(self, matrix: np.ndarray, kind: str, compute: Callable[[], np.ndarray], *params) -> np.ndarray:
+        """
+        Artifact of a matrix, computing it on first use
+
+        Args:
+            matrix: Array the artifact is derived from
+            kind: Artifact kind (e.g. 'knn')
+            compute: Builds the artifact on a cache miss
+            *params: Parameters the artifact depends on (e.g. k)
+        """
+        name = self.session.name_of(matrix)
+        if name is None:
+            return compute()
+        return self.store.derived(self.session, (kind, name) + params, compute)
+
+    def peek(self, matrix: np.ndarray, kind: str, *params) -> Optional[np.ndarray]:
+        """Artifact of a matrix if it is already cached (never computes)"""
+        name = self.session.name_of(matrix)
+        if name is None:
+            return None
+        return self.store.cached(self.session, (kind, name) + params)
+
+
+class SessionStore:
+    """
+    In-memory LRU of matrix sessions, bounded by the bytes of arrays and artifacts
+
+    Thread-safe, since the metrics run in the worker thread pool. A session
+    larger than the whole budget is rejected at upload.
+    """
+
+    def __init__(self, memory_budget_bytes: int = 1024 * 1024 * 1024):
+        """
+        Initialize the store
+
+        Args:
+            memory_budget_bytes: Byte budget shared by all sessions
+        """
+        self.memory_budget_bytes = memory_budget_bytes
+
+        self._sessions: "OrderedDict[str, MatrixSession]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.artifact_hits = 0
+        self.artifact_misses = 0
+        self.evictions = 0
+
+    @classmethod
+    def from_env(cls) -> "SessionStore":
+        """Create the store with a budget of SESSION_MEMORY_MB (default 1024)"""
+        memory_mb = int(os.getenv("SESSION_MEMORY_MB", "1024"))
+        return cls(memory_budget_bytes=memory_mb * 1024 * 1024)
+
+    def _evict(self, keep: Optional[str] = None):
+        """Drop least recently used sessions (other than keep) until within budget"""
+        for session_id in list(self._sessions):
+            if self._bytes <= self.memory_budget_bytes:
+                break
+            if session_id == keep:
+                continue
+            evicted = self._sessions.pop(session_id)
+            self._bytes -= evicted.nbytes
+            self.evictions += 1
+            logger.info(f"Evicted matrix session {session_id} ({evicted.nbytes} bytes)")
+
+    def create(self, arrays: Dict[str, np.ndarray]) -> MatrixSession:
+        """
+        Store arrays under a new session ID
+
+        Args:
+            arrays: Named arrays (e.g. D_high, D_low, embeddings, projections.<name>)
+
+        Returns:
+            The new session
+        """
+        session = MatrixSession(uuid.uuid4().hex, arrays)
+        if session.nbytes > self.memory_budget_bytes:
+            raise ValueError(
+                f"Session needs {session.nbytes} bytes, more than the store budget of {self.memory_budget_bytes}"
+            )
+
+        with self._lock:
+            self._sessions[session.session_id] = session
+            self._bytes += session.nbytes
+            self._evict(keep=session.session_id)
+        return session
+
+    def get(self, session_id: str) -> MatrixSession:
+        """Session by ID (raises KeyError if unknown or evicted)"""
+        with self._lock:
+            session = self._sessions[session_id]
+            self._sessions.move_to_end(session_id)
+            return session
+
+    def delete(self, session_id: str) -> bool:
+        """Drop a session, returning whether it existed"""
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+            if session is None:
+                return False
+            self._bytes -= session.nbytes
+            return True
+
+    def artifacts(self, session: MatrixSession) -> SessionArtifacts:
+        """Artifact cache of a session"""
+        return SessionArtifacts(self, session)
+
+    def derived(self, session: MatrixSession, key: Tuple, compute: Callable[[], np.ndarray]) -> np.ndarray:
+        """
+        Memoized artifact of a session
+
+        The artifact is computed outside the lock; two concurrent misses may
+        both compute it, and the first result is kept.
+        """
+        with self._lock:
+            artifact = session.artifacts.get(key)
+            if artifact is not None:
+                self.artifact_hits += 1
+                return artifact
+            self.artifact_misses += 1
+
+        artifact = compute()
+
+        with self._lock:
+            if key in session.artifacts:
+                return session.artifacts[key]
+            if session.session_id not in self._sessions or artifact.nbytes > self.memory_budget_bytes:
+                return artifact
+            session.artifacts[key] = artifact
+            self._bytes += artifact.nbytes
+            self._evict(keep=session.session_id)
+            if self._bytes > self.memory_budget_bytes:
+                # Only this session is left; keep its arrays and drop the artifact
+                del session.artifacts[key]
+                self._bytes -= artifact.nbytes
+        return artifact
+
+    def cached(self, session: MatrixSession, key: Tuple) -> Optional[np.ndarray]:
+        """Memoized artifact of a session, or None if it was not computed"""
+        with self._lock:
+            artifact = session.artifacts.get(key)
+            if artifact is not None:
+                self.artifact_hits += 1
+            return artifact
+
+    def stats(self) -> Dict[str, Any]:
+        """Session counts, memory use and artifact hit ratio"""
+        with self._lock:
+            lookups = self.artifact_hits + self.artifact_misses
+            return {
+                "sessions": len(self._sessions),
+                "memory_bytes": self._bytes,
+                "memory_budget_bytes": self.memory_budget_bytes,
+                "artifacts": sum(len(s.artifacts) for s in self._sessions.values()),
+                "artifact_hits": self.artifact_hits,
+                "artifact_misses": self.artifact_misses,
+                "artifact_hit_ratio": self.artifact_hits / lookups if lookups else 0.0,
+                "evictions": self.evictions
+            }
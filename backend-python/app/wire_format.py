@@ -0,0 +1,429 @@
+"""
+Binary wire formats for matrices and embeddings
+Request and response bodies can carry their numeric arrays as raw
+little-endian float32, NumPy .npz archives or Arrow IPC streams instead of
+nested JSON lists (selected with Content-Type and Accept). JSON stays the
+default.
+
+Every binary body holds a bundle: named arrays plus the remaining JSON
+fields of the model. Arrays of a dict field are named "<field>.<key>".
+"""
+import io
+import json
+import struct
+import typing
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type
+import numpy as np
+from fastapi import HTTPException, Request
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import Response, StreamingResponse
+from pydantic import BaseModel, ValidationError
+from app.array_fields import NumpyArray
+from app.json_stream import BodyLimits, limited_stream, parse_streamed, read_body
+
+JSON = "application/json"
+RAW = "application/x-float32"
+NPZ = "application/x-npz"
+ARROW = "application/vnd.apache.arrow.stream"
+
+BINARY_FORMATS = (RAW, NPZ, ARROW)
+
+# dtypes accepted in request bodies
+ALLOWED_DTYPES = ("<f4", "<f8", "<i4", "<i8")
+
+# Arrays in raw bodies start at multiples of this many bytes
+RAW_ALIGNMENT = 8
+
+NPZ_FIELDS = "__fields__"
+
+
+class UnsupportedFormat(Exception):
+    """A wire format whose optional dependency is not installed (415 for requests, 406 for responses)"""
+
+
+def media_type(header: Optional[str]) -> str:
+    """Media type of a Content-Type header, without parameters"""
+    return (header or JSON).split(";")[0].strip().lower()
+
+
+def negotiate(accept: Optional[str]) -> str:
+    """
+    Pick the response format from an Accept header
+
+    The supported type with the highest quality wins (earlier entries win
+    ties); a missing header, */* or only unsupported types give JSON. Arrow
+    is only offered when pyarrow is installed.
+    """
+    best, best_quality = JSON, 0.0
+    for part in (accept or "").split(","):
+        pieces = part.split(";")
+        candidate = pieces[0].strip().lower()
+        quality = 1.0
+        for parameter in pieces[1:]:
+            name, _, value = parameter.partition("=")
+            if name.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if candidate == ARROW and not arrow_available():
+            continue
+        if (candidate == JSON or candidate in BINARY_FORMATS) and quality > best_quality:
+            best, best_quality = candidate, quality
+    return best
+
+
+def _fields_json(fields: Dict[str, Any], raw_fields: Optional[Dict[str, str]] = None) -> str:
+    """JSON object of the fields, splicing in values that are already serialized"""
+    body = json.dumps(fields)
+    for name, raw in (raw_fields or {}).items():
+        separator = "," if body != "{}" else ""
+        body = f"{body[:-1]}{separator}{json.dumps(name)}:{raw}}}"
+    return body
+
+
+def _check_dtype(name: str, array: np.ndarray) -> np.ndarray:
+    """Reject dtypes other than 32/64-bit floats and integers; convert to little-endian"""
+    dtype = array.dtype.newbyteorder("<") if array.dtype.byteorder == ">" else array.dtype
+    if dtype.str not in ALLOWED_DTYPES:
+        raise ValueError(f"Unsupported dtype {array.dtype.str} for array {name}")
+    return array.astype(dtype, copy=False)
+
+
+def _response_array(array: np.ndarray) -> np.ndarray:
+    """Floats go out as float32, integers as int64, both little-endian and contiguous"""
+    array = np.asarray(array)
+    dtype = "<f4" if array.dtype.kind == "f" else "<i8"
+    return np.ascontiguousarray(array, dtype=dtype)
+
+
+# ---------------------------------------------------------------- raw
+
+def encode_raw(
+    fields: Dict[str, Any],
+    arrays: Dict[str, np.ndarray],
+    raw_fields: Optional[Dict[str, str]] = None
+) -> List[Any]:
+    """
+    Raw bundle as a list of chunks (array chunks are views, not copies)
+
+    Layout: uint32 header length, UTF-8 JSON header
+    {"fields": {...}, "arrays": [{"name", "dtype", "shape"}]}, then the
+    array buffers in header order, each starting at an 8-byte boundary.
+    """
+    arrays = {name: _response_array(array) for name, array in arrays.items()}
+    header = (
+        '{"fields":' + _fields_json(fields, raw_fields) + ',"arrays":' +
+        json.dumps([{"name": name, "dtype": array.dtype.str, "shape": list(array.shape)}
+                    for name, array in arrays.items()]) + "}"
+    ).encode("utf-8")
+
+    chunks: List[Any] = [struct.pack("<I", len(header)), header]
+    offset = 4 + len(header)
+    for array in arrays.values():
+        padding = -offset % RAW_ALIGNMENT
+        if padding:
+            chunks.append(b"\0" * padding)
+        chunks.append(memoryview(array).cast("B"))
+        offset += padding + array.nbytes
+    return chunks
+
+
+def decode_raw(body: bytes) -> Tuple[Dict[str, Any], Dict[str, np.ndarray]]:
+    """Read a raw bundle; arrays are read-only views of the body"""
+    if len(body) < 4:
+        raise ValueError("Body too short for a raw header")
+    (header_length,) = struct.unpack_from("<I", body)
+    header = json.loads(bytes(body[4:4 + header_length]).decode("utf-8"))
+
+    arrays = {}
+    offset = 4 + header_length
+    for spec in header.get("arrays", []):
+        dtype = np.dtype(spec.get("dtype", "<f4"))
+        if dtype.str not in ALLOWED_DTYPES:
+            raise ValueError(f"Unsupported dtype {dtype.str} for array {spec['name']}")
+        if any(size < 0 for size in spec["shape"]):
+            raise ValueError(f"Invalid shape for array {spec['name']}")
+        shape = tuple(int(size) for size in spec["shape"])
+        offset += -offset % RAW_ALIGNMENT
+        count = int(np.prod(shape))
+        if offset + count * dtype.itemsize > len(body):
+            raise ValueError(f"Body too short for array {spec['name']}")
+        arrays[spec["name"]] = np.frombuffer(body, dtype=dtype, count=count, offset=offset).reshape(shape)
+        offset += count * dtype.itemsize
+
+    return header.get("fields", {}), arrays
+
+
+# ---------------------------------------------------------------- npz
+
+def encode_npz(
+    fields: Dict[str, Any],
+    arrays: Dict[str, np.ndarray],
+    raw_fields: Optional[Dict[str, str]] = None
+) -> bytes:
+    """Uncompressed .npz archive: one .npy member per array plus the JSON fields"""
+    buffer = io.BytesIO()
+    np.savez(
+        buffer,
+        **{NPZ_FIELDS: np.array(_fields_json(fields, raw_fields))},
+        **{name: _response_array(array) for name, array in arrays.items()}
+    )
+    return buffer.getvalue()
+
+
+def decode_npz(body: bytes) -> Tuple[Dict[str, Any], Dict[str, np.ndarray]]:
+    with np.load(io.BytesIO(body), allow_pickle=False) as archive:
+        fields = json.loads(str(archive[NPZ_FIELDS])) if NPZ_FIELDS in archive.files else {}
+        arrays = {name: _check_dtype(name, archive[name]) for name in archive.files if name != NPZ_FIELDS}
+    return fields, arrays
+
+
+# ---------------------------------------------------------------- arrow
+
+def arrow_available() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc  # noqa: F401
+    except ImportError:
+        raise UnsupportedFormat("Arrow IPC requires the pyarrow package")
+    return pyarrow
+
+
+def encode_arrow(
+    fields: Dict[str, Any],
+    arrays: Dict[str, np.ndarray],
+    raw_fields: Optional[Dict[str, str]] = None
+) -> bytes:
+    """
+    Arrow IPC stream with one single-row record batch
+
+    Each array is a list column over its flattened values (shared with
+    NumPy, not copied) with its shape in the field metadata; the JSON
+    fields are in the schema metadata.
+    """
+    pa = _pyarrow()
+    columns, schema_fields = [], []
+    for name, array in arrays.items():
+        array = _response_array(array)
+        values = pa.array(array.reshape(-1))
+        columns.append(pa.LargeListArray.from_arrays(pa.array([0, array.size], type=pa.int64()), values))
+        schema_fields.append(pa.field(name, columns[-1].type, metadata={"shape": json.dumps(array.shape)}))
+
+    schema = pa.schema(schema_fields, metadata={"fields": _fields_json(fields, raw_fields)})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        writer.write_batch(pa.record_batch(columns, schema=schema))
+    return sink.getvalue().to_pybytes()
+
+
+def decode_arrow(body: bytes) -> Tuple[Dict[str, Any], Dict[str, np.ndarray]]:
+    pa = _pyarrow()
+    reader = pa.ipc.open_stream(pa.py_buffer(body))
+    schema = reader.schema
+    batch = reader.read_next_batch()
+
+    metadata = schema.metadata or {}
+    fields = json.loads(metadata.get(b"fields", b"{}"))
+    arrays = {}
+    for position, field in enumerate(schema):
+        shape = tuple(json.loads((field.metadata or {}).get(b"shape", b"null")) or (-1,))
+        values = batch.column(position).flatten().to_numpy(zero_copy_only=True)
+        arrays[field.name] = _check_dtype(field.name, values).reshape(shape)
+    return fields, arrays
+
+
+DECODERS = {RAW: decode_raw, NPZ: decode_npz, ARROW: decode_arrow}
+
+
+def decode(fmt: str, body: bytes) -> Tuple[Dict[str, Any], Dict[str, np.ndarray]]:
+    """Read a binary bundle; returns (JSON fields, arrays)"""
+    return DECODERS[fmt](body)
+
+
+def encode_response(
+    fmt: str,
+    fields: Dict[str, Any],
+    arrays: Dict[str, np.ndarray],
+    raw_fields: Optional[Dict[str, str]] = None
+) -> Response:
+    """
+    Binary response for a bundle
+
+    Raw bodies are streamed straight from the array buffers; .npz and Arrow
+    bodies are assembled once.
+    """
+    if fmt == RAW:
+        chunks = encode_raw(fields, arrays, raw_fields)
+
+        async def stream():
+            for chunk in chunks:
+                yield chunk
+
+        length = sum(len(chunk) if isinstance(chunk, bytes) else chunk.nbytes for chunk in chunks)
+        return StreamingResponse(stream(), media_type=RAW, headers={"Content-Length": str(length)})
+
+    try:
+        content = encode_npz(fields, arrays, raw_fields) if fmt == NPZ else encode_arrow(fields, arrays, raw_fields)
+    except UnsupportedFormat as e:
+        raise HTTPException(status_code=406, detail=str(e))
+    return Response(content=content, media_type=fmt)
+
+
+# ---------------------------------------------------------------- requests
+
+def _numpy_array(annotation: Any) -> Optional[NumpyArray]:
+    """NumpyArray marker of an Annotated field annotation (Optional and Dict values unwrapped)"""
+    origin = typing.get_origin(annotation)
+    if origin is typing.Annotated:
+        return next((meta for meta in annotation.__metadata__ if isinstance(meta, NumpyArray)), None)
+    if origin is typing.Union:
+        args = [arg for arg in typing.get_args(annotation) if arg is not type(None)]
+        return _numpy_array(args[0]) if len(args) == 1 else None
+    if origin is dict:
+        return _numpy_array(typing.get_args(annotation)[1])
+    return None
+
+
+def _list_depth(annotation: Any) -> int:
+    """Nesting depth of List[...] in a field annotation (Optional and Dict values unwrapped)"""
+    spec = _numpy_array(annotation)
+    if spec is not None:
+        return spec.ndim
+    origin = typing.get_origin(annotation)
+    if origin is typing.Union:
+        args = [arg for arg in typing.get_args(annotation) if arg is not type(None)]
+        return _list_depth(args[0]) if len(args) == 1 else 0
+    if origin is dict:
+        return _list_depth(typing.get_args(annotation)[1])
+    if origin is list:
+        return 1 + _list_depth(typing.get_args(annotation)[0])
+    return 0
+
+
+def _innermost(annotation: Any) -> Any:
+    while typing.get_args(annotation):
+        args = [arg for arg in typing.get_args(annotation) if arg is not type(None)]
+        annotation = args[-1]
+    return annotation
+
+
+def build_model(model: Type[BaseModel], fields: Dict[str, Any], arrays: Dict[str, np.ndarray]) -> BaseModel:
+    """
+    Build a request model from a decoded bundle
+
+    Array fields are checked for rank and kept as NumPy arrays (no per-float
+    Pydantic validation); NumpyArray fields also run their vectorized checks,
+    and every other field is validated as usual.
+    """
+    data = dict(fields)
+    errors = []
+    for name, array in arrays.items():
+        field_name, _, key = name.partition(".")
+        info = model.model_fields.get(field_name)
+        if info is None:
+            errors.append({"type": "extra_forbidden", "loc": ("body", name), "msg": "Unknown array field", "input": None})
+            continue
+
+        depth = _list_depth(info.annotation)
+        if depth == 0 or array.ndim != depth:
+            errors.append({"type": "value_error", "loc": ("body", name),
+                           "msg": f"Expected a {depth}-dimensional array, got {array.ndim} dimensions", "input": None})
+            continue
+        if _innermost(info.annotation) is int:
+            if array.dtype.kind == "f" and not np.array_equal(array, np.round(array)):
+                errors.append({"type": "int_from_float", "loc": ("body", name),
+                               "msg": "Input should be a valid integer", "input": None})
+                continue
+            array = array.astype(np.int64, copy=False)
+
+        if key:
+            data.setdefault(field_name, {})[key] = array
+        else:
+            data[field_name] = array
+
+    for name, info in model.model_fields.items():
+        if info.is_required() and name not in data:
+            errors.append({"type": "missing", "loc": ("body", name), "msg": "Field required", "input": None})
+    if errors:
+        raise RequestValidationError(errors)
+
+    instance = model.model_construct(**data)
+    array_fields = {name.partition(".")[0] for name in arrays}
+    for name, value in data.items():
+        if name not in model.model_fields:
+            continue
+        if name in array_fields and _numpy_array(model.model_fields[name].annotation) is None:
+            continue
+        try:
+            model.__pydantic_validator__.validate_assignment(instance, name, value)
+        except ValidationError as e:
+            raise RequestValidationError([
+                {**error, "loc": ("body",) + tuple(error["loc"])} for error in e.errors(include_url=False)
+            ])
+    return instance
+
+
+def body_model(
+    model: Type[BaseModel],
+    streamed: Tuple[str, ...] = (),
+    limits: Optional[BodyLimits] = None
+) -> Callable:
+    """
+    FastAPI dependency parsing a request body as JSON or a binary bundle
+
+    Usage: request: Model = Depends(body_model(Model))
+
+    Args:
+        model: Request model
+        streamed: Top-level list fields parsed element by element from JSON
+            bodies (see json_stream); List[List[float]] fields become arrays
+        limits: Body size limits (default: BodyLimits.from_env())
+    """
+    limits = limits or BodyLimits.from_env()
+
+    async def parse(http_request: Request) -> BaseModel:
+        fmt = media_type(http_request.headers.get("content-type"))
+
+        if fmt not in BINARY_FORMATS and streamed:
+            return await parse_streamed(model, limited_stream(http_request, limits), streamed, limits)
+
+        body = await read_body(http_request, limits)
+
+        if fmt not in BINARY_FORMATS:
+            try:
+                return model.model_validate_json(body)
+            except ValidationError as e:
+                raise RequestValidationError([
+                    {**error, "loc": ("body",) + tuple(error["loc"])} for error in e.errors(include_url=False)
+                ])
+
+        try:
+            fields, arrays = decode(fmt, body)
+        except UnsupportedFormat as e:
+            raise HTTPException(status_code=415, detail=str(e))
+        except (ValueError, KeyError, TypeError, OSError) as e:
+            raise HTTPException(status_code=400, detail=f"Invalid {fmt} body: {e}")
+        return build_model(model, fields, arrays)
+
+    return parse
+
+
+def openapi_body(model: Type[BaseModel]) -> Dict[str, Any]:
+    """openapi_extra documenting a body_model request body in every format"""
+    schema = model.model_json_schema()
+    binary = {"schema": {"type": "string", "format": "binary"}}
+    return {
+        "requestBody": {
+            "required": True,
+            "content": {JSON: {"schema": schema}, **{fmt: binary for fmt in BINARY_FORMATS}}
+        }
+    }
@@ -4,14 +4,16 @@ Author: Acauan
 Description: High-performance Python backend for phylogenetic tree analysis with ML integration
 """
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Response, Request, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Literal, Tuple
 from datetime import datetime
 from contextlib import asynccontextmanager
 import uvicorn
+import asyncio
 import os
+import time
 import numpy as np
 from dotenv import load_dotenv
 import logging
@@ -28,22 +30,43 @@ logger = logging.getLogger(__name__)
 
 # Import custom modules
 from processing.text_preprocessor import TextPreprocessor
-from services import EmbeddingService
+from services import EmbeddingService, EmbeddingBatcher
 from routes import dataset_routes
 
 # Import projection quality modules
 from app.schemas import (
     ProjectionErrorsRequest, ProjectionErrorsResponse,
-    FalseNeighborsRequest, FalseNeighborsResponse,
-    MissingNeighborsRequest, MissingNeighborsResponse,
+    FalseNeighborsRequest, FalseNeighborsResponse, FalseNeighborPairs,
+    MissingNeighborsRequest, MissingNeighborsResponse, MissingNeighborEdges,
+    QualityCurvesRequest, QualityCurvesResponse,
     GroupAnalysisRequest, GroupAnalysisResponse,
-    ProjectionCompareRequest, ProjectionCompareResponse
+    ProjectionCompareRequest, ProjectionCompareResponse,
+    SessionCreateRequest, SessionResponse
 )
-from app.projection_quality import ProjectionQualityMetrics
+from app.projection_quality import ProjectionQualityMetrics, ProjectionComparison, CoordinateArtifacts
+from app.executors import WorkerPools
+from app.jobs import JobStore, JobManager, JobProgress
+from app.embedding_cache import EmbeddingCache
+from app.ann_index import DocumentIndex
+from app.distance_engine import DistanceEngine
+from app.sessions import SessionStore, MatrixSession
+from app import wire_format, metrics
 
 # Global services
 embedding_service: Optional[EmbeddingService] = None
 text_preprocessor: Optional[TextPreprocessor] = None
+embedding_cache: Optional[EmbeddingCache] = None
+embedding_batcher: Optional[EmbeddingBatcher] = None
+document_index: Optional[DocumentIndex] = None
+
+# Worker pools for CPU-bound work (sizes from THREAD_POOL_WORKERS / PROCESS_POOL_WORKERS)
+worker_pools = WorkerPools.from_env()
+
+# Background jobs for long-running reconstructions (started in lifespan)
+job_manager: Optional[JobManager] = None
+
+# Uploaded matrices shared by the projection endpoints (SESSION_MEMORY_MB)
+session_store = SessionStore.from_env()
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -51,7 +74,7 @@ async def lifespan(app: FastAPI):
     Lifespan context manager for initialization and cleanup
     Loads ML models on startup and cleans up on shutdown
     """
-    global embedding_service, text_preprocessor
+    global embedding_service, text_preprocessor, embedding_cache, embedding_batcher, job_manager, document_index
 
     logger.info("Initializing ML services...")
 
@@ -66,22 +89,58 @@ async def lifespan(app: FastAPI):
     )
     logger.info("Text preprocessor initialized")
 
+    # Initialize embedding cache (EMBEDDING_CACHE_DIR, EMBEDDING_CACHE_MEMORY_MB)
+    embedding_cache = EmbeddingCache.from_env()
+
     # Initialize embedding service
     try:
         embedding_service = EmbeddingService(
             model_name=os.getenv('EMBEDDING_MODEL'),
-            cache_folder='./models_cache'
+            cache_folder=os.getenv('MODEL_CACHE_DIR', './models_cache'),
+            embedding_cache=embedding_cache
         )
         logger.info(f"Embedding service initialized with model: {embedding_service.model_name}")
+
+        # Merge concurrent encode calls into shared model batches
+        embedding_batcher = EmbeddingBatcher(
+            embedding_service,
+            run_in_thread=worker_pools.run_in_thread,
+            max_batch_size=int(os.getenv("EMBEDDING_MAX_BATCH", "256")),
+            max_wait_ms=float(os.getenv("EMBEDDING_MAX_WAIT_MS", "5"))
+        )
+        embedding_batcher.start()
+
+        # Nearest-document index (ANN_INDEX_PATH, ANN_PQ_SUBVECTORS, ANN_NPROBE)
+        document_index = DocumentIndex.from_env(
+            embedding_service.model_name,
+            embedding_service.embedding_dim,
+            backend=embedding_service.backend,
+            quantization=embedding_service.quantization
+        )
     except Exception as e:
         logger.error(f"Failed to initialize embedding service: {e}")
         # Continue without embeddings service
         embedding_service = None
 
+    # Initialize the job queue
+    job_manager = JobManager(
+        JobStore(os.getenv("JOBS_DB_PATH", "./jobs/jobs.db")),
+        handlers={"tree": run_tree_job, "pipeline": run_pipeline_job},
+        workers=int(os.getenv("JOB_WORKERS", "1"))
+    )
+    await job_manager.start()
+    logger.info("Job manager started")
+
     yield
 
     # Cleanup
     logger.info("Shutting down ML services...")
+    await job_manager.stop()
+    if embedding_batcher:
+        await embedding_batcher.stop()
+    if document_index:
+        document_index.flush()
+    worker_pools.shutdown()
 
 # Create FastAPI application instance with lifespan
 app = FastAPI(
@@ -109,6 +168,7 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(metrics.MetricsMiddleware)
 
 # Include dataset routes
 app.include_router(dataset_routes.router)
@@ -141,10 +201,20 @@ class DistanceMatrixRequest(BaseModel):
     preprocess: bool = Field(default=True, description="Whether to preprocess texts")
     distance_metric: str = Field(default="cosine", description="Distance metric to use (cosine or euclidean)")
     batch_size: int = Field(default=32, description="Batch size for embedding generation")
+    output: Literal["dense", "knn"] = Field(default="dense", description="Dense n x n matrix or sparse k-nearest-neighbor graph")
+    k_neighbors: int = Field(default=10, ge=1, le=1000, description="Neighbors per document for the knn output")
+
+class KnnGraph(BaseModel):
+    """Sparse k-nearest-neighbor graph in CSR form"""
+    k: int = Field(..., description="Neighbors per document")
+    indptr: List[int] = Field(..., description="Row offsets (n + 1) into indices and distances")
+    indices: List[int] = Field(..., description="Neighbor indices, nearest first within each row")
+    distances: List[float] = Field(..., description="Distances matching indices")
 
 class DistanceMatrixResponse(BaseModel):
     """Response model for distance matrix generation"""
-    distance_matrix: List[List[float]] = Field(..., description="Pairwise distance matrix")
+    distance_matrix: Optional[List[List[float]]] = Field(default=None, description="Pairwise distance matrix (dense output)")
+    knn_graph: Optional[KnnGraph] = Field(default=None, description="Sparse neighbor graph (knn output)")
     document_ids: List[str] = Field(..., description="Document IDs in matrix order")
     labels: List[str] = Field(..., description="Document labels (truncated content)")
     embedding_dimension: int = Field(..., description="Dimension of embeddings used")
@@ -163,10 +233,44 @@ class EmbeddingResponse(BaseModel):
     dimension: int = Field(..., description="Dimension of embeddings")
     model_used: str = Field(..., description="Name of the model used")
 
+class IndexDocumentsRequest(BaseModel):
+    """Request model for adding documents to the nearest-document index"""
+    documents: List[Document] = Field(..., description="Documents to insert (known IDs are replaced)")
+    preprocess: bool = Field(default=False, description="Whether to preprocess texts")
+
+class IndexDocumentsResponse(BaseModel):
+    """Response model for index inserts"""
+    indexed: int = Field(..., description="Documents inserted by this request")
+    total: int = Field(..., description="Documents in the index")
+
+class NearestDocumentsRequest(BaseModel):
+    """Request model for nearest-document queries (by text or by indexed document)"""
+    text: Optional[str] = Field(default=None, description="Query text")
+    document_id: Optional[str] = Field(default=None, description="ID of an indexed document to query with")
+    k: int = Field(default=10, ge=1, le=1000, description="Number of documents to return")
+    n_probe: Optional[int] = Field(default=None, ge=1, description="Inverted lists scanned (recall/latency trade-off)")
+    preprocess: bool = Field(default=False, description="Whether to preprocess the query text")
+
+class NearestDocument(BaseModel):
+    """One nearest-document result"""
+    id: str = Field(..., description="Document ID")
+    distance: float = Field(..., description="Approximate cosine distance to the query")
+
+class NearestDocumentsResponse(BaseModel):
+    """Response model for nearest-document queries"""
+    results: List[NearestDocument] = Field(..., description="Nearest documents, closest first")
+    query_time_ms: float = Field(..., description="Index search time in milliseconds")
+
+class BackendCheckRequest(BaseModel):
+    """Request model for the ONNX backend accuracy check"""
+    texts: Optional[List[str]] = Field(default=None, description="Sample texts (default: bundled synthetic dataset)")
+    sample_size: int = Field(default=64, ge=2, le=1024, description="Texts taken from the bundled dataset")
+
 class TreeReconstructRequest(BaseModel):
     """Request model for tree reconstruction"""
     distance_matrix: List[List[float]] = Field(..., description="Distance matrix")
     labels: List[str] = Field(..., description="Labels for each taxon")
+    algorithm: str = Field(default="neighbor_joining", description="NJ search: neighbor_joining or rapid_nj")
 
 class TreeReconstructResponse(BaseModel):
     """Response model for tree reconstruction"""
@@ -179,16 +283,189 @@ class FullPipelineRequest(BaseModel):
     documents: List[Document] = Field(..., description="Documents to process")
     preprocess: bool = Field(default=True, description="Whether to preprocess texts")
     distance_metric: str = Field(default="cosine", description="Distance metric")
-    algorithm: str = Field(default="neighbor_joining", description="Tree reconstruction algorithm")
+    algorithm: str = Field(default="neighbor_joining", description="Tree reconstruction algorithm: neighbor_joining, rapid_nj or approximate_nj")
 
 class FullPipelineResponse(BaseModel):
     """Response for full pipeline"""
     newick: str = Field(..., description="Tree in Newick format")
     tree_structure: Dict[str, Any] = Field(..., description="Tree structure")
-    distance_matrix: List[List[float]] = Field(..., description="Distance matrix used")
+    distance_matrix: Optional[List[List[float]]] = Field(default=None, description="Distance matrix used (omitted for approximate_nj)")
     labels: List[str] = Field(..., description="Document labels")
     statistics: Dict[str, Any] = Field(..., description="Execution statistics")
 
+class JobSubmitResponse(BaseModel):
+    """Response for a submitted background job"""
+    job_id: str = Field(..., description="Job identifier")
+    kind: str = Field(..., description="Job kind: tree or pipeline")
+    status: str = Field(..., description="Job status")
+
+class JobStatusResponse(BaseModel):
+    """Status and progress of a background job"""
+    job_id: str = Field(..., description="Job identifier")
+    kind: str = Field(..., description="Job kind: tree or pipeline")
+    status: str = Field(..., description="queued, running, completed, failed or cancelled")
+    stage: Optional[str] = Field(default=None, description="Current stage: preprocess, encode, distance or tree")
+    progress_current: int = Field(..., description="Steps done in the current stage")
+    progress_total: int = Field(..., description="Total steps of the current stage (0 if unknown)")
+    message: Optional[str] = Field(default=None, description="Human-readable progress")
+    cancel_requested: bool = Field(..., description="Whether cancellation was requested")
+    error: Optional[str] = Field(default=None, description="Error message of a failed job")
+    created_at: str
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
+
+def preprocessing_config(preprocess: bool) -> Optional[Dict[str, Any]]:
+    """Preprocessing applied to request texts, as part of the embedding cache key"""
+    if preprocess and text_preprocessor:
+        return text_preprocessor.get_config()
+    return None
+
+def tree_response_json(response: BaseModel, tree) -> str:
+    """
+    Serialize a tree response, writing tree_structure with the iterative
+    TreeStore serializer so deep (e.g. caterpillar) trees never hit
+    recursion limits in the JSON encoder
+    """
+    body = response.model_dump_json(exclude={"tree_structure"})
+    return f'{body[:-1]},"tree_structure":{tree.to_json()}}}'
+
+# ============= Pipeline Runners =============
+# Shared by the synchronous endpoints and the background jobs
+
+async def run_tree_reconstruction(
+    request: TreeReconstructRequest,
+    progress: Optional[JobProgress] = None
+) -> str:
+    """Build the tree for a reconstruction request; returns the JSON response body"""
+    from algorithms import build_nj_tree
+
+    logger.info(f"Tree reconstruction requested for {len(request.labels)} taxa")
+
+    if progress:
+        progress.set_stage("tree", total=max(len(request.labels) - 3, 0))
+
+    # Build tree using NJ algorithm (pure-Python loop, so in a worker process)
+    with metrics.STAGE_DURATION.time(pipeline="tree", stage="nj"):
+        result = await worker_pools.run_in_process(
+            build_nj_tree,
+            np.asarray(request.distance_matrix, dtype=np.float64),
+            request.labels,
+            algorithm=request.algorithm,
+            progress_callback=progress
+        )
+
+    response = TreeReconstructResponse(
+        newick=result["newick"],
+        tree_structure={},
+        statistics=result["statistics"]
+    )
+    with metrics.STAGE_DURATION.time(pipeline="tree", stage="serialize"):
+        return tree_response_json(response, result["tree"])
+
+async def compute_full_pipeline(
+    request: FullPipelineRequest,
+    progress: Optional[JobProgress] = None
+) -> tuple:
+    """
+    Run documents → embeddings → distances → tree
+
+    Returns:
+        (response without tree structure and matrix, TreeStore, distance matrix or None)
+    """
+    from algorithms import build_nj_tree, build_approximate_tree
+
+    if not embedding_service:
+        raise RuntimeError("Embedding service not available")
+
+    # Step 1: Extract and preprocess texts
+    texts = [doc.content for doc in request.documents]
+    labels = [doc.id for doc in request.documents]
+
+    if request.preprocess and text_preprocessor:
+        logger.info("Preprocessing texts...")
+        if progress:
+            progress.set_stage("preprocess")
+        with metrics.STAGE_DURATION.time(pipeline="full", stage="preprocess"):
+            texts = await worker_pools.run_in_thread(text_preprocessor.process_batch, texts)
+
+    # Step 2: Generate embeddings
+    logger.info(f"Generating embeddings for {len(texts)} documents...")
+    if progress:
+        progress.set_stage("encode")
+    with metrics.STAGE_DURATION.time(pipeline="full", stage="encode"):
+        embeddings = await embedding_batcher.encode(texts, preprocessing=preprocessing_config(request.preprocess))
+
+    if request.algorithm == "approximate_nj":
+        # Approximate NJ works on the embeddings directly and never
+        # materializes the n x n distance matrix
+        if request.distance_metric != "cosine":
+            raise ValueError("approximate_nj only supports the cosine distance metric")
+
+        logger.info("Reconstructing phylogenetic tree with approximate NJ...")
+        if progress:
+            progress.set_stage("tree", total=max(len(labels) - 3, 0))
+        distance_matrix = None
+        with metrics.STAGE_DURATION.time(pipeline="full", stage="nj"):
+            tree_result = await worker_pools.run_in_process(
+                build_approximate_tree, embeddings, labels, progress_callback=progress
+            )
+    else:
+        # Step 3: Calculate distance matrix
+        logger.info("Calculating distance matrix...")
+        if progress:
+            progress.set_stage("distance")
+        with metrics.STAGE_DURATION.time(pipeline="full", stage="distance"):
+            distance_matrix = await worker_pools.run_in_thread(
+                embedding_service.compute_distance_matrix,
+                embeddings,
+                distance_metric=request.distance_metric
+            )
+
+        # Step 4: Reconstruct tree
+        logger.info("Reconstructing phylogenetic tree...")
+        if progress:
+            progress.set_stage("tree", total=max(len(labels) - 3, 0))
+        with metrics.STAGE_DURATION.time(pipeline="full", stage="nj"):
+            tree_result = await worker_pools.run_in_process(
+                build_nj_tree, distance_matrix, labels,
+                algorithm=request.algorithm, progress_callback=progress
+            )
+
+    # Compile statistics
+    statistics = {
+        **tree_result["statistics"],
+        "n_documents": len(request.documents),
+        "preprocessing_applied": request.preprocess,
+        "distance_metric": request.distance_metric,
+        "embedding_model": embedding_service.model_name,
+        "embedding_dimension": embedding_service.embedding_dim
+    }
+
+    response = FullPipelineResponse(
+        newick=tree_result["newick"],
+        tree_structure={},
+        labels=labels,
+        statistics=statistics
+    )
+    return response, tree_result["tree"], distance_matrix
+
+async def run_full_pipeline(
+    request: FullPipelineRequest,
+    progress: Optional[JobProgress] = None
+) -> str:
+    """Run the full pipeline; returns the JSON response body"""
+    response, tree, distance_matrix = await compute_full_pipeline(request, progress)
+    with metrics.STAGE_DURATION.time(pipeline="full", stage="serialize"):
+        if distance_matrix is not None:
+            response.distance_matrix = distance_matrix.tolist()
+        return tree_response_json(response, tree)
+
+async def run_tree_job(payload: str, progress: JobProgress) -> str:
+    return await run_tree_reconstruction(TreeReconstructRequest.model_validate_json(payload), progress)
+
+async def run_pipeline_job(payload: str, progress: JobProgress) -> str:
+    return await run_full_pipeline(FullPipelineRequest.model_validate_json(payload), progress)
+
 # ============= Endpoints =============
 
 @app.get("/")
@@ -205,6 +482,9 @@ async def root():
             "metrics": "/metrics",
             "distance_matrix": "/api/v1/distancematrix",
             "embeddings": "/api/v1/embeddings",
+            "embedding_backend_check": "/api/v1/embeddings/backend_check",
+            "index_documents": "/api/v1/index/documents",
+            "nearest_documents": "/api/v1/index/nearest",
             "preprocessing": "/api/v1/preprocess",
             "tree_reconstruction": "/api/v1/tree/reconstruct",
             "full_pipeline": "/api/v1/pipeline/full"
@@ -228,8 +508,15 @@ async def health_check():
         ml_service_ready=embedding_service is not None
     )
 
-@app.post("/api/v1/distancematrix", response_model=DistanceMatrixResponse)
-async def generate_distance_matrix(request: DistanceMatrixRequest):
+@app.post(
+    "/api/v1/distancematrix",
+    response_model=DistanceMatrixResponse,
+    openapi_extra=wire_format.openapi_body(DistanceMatrixRequest)
+)
+async def generate_distance_matrix(
+    http_request: Request,
+    request: DistanceMatrixRequest = Depends(wire_format.body_model(DistanceMatrixRequest, streamed=("documents",)))
+):
     """
     Generate pairwise distance matrix from documents using semantic embeddings
 
@@ -237,6 +524,9 @@ async def generate_distance_matrix(request: DistanceMatrixRequest):
     1. Text preprocessing (optional)
     2. Embedding generation using Sentence Transformers
     3. Distance matrix calculation
+
+    Matrices are sent in binary when the Accept header asks for it. Documents
+    of JSON bodies are parsed one at a time as the body streams in.
     """
     if not embedding_service:
         raise HTTPException(status_code=503, detail="Embedding service not available")
@@ -252,24 +542,67 @@ async def generate_distance_matrix(request: DistanceMatrixRequest):
         # Preprocess if requested
         if request.preprocess and text_preprocessor:
             logger.info("Preprocessing texts...")
-            texts = text_preprocessor.process_batch(texts)
+            texts = await worker_pools.run_in_thread(text_preprocessor.process_batch, texts)
 
-        # Generate embeddings and distance matrix
+        # Generate embeddings and distance matrix (or its sparse neighbor graph)
         logger.info(f"Generating embeddings for {len(texts)} documents...")
-        embeddings, distance_matrix = embedding_service.process_texts_to_distances(
-            texts=texts,
-            preprocess=False,  # Already preprocessed above if requested
-            batch_size=request.batch_size
-        )
-
-        # Convert numpy array to list for JSON serialization
-        distance_matrix_list = distance_matrix.tolist()
+        distance_matrix_list, knn_graph = None, None
+        if request.output == "knn":
+            embeddings = await worker_pools.run_in_thread(
+                embedding_service.encode,
+                texts,
+                batch_size=request.batch_size,
+                preprocessing=preprocessing_config(request.preprocess)
+            )
+            indptr, indices, distances = await worker_pools.run_in_thread(
+                embedding_service.compute_knn_graph,
+                embeddings,
+                request.k_neighbors,
+                distance_metric=request.distance_metric
+            )
+            arrays = {"knn_graph.indptr": indptr, "knn_graph.indices": indices, "knn_graph.distances": distances}
+            k = int(indptr[1]) if len(indptr) > 1 else 0
+        else:
+            embeddings, distance_matrix = await worker_pools.run_in_thread(
+                embedding_service.process_texts_to_distances,
+                texts=texts,
+                preprocess=False,  # Already preprocessed above if requested
+                batch_size=request.batch_size,
+                preprocessing=preprocessing_config(request.preprocess)
+            )
+            arrays = {"distance_matrix": distance_matrix}
 
         # Get model info
         model_info = embedding_service.get_model_info()
 
+        fmt = wire_format.negotiate(http_request.headers.get("accept"))
+        if fmt != wire_format.JSON:
+            fields = {
+                "document_ids": doc_ids,
+                "labels": labels,
+                "embedding_dimension": model_info['embedding_dimension'],
+                "model_used": model_info['model_name'],
+                "preprocessing_applied": request.preprocess,
+                "distance_metric": request.distance_metric
+            }
+            if request.output == "knn":
+                fields["knn_graph"] = {"k": k}
+            return wire_format.encode_response(fmt, fields, arrays)
+
+        # Convert numpy arrays to lists for JSON serialization
+        if request.output == "knn":
+            knn_graph = KnnGraph(
+                k=k,
+                indptr=indptr.tolist(),
+                indices=indices.tolist(),
+                distances=distances.tolist()
+            )
+        else:
+            distance_matrix_list = distance_matrix.tolist()
+
         return DistanceMatrixResponse(
             distance_matrix=distance_matrix_list,
+            knn_graph=knn_graph,
             document_ids=doc_ids,
             labels=labels,
             embedding_dimension=model_info['embedding_dimension'],
@@ -283,9 +616,11 @@ async def generate_distance_matrix(request: DistanceMatrixRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/v1/embeddings", response_model=EmbeddingResponse)
-async def generate_embeddings(request: EmbeddingRequest):
+async def generate_embeddings(request: EmbeddingRequest, http_request: Request):
     """
     Generate semantic embeddings for given texts
+
+    Embeddings are sent in binary when the Accept header asks for it.
     """
     if not embedding_service:
         raise HTTPException(status_code=503, detail="Embedding service not available")
@@ -295,14 +630,22 @@ async def generate_embeddings(request: EmbeddingRequest):
 
         # Preprocess if requested
         if request.preprocess and text_preprocessor:
-            texts = text_preprocessor.process_batch(texts)
+            texts = await worker_pools.run_in_thread(text_preprocessor.process_batch, texts)
 
         # Generate embeddings
-        embeddings = embedding_service.encode(texts)
+        embeddings = await embedding_batcher.encode(texts, preprocessing=preprocessing_config(request.preprocess))
 
         # Get model info
         model_info = embedding_service.get_model_info()
 
+        fmt = wire_format.negotiate(http_request.headers.get("accept"))
+        if fmt != wire_format.JSON:
+            return wire_format.encode_response(
+                fmt,
+                fields={"dimension": model_info['embedding_dimension'], "model_used": model_info['model_name']},
+                arrays={"embeddings": embeddings}
+            )
+
         return EmbeddingResponse(
             embeddings=embeddings.tolist(),
             dimension=model_info['embedding_dimension'],
@@ -313,6 +656,112 @@ async def generate_embeddings(request: EmbeddingRequest):
         logger.error(f"Error generating embeddings: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+def bundled_sample_texts(sample_size: int) -> List[str]:
+    """First documents of the bundled synthetic temporal dataset"""
+    import json
+    from pathlib import Path
+
+    path = Path(__file__).parent / "data" / "synthetic" / "temporal_dataset_extended.json"
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    texts = [
+        doc["content"]
+        for timepoint in ("timepoint_t1", "timepoint_t2")
+        for doc in data.get(timepoint, {}).get("documents", [])
+    ]
+    return texts[:sample_size]
+
+@app.post("/api/v1/embeddings/backend_check")
+async def check_embedding_backend(request: BackendCheckRequest):
+    """
+    Compare cosine distances of the ONNX backend with the torch backend on a sample
+    """
+    if not embedding_service:
+        raise HTTPException(status_code=503, detail="Embedding service not available")
+
+    try:
+        texts = request.texts or bundled_sample_texts(request.sample_size)
+        return await worker_pools.run_in_thread(embedding_service.check_backend_accuracy, texts)
+
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error checking embedding backend: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/v1/index/documents", response_model=IndexDocumentsResponse)
+async def index_documents(request: IndexDocumentsRequest):
+    """
+    Embed documents (through the embedding cache) and insert them into the nearest-document index
+    """
+    if not embedding_service or not document_index:
+        raise HTTPException(status_code=503, detail="Embedding service not available")
+
+    try:
+        texts = [doc.content for doc in request.documents]
+        if request.preprocess and text_preprocessor:
+            texts = await worker_pools.run_in_thread(text_preprocessor.process_batch, texts)
+
+        embeddings = await embedding_batcher.encode(texts, preprocessing=preprocessing_config(request.preprocess))
+        total = await worker_pools.run_in_thread(
+            document_index.add, [doc.id for doc in request.documents], embeddings
+        )
+
+        return IndexDocumentsResponse(indexed=len(request.documents), total=total)
+
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error indexing documents: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/v1/index/nearest", response_model=NearestDocumentsResponse)
+async def nearest_documents(request: NearestDocumentsRequest):
+    """
+    Approximate nearest documents of a query text or of an indexed document
+    """
+    if not embedding_service or not document_index:
+        raise HTTPException(status_code=503, detail="Embedding service not available")
+    if (request.text is None) == (request.document_id is None):
+        raise HTTPException(status_code=400, detail="Provide exactly one of text or document_id")
+
+    try:
+        started = time.perf_counter()
+        if request.document_id is not None:
+            results = await worker_pools.run_in_thread(
+                document_index.search_document, request.document_id, k=request.k, n_probe=request.n_probe
+            )
+        else:
+            texts = [request.text]
+            if request.preprocess and text_preprocessor:
+                texts = await worker_pools.run_in_thread(text_preprocessor.process_batch, texts)
+            query = await embedding_batcher.encode(texts, preprocessing=preprocessing_config(request.preprocess))
+            started = time.perf_counter()
+            results = (await worker_pools.run_in_thread(
+                document_index.search, query, k=request.k, n_probe=request.n_probe
+            ))[0]
+
+        return NearestDocumentsResponse(
+            results=[NearestDocument(id=doc_id, distance=distance) for doc_id, distance in results],
+            query_time_ms=(time.perf_counter() - started) * 1000
+        )
+
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Document {request.document_id} is not indexed")
+    except Exception as e:
+        logger.error(f"Error querying document index: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/v1/index")
+async def get_index_stats():
+    """
+    Size and configuration of the nearest-document index
+    """
+    if not document_index:
+        raise HTTPException(status_code=503, detail="Document index not available")
+    return document_index.stats()
+
 @app.post("/api/v1/preprocess")
 async def preprocess_texts(texts: List[str]):
     """
@@ -322,7 +771,7 @@ async def preprocess_texts(texts: List[str]):
         raise HTTPException(status_code=503, detail="Text preprocessor not available")
 
     try:
-        processed_texts = text_preprocessor.process_batch(texts)
+        processed_texts = await worker_pools.run_in_thread(text_preprocessor.process_batch, texts)
 
         return {
             "original_texts": texts,
@@ -347,63 +796,55 @@ async def get_available_models():
         "model_info": embedding_service.get_model_info() if embedding_service else None
     }
 
+def service_families() -> List[metrics.Family]:
+    """Gauges from the stats of the caches, pools and stores, read at scrape time"""
+    families = [
+        *metrics.stats_families("executors", worker_pools.stats(), label="pool"),
+        *metrics.stats_families("sessions", session_store.stats()),
+        ("ml_service_ready", "gauge", "Whether the embedding service is loaded", [({}, float(embedding_service is not None))])
+    ]
+    if embedding_cache:
+        families += metrics.stats_families("embedding_cache", embedding_cache.stats())
+    if embedding_batcher:
+        families += metrics.stats_families("embedding_batcher", embedding_batcher.stats())
+    if document_index:
+        families += metrics.stats_families("document_index", document_index.stats())
+    return families
+
+metrics.REGISTRY.add_collector(service_families)
+
 @app.get("/metrics")
 async def get_metrics():
     """
-    Metrics endpoint for performance monitoring
-    """
-    import psutil
-    import platform
-
-    # Get system metrics
-    cpu_percent = psutil.cpu_percent(interval=1)
-    memory = psutil.virtual_memory()
+    Metrics endpoint in the Prometheus text format
 
-    return {
-        "system": {
-            "platform": platform.platform(),
-            "python_version": platform.python_version(),
-            "cpu_count": psutil.cpu_count(),
-            "cpu_percent": cpu_percent,
-            "memory": {
-                "total": memory.total,
-                "available": memory.available,
-                "percent": memory.percent,
-                "used": memory.used,
-                "free": memory.free
-            }
-        },
-        "service": {
-            "name": "phylo-explorer-backend",
-            "version": "2.0.0",
-            "uptime": datetime.now().isoformat(),
-            "environment": os.getenv("ENVIRONMENT", "development"),
-            "ml_service_ready": embedding_service is not None,
-            "embedding_model": embedding_service.model_name if embedding_service else None
-        }
-    }
+    Request counts and latency per endpoint, requests in flight, per-stage
+    pipeline timings, model throughput, cache hit ratios and process
+    resources. The collected stats() read counters without waiting on the
+    locks held during inserts, cache I/O or retraining.
+    """
+    return Response(content=metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
 
-@app.post("/api/v1/tree/reconstruct", response_model=TreeReconstructResponse)
-async def reconstruct_tree(request: TreeReconstructRequest):
+@app.post(
+    "/api/v1/tree/reconstruct",
+    response_model=TreeReconstructResponse,
+    openapi_extra=wire_format.openapi_body(TreeReconstructRequest)
+)
+async def reconstruct_tree(
+    request: TreeReconstructRequest = Depends(
+        wire_format.body_model(TreeReconstructRequest, streamed=("distance_matrix",))
+    )
+):
     """
     Reconstruct phylogenetic tree from distance matrix using Neighbor-Joining
 
     This endpoint implements the O(n³) NJ algorithm for tree reconstruction.
-    For large matrices (n > 100), consider using async processing.
+    For large matrices (n > 100), submit a job to /api/v1/jobs/tree instead.
+    JSON matrices are parsed row by row into a NumPy array as the body streams in.
     """
     try:
-        from algorithms import build_nj_tree
-
-        logger.info(f"Tree reconstruction requested for {len(request.labels)} taxa")
-
-        # Build tree using NJ algorithm
-        result = build_nj_tree(request.distance_matrix, request.labels)
-
-        return TreeReconstructResponse(
-            newick=result["newick"],
-            tree_structure=result["tree"],
-            statistics=result["statistics"]
-        )
+        content = await run_tree_reconstruction(request)
+        return Response(content=content, media_type="application/json")
 
     except ValueError as e:
         logger.error(f"Invalid input for tree reconstruction: {e}")
@@ -412,8 +853,15 @@ async def reconstruct_tree(request: TreeReconstructRequest):
         logger.error(f"Error in tree reconstruction: {e}")
         raise HTTPException(status_code=500, detail="Tree reconstruction failed")
 
-@app.post("/api/v1/pipeline/full", response_model=FullPipelineResponse)
-async def full_pipeline(request: FullPipelineRequest):
+@app.post(
+    "/api/v1/pipeline/full",
+    response_model=FullPipelineResponse,
+    openapi_extra=wire_format.openapi_body(FullPipelineRequest)
+)
+async def full_pipeline(
+    http_request: Request,
+    request: FullPipelineRequest = Depends(wire_format.body_model(FullPipelineRequest, streamed=("documents",)))
+):
     """
     Complete pipeline: documents → embeddings → distance matrix → tree
 
@@ -422,63 +870,244 @@ async def full_pipeline(request: FullPipelineRequest):
     2. Embedding generation
     3. Distance matrix calculation
     4. Tree reconstruction using Neighbor-Joining
+
+    For large corpora, submit a job to /api/v1/jobs/pipeline instead.
+    The distance matrix is sent in binary when the Accept header asks for it.
     """
     if not embedding_service:
         raise HTTPException(status_code=503, detail="Embedding service not available")
 
     try:
-        from algorithms import build_nj_tree
+        fmt = wire_format.negotiate(http_request.headers.get("accept"))
+        if fmt == wire_format.JSON:
+            content = await run_full_pipeline(request)
+            return Response(content=content, media_type="application/json")
+
+        response, tree, distance_matrix = await compute_full_pipeline(request)
+        with metrics.STAGE_DURATION.time(pipeline="full", stage="serialize"):
+            return wire_format.encode_response(
+                fmt,
+                fields=response.model_dump(exclude={"tree_structure", "distance_matrix"}),
+                arrays={"distance_matrix": distance_matrix} if distance_matrix is not None else {},
+                raw_fields={"tree_structure": tree.to_json()}
+            )
 
-        # Step 1: Extract and preprocess texts
-        texts = [doc.content for doc in request.documents]
-        doc_ids = [doc.id for doc in request.documents]
-        labels = [doc.id for doc in request.documents]
+    except ValueError as e:
+        logger.error(f"Invalid input for pipeline: {e}")
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Pipeline execution failed: {e}")
+        raise HTTPException(status_code=500, detail="Pipeline execution failed")
 
-        if request.preprocess and text_preprocessor:
-            logger.info("Preprocessing texts...")
-            texts = text_preprocessor.process_batch(texts)
+# ============= Job Endpoints =============
+
+def _job_status(job: Dict[str, Any]) -> JobStatusResponse:
+    """Build the status response of a job, with a readable progress message"""
+    message = job["stage"]
+    if job["stage"] == "tree" and job["progress_total"]:
+        message = f"NJ iteration {job['progress_current']} of {job['progress_total']}"
+
+    return JobStatusResponse(
+        job_id=job["id"],
+        kind=job["kind"],
+        status=job["status"],
+        stage=job["stage"],
+        progress_current=job["progress_current"],
+        progress_total=job["progress_total"],
+        message=message,
+        cancel_requested=job["cancel_requested"],
+        error=job["error"],
+        created_at=job["created_at"],
+        started_at=job["started_at"],
+        finished_at=job["finished_at"]
+    )
 
-        # Step 2: Generate embeddings
-        logger.info(f"Generating embeddings for {len(texts)} documents...")
-        embeddings = embedding_service.encode(texts)
+def _get_job_manager() -> JobManager:
+    if not job_manager:
+        raise HTTPException(status_code=503, detail="Job queue not available")
+    return job_manager
 
-        # Step 3: Calculate distance matrix
-        logger.info("Calculating distance matrix...")
-        distance_matrix = embedding_service.compute_distance_matrix(
-            embeddings,
-            distance_metric=request.distance_metric
-        )
+@app.post("/api/v1/jobs/tree", response_model=JobSubmitResponse, status_code=202)
+async def submit_tree_job(request: TreeReconstructRequest):
+    """
+    Queue a tree reconstruction; poll /api/v1/jobs/{job_id} for progress
+    """
+    job_id = _get_job_manager().submit("tree", request.model_dump_json())
+    logger.info(f"Queued tree job {job_id} for {len(request.labels)} taxa")
+    return JobSubmitResponse(job_id=job_id, kind="tree", status="queued")
 
-        # Step 4: Reconstruct tree
-        logger.info("Reconstructing phylogenetic tree...")
-        tree_result = build_nj_tree(distance_matrix.tolist(), labels)
-
-        # Compile statistics
-        statistics = {
-            **tree_result["statistics"],
-            "n_documents": len(request.documents),
-            "preprocessing_applied": request.preprocess,
-            "distance_metric": request.distance_metric,
-            "embedding_model": embedding_service.model_name,
-            "embedding_dimension": embedding_service.embedding_dim
-        }
+@app.post("/api/v1/jobs/pipeline", response_model=JobSubmitResponse, status_code=202)
+async def submit_pipeline_job(request: FullPipelineRequest):
+    """
+    Queue a full pipeline run; poll /api/v1/jobs/{job_id} for progress
+    """
+    job_id = _get_job_manager().submit("pipeline", request.model_dump_json())
+    logger.info(f"Queued pipeline job {job_id} for {len(request.documents)} documents")
+    return JobSubmitResponse(job_id=job_id, kind="pipeline", status="queued")
 
-        return FullPipelineResponse(
-            newick=tree_result["newick"],
-            tree_structure=tree_result["tree"],
-            distance_matrix=distance_matrix.tolist(),
-            labels=labels,
-            statistics=statistics
+@app.get("/api/v1/jobs/{job_id}", response_model=JobStatusResponse)
+async def get_job_status(job_id: str):
+    """
+    Status and progress of a job (e.g. "NJ iteration k of n")
+    """
+    job = _get_job_manager().store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    return _job_status(job)
+
+@app.get("/api/v1/jobs/{job_id}/result")
+async def get_job_result(job_id: str):
+    """
+    Result of a completed job: the same body as the synchronous endpoint
+    """
+    manager = _get_job_manager()
+    job = manager.store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    if job["status"] != "completed":
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}")
+
+    return Response(content=manager.store.get_result(job_id), media_type="application/json")
+
+@app.delete("/api/v1/jobs/{job_id}", response_model=JobStatusResponse)
+async def cancel_job(job_id: str):
+    """
+    Cancel a job: queued jobs stop at once, running jobs at their next progress report
+    """
+    job = _get_job_manager().cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    return _job_status(job)
+
+# ============= Matrix Sessions =============
+
+def build_session_arrays(request: SessionCreateRequest) -> Dict[str, np.ndarray]:
+    """Collect the arrays of a session upload (already parsed and checked; D_high from embeddings if missing)"""
+    arrays = {}
+    for name in ("D_high", "D_low", "embeddings", "points_2d", "points_low"):
+        value = getattr(request, name)
+        if value is not None:
+            arrays[name] = value
+
+    if "embeddings" in arrays and "D_high" not in arrays:
+        arrays["D_high"] = DistanceEngine.from_env().pairwise(arrays["embeddings"], request.distance_metric)
+
+    if "points_2d" in arrays and arrays["points_2d"].shape[1] != 2:
+        raise ValueError("Points must be 2D coordinates")
+
+    for name, value in (request.projections or {}).items():
+        arrays[f"projections.{name}"] = value
+
+    for name, value in (request.projection_points or {}).items():
+        arrays[f"projection_points.{name}"] = value
+
+    if not arrays:
+        raise ValueError("Upload at least one array")
+    if len({array.shape[0] for array in arrays.values()}) > 1:
+        raise ValueError("All arrays must describe the same number of points")
+    return arrays
+
+def resolve_session(session_id: Optional[str]) -> Optional[MatrixSession]:
+    """Session referenced by a projection request (404 if unknown or evicted)"""
+    if session_id is None:
+        return None
+    try:
+        return session_store.get(session_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Session not found: {session_id}")
+
+def session_array(request: BaseModel, session: Optional[MatrixSession], name: str) -> np.ndarray:
+    """Matrix sent inline with a request (parsed by the schema), or else the session's array of that name"""
+    value = getattr(request, name)
+    if value is not None:
+        return value
+    if session is not None and name in session.arrays:
+        return session.arrays[name]
+    raise ValueError(f"{name} is required (inline or through session_id)")
+
+def low_dim_input(
+    request: BaseModel,
+    session: Optional[MatrixSession]
+) -> Tuple[Optional[np.ndarray], Optional[np.ndarray]]:
+    """
+    (D_low, None) or (None, points_low) of a projection request
+
+    Inline fields win over the session's, and a D_low wins over coordinates.
+    """
+    if request.D_low is not None:
+        return request.D_low, None
+    if request.points_low is not None:
+        return None, request.points_low
+    if session is not None and "D_low" in session.arrays:
+        return session.arrays["D_low"], None
+    if session is not None and "points_low" in session.arrays:
+        return None, session.arrays["points_low"]
+    raise ValueError("D_low or points_low is required (inline or through session_id)")
+
+async def dense_low_dim_input(
+    request: BaseModel,
+    session: Optional[MatrixSession],
+    artifacts: Optional[Any]
+) -> Tuple[np.ndarray, Optional[Any]]:
+    """D_low of a request (computed from coordinates if needed) and the artifact cache to use with it"""
+    D_low, points_low = low_dim_input(request, session)
+    if D_low is None:
+        D_low, artifacts = await worker_pools.run_in_thread(
+            ProjectionQualityMetrics.distances_from_points, points_low, artifacts
         )
+    return D_low, artifacts
+
+@app.post(
+    "/api/v1/sessions",
+    response_model=SessionResponse,
+    status_code=201,
+    openapi_extra=wire_format.openapi_body(SessionCreateRequest)
+)
+async def create_session(
+    request: SessionCreateRequest = Depends(wire_format.body_model(SessionCreateRequest))
+):
+    """
+    Upload D_high, D_low, embeddings, 2D points or projections once
+
+    The returned session_id can replace those fields in every projection
+    endpoint; parsed arrays and derived artifacts (kNN lists) stay in memory
+    until the session is deleted or evicted.
+    """
+    try:
+        arrays = await worker_pools.run_in_thread(build_session_arrays, request)
+        session = session_store.create(arrays)
+        return SessionResponse(**session.describe())
 
+    except ValueError as e:
+        logger.error(f"Invalid session upload: {e}")
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        logger.error(f"Pipeline execution failed: {e}")
-        raise HTTPException(status_code=500, detail="Pipeline execution failed")
+        logger.error(f"Error creating session: {e}")
+        raise HTTPException(status_code=500, detail="Failed to create session")
+
+@app.get("/api/v1/sessions/{session_id}", response_model=SessionResponse)
+async def get_session(session_id: str):
+    """Arrays, cached artifacts and size of a session"""
+    return SessionResponse(**resolve_session(session_id).describe())
+
+@app.delete("/api/v1/sessions/{session_id}")
+async def delete_session(session_id: str):
+    """Release a session and its artifacts"""
+    if not session_store.delete(session_id):
+        raise HTTPException(status_code=404, detail=f"Session not found: {session_id}")
+    return {"session_id": session_id, "deleted": True}
 
 # ============= Projection Quality Endpoints =============
 
-@app.post("/api/v1/projection/errors", response_model=ProjectionErrorsResponse)
-async def compute_projection_errors(request: ProjectionErrorsRequest):
+@app.post(
+    "/api/v1/projection/errors",
+    response_model=ProjectionErrorsResponse,
+    openapi_extra=wire_format.openapi_body(ProjectionErrorsRequest)
+)
+async def compute_projection_errors(
+    http_request: Request,
+    request: ProjectionErrorsRequest = Depends(wire_format.body_model(ProjectionErrorsRequest))
+):
     """
     Compute normalized projection errors matrix e_ij ∈ [-1, 1]
 
@@ -488,10 +1117,11 @@ async def compute_projection_errors(request: ProjectionErrorsRequest):
     - Negative values indicate compression (distances decreased)
     - Values close to 0 indicate good preservation
     """
+    session = resolve_session(request.session_id)
     try:
-        # Convert to numpy arrays
-        D_high = np.array(request.D_high)
-        D_low = np.array(request.D_low)
+        # Convert to numpy arrays (D_low from coordinates if needed)
+        D_high = session_array(request, session, "D_high")
+        D_low, _ = await dense_low_dim_input(request, session, None)
 
         # Validate dimensions
         if D_high.shape != D_low.shape:
@@ -501,7 +1131,13 @@ async def compute_projection_errors(request: ProjectionErrorsRequest):
             raise ValueError("Distance matrices must be square")
 
         # Compute errors
-        errors, stats = ProjectionQualityMetrics.compute_projection_errors(D_high, D_low)
+        errors, stats = await worker_pools.run_in_thread(
+            ProjectionQualityMetrics.compute_projection_errors, D_high, D_low
+        )
+
+        fmt = wire_format.negotiate(http_request.headers.get("accept"))
+        if fmt != wire_format.JSON:
+            return wire_format.encode_response(fmt, fields={"stats": stats}, arrays={"errors": errors})
 
         return ProjectionErrorsResponse(
             errors=errors.tolist(),
@@ -515,23 +1151,39 @@ async def compute_projection_errors(request: ProjectionErrorsRequest):
         logger.error(f"Error computing projection errors: {e}")
         raise HTTPException(status_code=500, detail="Failed to compute projection errors")
 
-@app.post("/api/v1/projection/false_neighbors", response_model=FalseNeighborsResponse)
-async def find_false_neighbors(request: FalseNeighborsRequest):
+@app.post(
+    "/api/v1/projection/false_neighbors",
+    response_model=FalseNeighborsResponse,
+    openapi_extra=wire_format.openapi_body(FalseNeighborsRequest)
+)
+async def find_false_neighbors(
+    http_request: Request,
+    request: FalseNeighborsRequest = Depends(wire_format.body_model(FalseNeighborsRequest))
+):
     """
     Identify false neighbors: points that are neighbors in low-D but not in high-D
 
     Also computes Delaunay triangulation for visualization of 2D projections.
+    The columns output (and every binary response) returns parallel pair
+    arrays instead of one object per false pair.
     """
+    session = resolve_session(request.session_id)
     try:
-        # Convert to numpy arrays
-        D_high = np.array(request.D_high)
-        D_low = np.array(request.D_low)
-        points_2d = np.array(request.points_2d)
+        # Convert to numpy arrays (coordinates are used without building a dense D_low)
+        D_high = session_array(request, session, "D_high")
+        D_low, points_low = low_dim_input(request, session)
+        if points_low is None or request.points_2d is not None or (session is not None and "points_2d" in session.arrays):
+            points_2d = session_array(request, session, "points_2d")
+        else:
+            points_2d = points_low
 
         # Validate
-        if D_high.shape != D_low.shape:
+        if D_low is not None and D_high.shape != D_low.shape:
             raise ValueError("Distance matrices must have same dimensions")
 
+        if points_low is not None and points_low.shape[0] != D_high.shape[0]:
+            raise ValueError("Number of low-dimensional points must match matrix dimension")
+
         if points_2d.shape[0] != D_high.shape[0]:
             raise ValueError("Number of 2D points must match matrix dimension")
 
@@ -539,14 +1191,31 @@ async def find_false_neighbors(request: FalseNeighborsRequest):
             raise ValueError("Points must be 2D coordinates")
 
         # Compute false neighbors
-        false_neighbors, delaunay_edges, metrics = ProjectionQualityMetrics.compute_false_neighbors(
-            D_high, D_low, points_2d, request.k_neighbors
+        pairs, edges, fn_metrics = await worker_pools.run_in_thread(
+            ProjectionQualityMetrics.compute_false_neighbor_pairs,
+            D_high, D_low, points_2d, request.k_neighbors,
+            session_store.artifacts(session) if session else None, points_low
         )
 
+        fmt = wire_format.negotiate(http_request.headers.get("accept"))
+        if fmt != wire_format.JSON:
+            arrays = {f"false_neighbors.{name}": array for name, array in pairs.items()}
+            arrays["delaunay_edges"] = edges
+            return wire_format.encode_response(fmt, fields={"metrics": fn_metrics}, arrays=arrays)
+
+        if request.output == "columns":
+            return FalseNeighborsResponse(
+                false_neighbor_pairs=FalseNeighborPairs(**{name: array.tolist() for name, array in pairs.items()}),
+                delaunay_edges=edges.tolist(),
+                metrics=fn_metrics
+            )
+
+        false_neighbors, delaunay_edges = ProjectionQualityMetrics.false_neighbor_records(pairs, edges)
+
         return FalseNeighborsResponse(
             false_neighbors=false_neighbors,
             delaunay_edges=delaunay_edges,
-            metrics=metrics
+            metrics=fn_metrics
         )
 
     except ValueError as e:
@@ -556,27 +1225,59 @@ async def find_false_neighbors(request: FalseNeighborsRequest):
         logger.error(f"Error computing false neighbors: {e}")
         raise HTTPException(status_code=500, detail="Failed to compute false neighbors")
 
-@app.post("/api/v1/projection/missing_neighbors", response_model=MissingNeighborsResponse)
-async def compute_missing_neighbors(request: MissingNeighborsRequest):
+@app.post(
+    "/api/v1/projection/missing_neighbors",
+    response_model=MissingNeighborsResponse,
+    openapi_extra=wire_format.openapi_body(MissingNeighborsRequest)
+)
+async def compute_missing_neighbors(
+    http_request: Request,
+    request: MissingNeighborsRequest = Depends(wire_format.body_model(MissingNeighborsRequest))
+):
     """
     Build graph of missing neighbors: points that are neighbors in high-D but far in low-D
 
     Useful for understanding which relationships are lost in the projection.
+    The edges output (and every binary response) returns parallel source,
+    target and rank arrays instead of the adjacency-list dicts.
     """
+    session = resolve_session(request.session_id)
     try:
-        # Convert to numpy arrays
-        D_high = np.array(request.D_high)
-        D_low = np.array(request.D_low)
+        # Convert to numpy arrays (coordinates are used without building a dense D_low)
+        D_high = session_array(request, session, "D_high")
+        D_low, points_low = low_dim_input(request, session)
 
         # Validate
-        if D_high.shape != D_low.shape:
+        if D_low is not None and D_high.shape != D_low.shape:
             raise ValueError("Distance matrices must have same dimensions")
 
-        # Compute missing neighbors graph
-        graph, missing_count, stats = ProjectionQualityMetrics.compute_missing_neighbors_graph(
-            D_high, D_low, request.k_neighbors, request.threshold
+        if points_low is not None and points_low.shape[0] != D_high.shape[0]:
+            raise ValueError("Number of low-dimensional points must match matrix dimension")
+
+        # Compute missing neighbor edges
+        edges, missing_count, stats = await worker_pools.run_in_thread(
+            ProjectionQualityMetrics.compute_missing_neighbors_edges,
+            D_high, D_low, request.k_neighbors, request.threshold,
+            session_store.artifacts(session) if session else None, points_low
         )
 
+        fmt = wire_format.negotiate(http_request.headers.get("accept"))
+        if fmt != wire_format.JSON:
+            arrays = {f"edges.{name}": array for name, array in edges.items()}
+            arrays["missing_count"] = missing_count
+            return wire_format.encode_response(fmt, fields={"stats": stats}, arrays=arrays)
+
+        if request.output == "edges":
+            return MissingNeighborsResponse(
+                edges=MissingNeighborEdges(
+                    **{name: array.tolist() for name, array in edges.items()},
+                    missing_count=missing_count.tolist()
+                ),
+                stats=stats
+            )
+
+        graph, missing_count = ProjectionQualityMetrics.missing_neighbors_adjacency(edges, missing_count)
+
         return MissingNeighborsResponse(
             graph=graph,
             missing_count=missing_count,
@@ -590,17 +1291,65 @@ async def compute_missing_neighbors(request: MissingNeighborsRequest):
         logger.error(f"Error computing missing neighbors: {e}")
         raise HTTPException(status_code=500, detail="Failed to compute missing neighbors")
 
-@app.post("/api/v1/projection/group_analysis", response_model=GroupAnalysisResponse)
-async def analyze_projection_groups(request: GroupAnalysisRequest):
+@app.post(
+    "/api/v1/projection/quality_curves",
+    response_model=QualityCurvesResponse,
+    openapi_extra=wire_format.openapi_body(QualityCurvesRequest)
+)
+async def compute_quality_curves(
+    request: QualityCurvesRequest = Depends(wire_format.body_model(QualityCurvesRequest))
+):
+    """
+    Trustworthiness, continuity and false/missing-neighbor ratios for every k from 1 to max_k
+
+    One pass over the rank matrices of both spaces gives the whole curve, so
+    tuning k needs a single call instead of one per k.
+    """
+    session = resolve_session(request.session_id)
+    try:
+        # Convert to numpy arrays (D_low from coordinates if needed)
+        D_high = session_array(request, session, "D_high")
+        D_low, artifacts = await dense_low_dim_input(
+            request, session, session_store.artifacts(session) if session else None
+        )
+
+        # Validate
+        if D_high.shape != D_low.shape:
+            raise ValueError("Distance matrices must have same dimensions")
+
+        # Compute the curves
+        curves = await worker_pools.run_in_thread(
+            ProjectionQualityMetrics.compute_quality_curves,
+            D_high, D_low, request.max_k, artifacts
+        )
+
+        return QualityCurvesResponse(**curves)
+
+    except ValueError as e:
+        logger.error(f"Invalid input for quality curves: {e}")
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error computing quality curves: {e}")
+        raise HTTPException(status_code=500, detail="Failed to compute quality curves")
+
+@app.post(
+    "/api/v1/projection/group_analysis",
+    response_model=GroupAnalysisResponse,
+    openapi_extra=wire_format.openapi_body(GroupAnalysisRequest)
+)
+async def analyze_projection_groups(
+    request: GroupAnalysisRequest = Depends(wire_format.body_model(GroupAnalysisRequest))
+):
     """
     Analyze projection quality per group/cluster
 
     Computes cohesion, separation, and confusion matrix for grouped data.
     """
+    session = resolve_session(request.session_id)
     try:
-        # Convert to numpy arrays
-        D_high = np.array(request.D_high)
-        D_low = np.array(request.D_low)
+        # Convert to numpy arrays (D_low from coordinates if needed)
+        D_high = session_array(request, session, "D_high")
+        D_low, _ = await dense_low_dim_input(request, session, session_store.artifacts(session) if session else None)
         groups = np.array(request.groups)
 
         # Validate
@@ -611,13 +1360,13 @@ async def analyze_projection_groups(request: GroupAnalysisRequest):
             raise ValueError("Number of group labels must match matrix dimension")
 
         # Analyze groups
-        group_metrics, confusion_matrix, global_metrics = ProjectionQualityMetrics.analyze_groups(
-            D_high, D_low, groups
+        group_metrics, confusion_matrix, global_metrics = await worker_pools.run_in_thread(
+            ProjectionQualityMetrics.analyze_groups, D_high, D_low, groups
         )
 
         # Convert to response format
         from app.schemas import GroupMetrics
-        groups_response = [GroupMetrics(**metrics) for metrics in group_metrics]
+        groups_response = [GroupMetrics(**group) for group in group_metrics]
 
         return GroupAnalysisResponse(
             groups=groups_response,
@@ -632,33 +1381,73 @@ async def analyze_projection_groups(request: GroupAnalysisRequest):
         logger.error(f"Error in group analysis: {e}")
         raise HTTPException(status_code=500, detail="Failed to analyze groups")
 
-@app.post("/api/v1/projection/compare", response_model=ProjectionCompareResponse)
-async def compare_projections(request: ProjectionCompareRequest):
+@app.post(
+    "/api/v1/projection/compare",
+    response_model=ProjectionCompareResponse,
+    openapi_extra=wire_format.openapi_body(ProjectionCompareRequest)
+)
+async def compare_projections(
+    request: ProjectionCompareRequest = Depends(wire_format.body_model(ProjectionCompareRequest))
+):
     """
     Compare multiple projection methods using various quality metrics
 
     Computes stress, trustworthiness, continuity, and other metrics for each projection.
     Returns rankings and identifies the best projection.
     """
+    session = resolve_session(request.session_id)
     try:
         # Convert to numpy arrays
-        D_high = np.array(request.D_high)
+        D_high = session_array(request, session, "D_high")
 
-        # Convert projection dictionaries
+        # Convert projection dictionaries (matrices or coordinates)
         projections = {}
-        for name, D_low_list in request.projections.items():
-            D_low = np.array(D_low_list)
+        point_sets = {}
+        if request.projections is not None or request.projection_points is not None:
+            projections.update(request.projections or {})
+            point_sets.update(request.projection_points or {})
+        elif session is not None:
+            for key, array in session.arrays.items():
+                if key.startswith("projections."):
+                    projections[key[len("projections."):]] = array
+                elif key.startswith("projection_points."):
+                    point_sets[key[len("projection_points."):]] = array
+
+        # Low-D distances of coordinate projections are computed here, their kNN lists by a KD-tree
+        artifacts = session_store.artifacts(session) if session else None
+        coordinate_pairs = []
+        for name, points in point_sets.items():
+            if name in projections:
+                raise ValueError(f"Projection '{name}' given both as a matrix and as coordinates")
+            if points.shape[0] != D_high.shape[0]:
+                raise ValueError(f"Projection '{name}' has incompatible dimensions")
+            projections[name], _ = await worker_pools.run_in_thread(
+                ProjectionQualityMetrics.distances_from_points, points, artifacts
+            )
+            coordinate_pairs.append((projections[name], points))
+        if coordinate_pairs:
+            artifacts = CoordinateArtifacts(coordinate_pairs, artifacts)
+
+        if len(projections) < 2:
+            raise ValueError("At least 2 projections required for comparison")
+        for name, D_low in projections.items():
             if D_high.shape != D_low.shape:
                 raise ValueError(f"Projection '{name}' has incompatible dimensions")
-            projections[name] = D_low
 
-        # Compare projections
-        projection_metrics, rankings, best_projection, comparison_matrix = \
-            ProjectionQualityMetrics.compare_projections(D_high, projections)
+        # Compare projections: shared D_high artifacts once, then every candidate concurrently
+        comparison = ProjectionComparison(D_high, artifacts=artifacts)
+        await worker_pools.run_in_thread(comparison.prepare)
+        results = await asyncio.gather(*(
+            worker_pools.run_in_thread(comparison.evaluate, name, D_low)
+            for name, D_low in projections.items()
+        ))
+        projection_metrics, rankings, best_projection, comparison_matrix = await worker_pools.run_in_thread(
+            comparison.summarize, list(results)
+        )
 
         # Convert to response format
         from app.schemas import ProjectionMetrics
-        projections_response = [ProjectionMetrics(**metrics) for metrics in projection_metrics]
+        projections_response = [ProjectionMetrics(**proj) for proj in projection_metrics]
 
         return ProjectionCompareResponse(
             projections=projections_response,
@@ -3,6 +3,6 @@ Services Module for Phylo Explorer
 Contains ML services and embedding generators
 """
 
-from .embedding_service import EmbeddingService
+from .embedding_service import EmbeddingService, EmbeddingBatcher
 
-__all__ = ['EmbeddingService']
+__all__ = ['EmbeddingService', 'EmbeddingBatcher']
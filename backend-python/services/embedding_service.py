@@ -4,11 +4,16 @@ Generates semantic embeddings for text using state-of-the-art transformer models
 """
 
 import os
+import json
+import time
+import asyncio
 import numpy as np
-from typing import List, Optional, Union
+from typing import List, Optional, Union, Dict, Any, Callable, Awaitable
 from sentence_transformers import SentenceTransformer
 import torch
-from sklearn.metrics.pairwise import cosine_similarity
+from app.distance_engine import DistanceEngine, normalize_rows
+from app.metrics import MODEL_DURATION, MODEL_TEXTS
+from .onnx_backend import OnnxSentenceEncoder, compare_cosine_distances
 import logging
 
 logger = logging.getLogger(__name__)
@@ -27,11 +32,16 @@ class EmbeddingService:
         'minilm': 'sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2'
     }
 
+    BACKENDS = ('torch', 'onnx')
+
     def __init__(
         self,
         model_name: Optional[str] = None,
         device: Optional[str] = None,
-        cache_folder: Optional[str] = './models_cache'
+        cache_folder: Optional[str] = './models_cache',
+        embedding_cache=None,
+        token_budget: Optional[int] = None,
+        backend: Optional[str] = None
     ):
         """
         Initialize embedding service with specified model
@@ -40,6 +50,11 @@ class EmbeddingService:
             model_name: Name or path of the sentence transformer model
             device: Device to use ('cuda', 'cpu', or None for auto-detect)
             cache_folder: Folder to cache downloaded models
+            embedding_cache: Optional EmbeddingCache; only cache misses reach the model
+            token_budget: Padded tokens per model batch for length-bucketed encoding
+                (default EMBEDDING_TOKEN_BUDGET or 8192; 0 disables bucketing)
+            backend: Inference backend, 'torch' or 'onnx' (default EMBEDDING_BACKEND or 'torch').
+                The ONNX backend runs on the CPU; see EMBEDDING_ONNX_QUANTIZE and EMBEDDING_ONNX_THREADS
         """
         # Use environment variable or default to multilingual model
         if model_name is None:
@@ -50,9 +65,24 @@ class EmbeddingService:
 
         self.model_name = model_name
         self.cache_folder = cache_folder
-
-        # Auto-detect device if not specified
-        if device is None:
+        self.embedding_cache = embedding_cache
+        self.distance_engine = DistanceEngine.from_env()
+
+        if token_budget is None:
+            token_budget = int(os.getenv('EMBEDDING_TOKEN_BUDGET', '8192'))
+        self.token_budget = token_budget or None
+
+        backend = (backend or os.getenv('EMBEDDING_BACKEND', 'torch')).lower()
+        if backend not in self.BACKENDS:
+            raise ValueError(f"Unsupported embedding backend: {backend}")
+        self.backend = backend
+        self.onnx_quantize = os.getenv('EMBEDDING_ONNX_QUANTIZE', 'true').lower() in ('1', 'true', 'yes')
+        self.onnx_threads = int(os.getenv('EMBEDDING_ONNX_THREADS', '0')) or None
+
+        # Auto-detect device if not specified (ONNX Runtime is served on the CPU)
+        if backend == 'onnx':
+            self.device = 'cpu'
+        elif device is None:
             self.device = 'cuda' if torch.cuda.is_available() else 'cpu'
         else:
             self.device = device
@@ -65,6 +95,25 @@ class EmbeddingService:
 
     def _load_model(self):
         """Load the sentence transformer model"""
+        if self.backend == 'onnx':
+            try:
+                self.model = OnnxSentenceEncoder.from_pretrained(
+                    self.model_name,
+                    cache_folder=self.cache_folder,
+                    quantize=self.onnx_quantize,
+                    intra_op_threads=self.onnx_threads
+                )
+                self.embedding_dim = self.model.get_sentence_embedding_dimension()
+                logger.info(
+                    f"ONNX model loaded (quantized={self.onnx_quantize}). "
+                    f"Embedding dimension: {self.embedding_dim}"
+                )
+                return
+            except Exception as e:
+                logger.error(f"Failed to load ONNX backend for {self.model_name}: {e}")
+                logger.info("Falling back to the torch backend...")
+                self.backend = 'torch'
+
         try:
             self.model = SentenceTransformer(
                 self.model_name,
@@ -88,12 +137,18 @@ class EmbeddingService:
             )
             self.embedding_dim = self.model.get_sentence_embedding_dimension()
 
+    @property
+    def quantization(self) -> Optional[str]:
+        """Weight quantization of the served model ('int8' for the quantized ONNX export, else None)"""
+        return 'int8' if self.backend == 'onnx' and self.onnx_quantize else None
+
     def encode(
         self,
         texts: Union[str, List[str]],
         batch_size: int = 32,
         show_progress_bar: bool = False,
-        normalize_embeddings: bool = True
+        normalize_embeddings: bool = True,
+        preprocessing: Optional[Dict[str, Any]] = None
     ) -> np.ndarray:
         """
         Generate embeddings for given texts
@@ -103,6 +158,7 @@ class EmbeddingService:
             batch_size: Batch size for encoding
             show_progress_bar: Whether to show progress bar
             normalize_embeddings: Whether to normalize embeddings (for cosine similarity)
+            preprocessing: Config of the preprocessing applied to texts (part of the cache key)
 
         Returns:
             Numpy array of embeddings
@@ -111,17 +167,125 @@ class EmbeddingService:
         if isinstance(texts, str):
             texts = [texts]
 
-        # Generate embeddings
-        embeddings = self.model.encode(
-            texts,
-            batch_size=batch_size,
-            show_progress_bar=show_progress_bar,
-            normalize_embeddings=normalize_embeddings,
-            convert_to_numpy=True
-        )
+        if self.embedding_cache is None:
+            return self._encode_model(texts, batch_size, show_progress_bar, normalize_embeddings)
+
+        # Only texts missing from the cache (each distinct text once) go to the model.
+        # Vectors of another backend or quantization differ slightly, so they are keyed apart
+        config = {
+            'normalize_embeddings': normalize_embeddings,
+            'preprocessing': preprocessing,
+            'backend': self.backend,
+            'quantization': self.quantization
+        }
+        keys = self.embedding_cache.make_keys(self.model_name, config, texts)
+        embeddings, missing = self.embedding_cache.lookup(keys, self.embedding_dim)
+
+        if len(missing):
+            first_position = {}
+            for position in missing:
+                first_position.setdefault(keys[position], position)
+            unique = list(first_position.values())
+
+            computed = self._encode_model(
+                [texts[position] for position in unique],
+                batch_size, show_progress_bar, normalize_embeddings
+            )
+            self.embedding_cache.store([keys[position] for position in unique], computed)
+
+            row = {keys[position]: k for k, position in enumerate(unique)}
+            embeddings[missing] = computed[[row[keys[position]] for position in missing]]
+            logger.debug(f"Embedding cache: {len(texts) - len(missing)} hits, {len(unique)} texts encoded")
+
+        return embeddings
+
+    def _encode_model(
+        self,
+        texts: List[str],
+        batch_size: int,
+        show_progress_bar: bool,
+        normalize_embeddings: bool
+    ) -> np.ndarray:
+        """
+        Run the transformer on a list of texts
 
+        With a token budget, texts are tokenized once to measure their length,
+        sorted, and cut into batches of similar length whose padded size stays
+        within the budget: short texts share large batches and one long text
+        no longer pads a whole batch. Output keeps the input order.
+        """
+        with MODEL_DURATION.time(backend=self.backend):
+            embeddings = self._encode_batches(texts, batch_size, show_progress_bar, normalize_embeddings)
+        MODEL_TEXTS.inc(len(texts), backend=self.backend)
         return embeddings
 
+    def _encode_batches(
+        self,
+        texts: List[str],
+        batch_size: int,
+        show_progress_bar: bool,
+        normalize_embeddings: bool
+    ) -> np.ndarray:
+        """Model batches of _encode_model (token-budgeted when a budget is set)"""
+        if self.token_budget is None or len(texts) <= 1:
+            return self.model.encode(
+                texts,
+                batch_size=batch_size,
+                show_progress_bar=show_progress_bar,
+                normalize_embeddings=normalize_embeddings,
+                convert_to_numpy=True
+            )
+
+        lengths = self._token_lengths(texts)
+        order = np.argsort(lengths, kind='stable')
+        embeddings = np.empty((len(texts), self.embedding_dim), dtype=np.float32)
+
+        for start, end in self._length_batches(lengths[order], self.token_budget):
+            batch = order[start:end]
+            embeddings[batch] = self.model.encode(
+                [texts[i] for i in batch],
+                batch_size=len(batch),
+                show_progress_bar=False,
+                normalize_embeddings=normalize_embeddings,
+                convert_to_numpy=True
+            )
+
+        return embeddings
+
+    def _token_lengths(self, texts: List[str]) -> np.ndarray:
+        """Number of tokens the model sees for each text (after truncation)"""
+        max_length = self.model.max_seq_length
+        tokenizer = getattr(self.model, 'tokenizer', None)
+
+        if tokenizer is None:
+            # Rough estimate of ~4 characters per token
+            return np.minimum(np.array([len(text) // 4 + 2 for text in texts]), max_length)
+
+        input_ids = tokenizer(
+            texts,
+            add_special_tokens=True,
+            truncation=True,
+            max_length=max_length
+        )['input_ids']
+        return np.fromiter((len(ids) for ids in input_ids), dtype=np.int64, count=len(texts))
+
+    @staticmethod
+    def _length_batches(sorted_lengths: np.ndarray, token_budget: int) -> List[tuple]:
+        """
+        Cut length-sorted texts into (start, end) batches whose padded size
+        (count x longest length) fits the token budget; every batch has at least one text
+        """
+        batches = []
+        n = len(sorted_lengths)
+        start = 0
+        while start < n:
+            end = start + 1
+            while end < n and (end + 1 - start) * sorted_lengths[end] <= token_budget:
+                end += 1
+            batches.append((start, end))
+            start = end
+        return batches
+
     def compute_similarity_matrix(
         self,
         embeddings: np.ndarray
@@ -133,54 +297,60 @@ class EmbeddingService:
             embeddings: Numpy array of embeddings
 
         Returns:
-            Similarity matrix
+            Similarity matrix (float32)
         """
-        # If embeddings are already normalized, dot product gives cosine similarity
-        # Otherwise, use sklearn's cosine_similarity
-        similarity_matrix = cosine_similarity(embeddings)
-        return similarity_matrix
+        # Rows are only re-normalized if encode() did not already do it
+        unit = normalize_rows(embeddings)
+        return unit @ unit.T
 
     def compute_distance_matrix(
         self,
         embeddings: np.ndarray,
-        distance_metric: str = 'cosine'
+        distance_metric: str = 'cosine',
+        out: Optional[np.ndarray] = None
     ) -> np.ndarray:
         """
         Compute pairwise distance matrix from embeddings
 
+        Runs on the blocked float32 engine: tiles are sized to the
+        DISTANCE_MEMORY_MB budget and written straight into the output.
+
         Args:
             embeddings: Numpy array of embeddings
             distance_metric: Distance metric ('cosine', 'euclidean')
+            out: Optional preallocated or memory-mapped (n x n) array to fill
 
         Returns:
-            Distance matrix
+            Distance matrix (float32, symmetric with a zero diagonal)
         """
-        if distance_metric == 'cosine':
-            # Convert cosine similarity to distance
-            similarity_matrix = self.compute_similarity_matrix(embeddings)
-            distance_matrix = 1 - similarity_matrix
-
-            # Ensure diagonal is exactly 0
-            np.fill_diagonal(distance_matrix, 0.0)
+        return self.distance_engine.pairwise(embeddings, metric=distance_metric, out=out)
 
-            # Ensure no negative values (due to floating point errors)
-            distance_matrix = np.maximum(distance_matrix, 0.0)
-
-        elif distance_metric == 'euclidean':
-            from scipy.spatial.distance import cdist
-            distance_matrix = cdist(embeddings, embeddings, metric='euclidean')
+    def compute_knn_graph(
+        self,
+        embeddings: np.ndarray,
+        k: int,
+        distance_metric: str = 'cosine'
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Compute the sparse k-nearest-neighbor graph of the embeddings
 
-        else:
-            raise ValueError(f"Unsupported distance metric: {distance_metric}")
+        Args:
+            embeddings: Numpy array of embeddings
+            k: Neighbors per document
+            distance_metric: Distance metric ('cosine', 'euclidean')
 
-        return distance_matrix
+        Returns:
+            Tuple of CSR arrays (indptr, indices, distances)
+        """
+        return self.distance_engine.knn(embeddings, k, metric=distance_metric)
 
     def process_texts_to_distances(
         self,
         texts: List[str],
         preprocess: bool = False,
         preprocessor=None,
-        batch_size: int = 32
+        batch_size: int = 32,
+        preprocessing: Optional[Dict[str, Any]] = None
     ) -> tuple[np.ndarray, np.ndarray]:
         """
         Complete pipeline: texts -> embeddings -> distance matrix
@@ -190,6 +360,7 @@ class EmbeddingService:
             preprocess: Whether to preprocess texts
             preprocessor: Text preprocessor instance
             batch_size: Batch size for encoding
+            preprocessing: Config of preprocessing already applied to texts (cache key)
 
         Returns:
             Tuple of (embeddings, distance_matrix)
@@ -197,9 +368,10 @@ class EmbeddingService:
         # Optionally preprocess texts
         if preprocess and preprocessor:
             texts = preprocessor.process_batch(texts)
+            preprocessing = preprocessor.get_config()
 
         # Generate embeddings
-        embeddings = self.encode(texts, batch_size=batch_size)
+        embeddings = self.encode(texts, batch_size=batch_size, preprocessing=preprocessing)
 
         # Compute distance matrix
         distance_matrix = self.compute_distance_matrix(embeddings)
@@ -212,11 +384,193 @@ class EmbeddingService:
             'model_name': self.model_name,
             'embedding_dimension': self.embedding_dim,
             'device': self.device,
+            'backend': self.backend,
+            'quantized': self.backend == 'onnx' and self.onnx_quantize,
             'max_sequence_length': self.model.max_seq_length
         }
 
+    def check_backend_accuracy(self, texts: List[str]) -> Dict[str, Any]:
+        """
+        Compare the cosine distances of the ONNX backend with the torch backend
+
+        The torch model is loaded on the CPU for the check only.
+
+        Args:
+            texts: Sample of texts to encode with both backends
+
+        Returns:
+            Error statistics from compare_cosine_distances plus backend details
+        """
+        if self.backend != 'onnx':
+            raise ValueError("Accuracy check requires the ONNX backend (EMBEDDING_BACKEND=onnx)")
+
+        reference_model = SentenceTransformer(self.model_name, device='cpu', cache_folder=self.cache_folder)
+        reference = reference_model.encode(texts, normalize_embeddings=True, convert_to_numpy=True)
+        candidate = self.model.encode(texts, normalize_embeddings=True)
+
+        report = compare_cosine_distances(reference, candidate)
+        report.update({
+            'model_name': self.model_name,
+            'backend': self.backend,
+            'quantized': self.onnx_quantize,
+            'intra_op_threads': self.onnx_threads
+        })
+        return report
+
     def change_model(self, model_name: str):
         """Change to a different model"""
         logger.info(f"Changing model from {self.model_name} to {model_name}")
         self.model_name = model_name
-        self._load_model()
\ No newline at end of file
+        self._load_model()
+
+
+class EmbeddingBatcher:
+    """
+    Async front-end that merges texts from concurrent requests into one model batch
+
+    Requests are queued and a single dispatcher task collects them until
+    max_batch_size texts are pending or max_wait_ms has passed since the first
+    one arrived. Requests with the same encode options are encoded in one call
+    and each caller gets its own slice of the result back.
+
+    Requests larger than max_batch_size are queued one chunk at a time, so a
+    whole corpus never holds the model for its full encode time: requests
+    arriving meanwhile run between its chunks.
+    """
+
+    def __init__(
+        self,
+        service: EmbeddingService,
+        run_in_thread: Optional[Callable[..., Awaitable[Any]]] = None,
+        max_batch_size: int = 256,
+        max_wait_ms: float = 5.0
+    ):
+        """
+        Initialize the batcher
+
+        Args:
+            service: Embedding service that encodes the merged batches
+            run_in_thread: Coroutine function running a call off the event loop
+                (default: the loop's default executor)
+            max_batch_size: Maximum number of texts merged into one batch
+            max_wait_ms: Maximum time the first request of a batch waits for others
+        """
+        self.service = service
+        self.run_in_thread = run_in_thread or self._default_run_in_thread
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+        # Statistics
+        self.requests = 0
+        self.batches = 0
+        self.texts = 0
+
+    @staticmethod
+    async def _default_run_in_thread(func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, lambda: func(*args, **kwargs))
+
+    def start(self):
+        """Start the dispatcher task (must be called from the event loop)"""
+        if self._task is None:
+            self._queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._dispatch())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def encode(
+        self,
+        texts: Union[str, List[str]],
+        normalize_embeddings: bool = True,
+        preprocessing: Optional[Dict[str, Any]] = None
+    ) -> np.ndarray:
+        """Encode texts as part of a shared batch; same result as EmbeddingService.encode"""
+        if isinstance(texts, str):
+            texts = [texts]
+
+        if self._task is None:
+            self.start()
+
+        options = (normalize_embeddings, json.dumps(preprocessing, sort_keys=True))
+        if len(texts) <= self.max_batch_size:
+            return await self._submit(texts, options, preprocessing)
+
+        # The next chunk is queued only once the previous one is done
+        chunks = []
+        for start in range(0, len(texts), self.max_batch_size):
+            chunks.append(await self._submit(texts[start:start + self.max_batch_size], options, preprocessing))
+        return np.concatenate(chunks)
+
+    async def _submit(self, texts: List[str], options, preprocessing) -> np.ndarray:
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((texts, options, preprocessing, future))
+        return await future
+
+    async def _dispatch(self):
+        while True:
+            # Wait for the first request, then collect more until the batch is full or the wait ends
+            pending = [await self._queue.get()]
+            size = len(pending[0][0])
+            deadline = time.monotonic() + self.max_wait
+
+            while size < self.max_batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                pending.append(item)
+                size += len(item[0])
+
+            groups: Dict[Any, list] = {}
+            for item in pending:
+                groups.setdefault(item[1], []).append(item)
+
+            for options, items in groups.items():
+                await self._run_batch(options, items)
+
+    async def _run_batch(self, options, items):
+        texts = [text for item in items for text in item[0]]
+        self.requests += len(items)
+        self.batches += 1
+        self.texts += len(texts)
+
+        try:
+            embeddings = await self.run_in_thread(
+                self.service.encode, texts,
+                normalize_embeddings=options[0], preprocessing=items[0][2]
+            )
+        except Exception as e:
+            for item in items:
+                if not item[3].done():
+                    item[3].set_exception(e)
+            return
+
+        # Scatter the rows back to each caller
+        start = 0
+        for item in items:
+            end = start + len(item[0])
+            if not item[3].done():
+                item[3].set_result(embeddings[start:end])
+            start = end
+
+    def stats(self) -> Dict[str, Any]:
+        """Batching statistics"""
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "texts": self.texts,
+            "mean_batch_size": self.texts / self.batches if self.batches else 0.0,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "queued": self._queue.qsize() if self._queue is not None else 0
+        }
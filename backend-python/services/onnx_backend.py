@@ -0,0 +1,292 @@
+"""
+ONNX Runtime inference backend for sentence embeddings
+Exports a Sentence Transformers model to ONNX once (optionally with dynamic
+int8 quantization) and serves encode() through ONNX Runtime on the CPU
+"""
+
+import os
+import json
+import numpy as np
+from typing import List, Optional, Union, Dict, Any
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Pooling modes that can be reproduced in NumPy after the ONNX graph
+SUPPORTED_POOLING = ('mean', 'cls', 'max')
+
+CONFIG_FILE = 'encoder_config.json'
+MODEL_FILE = 'model.onnx'
+QUANTIZED_MODEL_FILE = 'model.int8.onnx'
+
+
+def export_dir_for(model_name: str, cache_folder: Optional[str]) -> str:
+    """Directory holding the ONNX export of a model inside the model cache"""
+    return os.path.join(cache_folder or '.', 'onnx', model_name.replace('/', '__'))
+
+
+def export_sentence_transformer(
+    model_name: str,
+    export_dir: str,
+    cache_folder: Optional[str] = None,
+    quantize: bool = True
+):
+    """
+    Export the transformer of a Sentence Transformers model to ONNX
+
+    Only the token embeddings are exported; pooling and normalization run in
+    NumPy. Models with modules other than Transformer, Pooling and Normalize
+    (e.g. a Dense projection) are rejected.
+
+    Args:
+        model_name: Name or path of the sentence transformer model
+        export_dir: Directory to write the ONNX model, tokenizer and config
+        cache_folder: Folder the torch model is loaded from
+        quantize: Also write a dynamically int8-quantized copy
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer, models
+
+    st_model = SentenceTransformer(model_name, device='cpu', cache_folder=cache_folder)
+    modules = list(st_model)
+    transformer = modules[0]
+    if not isinstance(transformer, models.Transformer):
+        raise ValueError(f"Model {model_name} has no Transformer module to export")
+
+    pooling_mode = 'cls'
+    for module in modules[1:]:
+        if isinstance(module, models.Pooling):
+            pooling_mode = module.get_pooling_mode_str()
+        elif not isinstance(module, models.Normalize):
+            raise ValueError(
+                f"Module {type(module).__name__} of {model_name} is not supported by the ONNX backend"
+            )
+    if pooling_mode not in SUPPORTED_POOLING:
+        raise ValueError(f"Pooling mode {pooling_mode} is not supported by the ONNX backend")
+
+    tokenizer = transformer.tokenizer
+    auto_model = transformer.auto_model.eval()
+    sample = tokenizer(["exemplo de texto"], return_tensors='pt')
+    input_names = [name for name in ('input_ids', 'attention_mask', 'token_type_ids') if name in sample]
+
+    class TokenEmbeddings(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.model = auto_model
+
+        def forward(self, *inputs):
+            return self.model(**dict(zip(input_names, inputs)))[0]
+
+    os.makedirs(export_dir, exist_ok=True)
+    model_path = os.path.join(export_dir, MODEL_FILE)
+    dynamic_axes = {name: {0: 'batch', 1: 'sequence'} for name in input_names + ['token_embeddings']}
+
+    logger.info(f"Exporting {model_name} to ONNX in {export_dir}")
+    with torch.no_grad():
+        torch.onnx.export(
+            TokenEmbeddings(),
+            tuple(sample[name] for name in input_names),
+            model_path + '.tmp',
+            input_names=input_names,
+            output_names=['token_embeddings'],
+            dynamic_axes=dynamic_axes,
+            opset_version=14
+        )
+    os.replace(model_path + '.tmp', model_path)
+
+    if quantize:
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+
+        quantized_path = os.path.join(export_dir, QUANTIZED_MODEL_FILE)
+        quantize_dynamic(model_path, quantized_path + '.tmp', weight_type=QuantType.QInt8)
+        os.replace(quantized_path + '.tmp', quantized_path)
+
+    tokenizer.save_pretrained(export_dir)
+    with open(os.path.join(export_dir, CONFIG_FILE), 'w') as f:
+        json.dump({
+            'model_name': model_name,
+            'pooling_mode': pooling_mode,
+            'max_seq_length': st_model.max_seq_length,
+            'embedding_dimension': st_model.get_sentence_embedding_dimension(),
+            'do_lower_case': bool(getattr(transformer, 'do_lower_case', False))
+        }, f, indent=2)
+
+
+def pool_token_embeddings(
+    token_embeddings: np.ndarray,
+    attention_mask: np.ndarray,
+    mode: str = 'mean'
+) -> np.ndarray:
+    """
+    Pool (batch x sequence x dim) token embeddings into sentence embeddings
+
+    Args:
+        token_embeddings: Output of the transformer
+        attention_mask: (batch x sequence) mask of real (non-padding) tokens
+        mode: 'mean', 'cls' or 'max', as in Sentence Transformers' Pooling
+
+    Returns:
+        (batch x dim) float32 array
+    """
+    if mode == 'cls':
+        return token_embeddings[:, 0].astype(np.float32)
+
+    mask = attention_mask[:, :, None].astype(np.float32)
+    if mode == 'max':
+        return np.where(mask > 0, token_embeddings, -1e9).max(axis=1).astype(np.float32)
+    if mode == 'mean':
+        summed = (token_embeddings * mask).sum(axis=1)
+        return (summed / np.maximum(mask.sum(axis=1), 1e-9)).astype(np.float32)
+
+    raise ValueError(f"Unsupported pooling mode: {mode}")
+
+
+def compare_cosine_distances(reference: np.ndarray, candidate: np.ndarray) -> Dict[str, Any]:
+    """
+    Compare the cosine distance matrices of two embeddings of the same texts
+
+    Args:
+        reference: (n x d) embeddings from the reference backend
+        candidate: (n x d) embeddings from the backend under test
+
+    Returns:
+        Absolute errors over the distinct pairs, their correlation and the
+        fraction of texts whose nearest neighbor is unchanged
+    """
+    def cosine_distances(embeddings: np.ndarray) -> np.ndarray:
+        embeddings = np.asarray(embeddings, dtype=np.float64)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        unit = embeddings / np.maximum(norms, 1e-12)
+        return 1.0 - unit @ unit.T
+
+    if reference.shape != candidate.shape:
+        raise ValueError(f"Embedding shapes differ: {reference.shape} vs {candidate.shape}")
+    n = reference.shape[0]
+    if n < 2:
+        raise ValueError("At least 2 texts are needed to compare distances")
+
+    reference_distances = cosine_distances(reference)
+    candidate_distances = cosine_distances(candidate)
+    upper = np.triu_indices(n, k=1)
+    errors = np.abs(reference_distances[upper] - candidate_distances[upper])
+
+    np.fill_diagonal(reference_distances, np.inf)
+    np.fill_diagonal(candidate_distances, np.inf)
+    same_neighbor = reference_distances.argmin(axis=1) == candidate_distances.argmin(axis=1)
+
+    correlation = (
+        float(np.corrcoef(reference_distances[upper], candidate_distances[upper])[0, 1])
+        if n > 2 else 1.0
+    )
+
+    return {
+        'n_texts': n,
+        'max_abs_error': float(errors.max()),
+        'mean_abs_error': float(errors.mean()),
+        'distance_correlation': correlation,
+        'nearest_neighbor_agreement': float(same_neighbor.mean())
+    }
+
+
+class OnnxSentenceEncoder:
+    """
+    Drop-in replacement for SentenceTransformer.encode served by ONNX Runtime
+
+    Exposes the attributes EmbeddingService relies on (tokenizer,
+    max_seq_length, get_sentence_embedding_dimension and encode).
+    """
+
+    def __init__(self, export_dir: str, quantized: bool = True, intra_op_threads: Optional[int] = None):
+        """
+        Load an exported model
+
+        Args:
+            export_dir: Directory written by export_sentence_transformer
+            quantized: Serve the int8-quantized model instead of the float32 one
+            intra_op_threads: ONNX Runtime intra-op threads (None: runtime default)
+        """
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        with open(os.path.join(export_dir, CONFIG_FILE)) as f:
+            config = json.load(f)
+
+        self.export_dir = export_dir
+        self.quantized = quantized
+        self.pooling_mode = config['pooling_mode']
+        self.max_seq_length = config['max_seq_length']
+        self.embedding_dim = config['embedding_dimension']
+        self.do_lower_case = config.get('do_lower_case', False)
+        self.tokenizer = AutoTokenizer.from_pretrained(export_dir)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if intra_op_threads:
+            options.intra_op_num_threads = intra_op_threads
+        self.intra_op_threads = intra_op_threads
+
+        model_path = os.path.join(export_dir, QUANTIZED_MODEL_FILE if quantized else MODEL_FILE)
+        self.session = ort.InferenceSession(model_path, options, providers=['CPUExecutionProvider'])
+        self.input_names = [node.name for node in self.session.get_inputs()]
+
+    @classmethod
+    def from_pretrained(
+        cls,
+        model_name: str,
+        cache_folder: Optional[str] = './models_cache',
+        quantize: bool = True,
+        intra_op_threads: Optional[int] = None
+    ) -> "OnnxSentenceEncoder":
+        """Load the ONNX export of a model, exporting it on first use"""
+        export_dir = export_dir_for(model_name, cache_folder)
+        model_file = QUANTIZED_MODEL_FILE if quantize else MODEL_FILE
+        if not (os.path.exists(os.path.join(export_dir, model_file)) and
+                os.path.exists(os.path.join(export_dir, CONFIG_FILE))):
+            export_sentence_transformer(model_name, export_dir, cache_folder=cache_folder, quantize=quantize)
+
+        return cls(export_dir, quantized=quantize, intra_op_threads=intra_op_threads)
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.embedding_dim
+
+    def encode(
+        self,
+        texts: Union[str, List[str]],
+        batch_size: int = 32,
+        show_progress_bar: bool = False,
+        normalize_embeddings: bool = False,
+        convert_to_numpy: bool = True
+    ) -> np.ndarray:
+        """
+        Generate embeddings (same signature as SentenceTransformer.encode)
+
+        Returns:
+            (n x dim) float32 array
+        """
+        if isinstance(texts, str):
+            texts = [texts]
+
+        embeddings = np.empty((len(texts), self.embedding_dim), dtype=np.float32)
+        for start in range(0, len(texts), max(1, batch_size)):
+            batch = texts[start:start + batch_size]
+            if self.do_lower_case:
+                batch = [text.lower() for text in batch]
+
+            features = self.tokenizer(
+                batch,
+                padding=True,
+                truncation=True,
+                max_length=self.max_seq_length,
+                return_tensors='np'
+            )
+            inputs = {name: features[name].astype(np.int64) for name in self.input_names}
+            token_embeddings = self.session.run(None, inputs)[0]
+            embeddings[start:start + len(batch)] = pool_token_embeddings(
+                token_embeddings, features['attention_mask'], self.pooling_mode
+            )
+
+        if normalize_embeddings:
+            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            embeddings /= np.maximum(norms, 1e-12)
+
+        return embeddings
@@ -0,0 +1,183 @@
+"""
+Unit tests for the IVF nearest-neighbor index
+"""
+import numpy as np
+import pytest
+from app.ann_index import IVFIndex, DocumentIndex
+
+
+def clustered(n, dim=32, clusters=20, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim))
+    return (centers[rng.integers(0, clusters, n)] + 0.3 * rng.normal(size=(n, dim))).astype(np.float32)
+
+
+def exact_neighbors(x, queries, k):
+    unit = x / np.linalg.norm(x, axis=1, keepdims=True)
+    q = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+    return np.argsort(-(q @ unit.T), axis=1)[:, :k]
+
+
+class TestIVFIndex:
+    """Test search quality, inserts and persistence"""
+
+    def test_probing_every_list_is_exact(self):
+        x = clustered(2000)
+        index = IVFIndex(32)
+        index.add([str(i) for i in range(len(x))], x)
+
+        results = index.search(x[:20], k=5, n_probe=index.n_lists)
+        expected = exact_neighbors(x, x[:20], 5)
+        for result, row in zip(results, expected):
+            assert [int(doc_id) for doc_id, _ in result] == row.tolist()
+            distances = [distance for _, distance in result]
+            assert distances == sorted(distances)
+
+    def test_default_probe_recall(self):
+        x = clustered(4000, seed=1)
+        index = IVFIndex(32)
+        index.add([str(i) for i in range(len(x))], x)
+
+        results = index.search(x[:50], k=10)
+        expected = exact_neighbors(x, x[:50], 10)
+        recall = np.mean([
+            len({int(doc_id) for doc_id, _ in result} & set(row.tolist())) / 10
+            for result, row in zip(results, expected)
+        ])
+        assert recall > 0.9
+
+    def test_incremental_inserts_and_replacement(self):
+        x = clustered(600, seed=2)
+        index = IVFIndex(32)
+        index.add([str(i) for i in range(300)], x[:300])
+        index.add([str(i) for i in range(300, 600)], x[300:])
+        assert len(index) == 600
+
+        # Replacing a document moves it next to its new vector
+        index.add(["0"], x[599:600])
+        assert len(index) == 600
+        np.testing.assert_allclose(index.reconstruct("0"), x[599] / np.linalg.norm(x[599]), rtol=1e-5)
+        nearest = index.search(x[599:600], k=2, n_probe=index.n_lists)[0]
+        assert {doc_id for doc_id, _ in nearest} == {"0", "599"}
+
+    def test_exclude_query_document(self):
+        x = clustered(200, seed=3)
+        index = IVFIndex(32)
+        index.add([str(i) for i in range(200)], x)
+
+        result = index.search(x[:1], k=3, exclude=["0"])[0]
+        assert "0" not in [doc_id for doc_id, _ in result]
+        assert len(result) == 3
+
+    def test_product_quantization(self):
+        x = clustered(10000, clusters=200, seed=4)
+        index = IVFIndex(32, pq_subvectors=8)
+        index.add([str(i) for i in range(len(x))], x)
+        assert index.stats()["nbytes"] < x.nbytes / 2
+
+        results = index.search(x[:30], k=10, n_probe=index.n_lists)
+        expected = exact_neighbors(x, x[:30], 10)
+        recall = np.mean([
+            len({int(doc_id) for doc_id, _ in result} & set(row.tolist())) / 10
+            for result, row in zip(results, expected)
+        ])
+        assert recall > 0.5
+
+    def test_small_first_insert_is_buffered(self, tmp_path):
+        """Training waits for enough vectors; until then searches are exact"""
+        x = clustered(10000, seed=9)
+        index = IVFIndex(32, pq_subvectors=8)
+        index.add(["0", "1"], x[:2])
+        assert not index.is_trained
+        assert index.search(x[1:2], k=1)[0][0][0] == "1"
+
+        path = str(tmp_path / "buffer.npz")
+        index.save(path)
+        index, _ = IVFIndex.load(path)
+        assert len(index) == 2
+
+        index.add([str(i) for i in range(2, len(x))], x[2:])
+        assert index.is_trained
+        assert index.n_lists > 1
+        assert index.codebooks.shape == (8, 256, 4)
+        assert len(index) == len(x)
+        np.testing.assert_allclose(index.reconstruct("0"), x[0] / np.linalg.norm(x[0]), atol=0.5)
+
+    def test_save_and_load(self, tmp_path):
+        x = clustered(500, seed=5)
+        for pq_subvectors in (0, 4):
+            index = IVFIndex(32, pq_subvectors=pq_subvectors)
+            index.add([f"doc-{i}" for i in range(len(x))], x)
+            path = str(tmp_path / f"index_{pq_subvectors}.npz")
+            index.save(path, model_name="model-a")
+
+            loaded, metadata = IVFIndex.load(path)
+            assert metadata == {"model_name": "model-a"}
+            assert len(loaded) == 500
+            assert loaded.search(x[:5], k=4) == index.search(x[:5], k=4)
+
+            # Loaded lists keep accepting inserts
+            loaded.add(["new"], x[:1])
+            assert "new" in loaded
+
+    def test_dimension_mismatch(self):
+        index = IVFIndex(32)
+        with pytest.raises(ValueError):
+            index.add(["a"], np.ones((1, 16), dtype=np.float32))
+        with pytest.raises(ValueError):
+            IVFIndex(30, pq_subvectors=8)
+
+
+class TestDocumentIndex:
+    """Test persistence across restarts and model changes"""
+
+    def test_reload_and_model_change(self, tmp_path):
+        path = str(tmp_path / "ann" / "index.npz")
+        x = clustered(100, seed=6)
+        index = DocumentIndex(path, "model-a", 32)
+        index.add([str(i) for i in range(100)], x)
+
+        reloaded = DocumentIndex(path, "model-a", 32)
+        assert reloaded.stats()["documents"] == 100
+        assert reloaded.search_document("7", k=3) == index.search_document("7", k=3)
+
+        assert DocumentIndex(path, "model-b", 32).stats()["documents"] == 0
+
+    def test_backend_change_drops_the_index(self, tmp_path):
+        path = str(tmp_path / "index.npz")
+        x = clustered(100, seed=8)
+        DocumentIndex(path, "model-a", 32, backend="onnx", quantization="int8").add([str(i) for i in range(100)], x)
+
+        assert DocumentIndex(path, "model-a", 32, backend="onnx", quantization="int8").stats()["documents"] == 100
+        assert DocumentIndex(path, "model-a", 32, backend="onnx").stats()["documents"] == 0
+        assert DocumentIndex(path, "model-a", 32).stats()["documents"] == 0
+
+    def test_saves_are_batched(self, tmp_path):
+        path = str(tmp_path / "index.npz")
+        x = clustered(100, seed=10)
+        index = DocumentIndex(path, "model-a", 32, save_interval=3600)
+        index.add([str(i) for i in range(50)], x[:50])
+        index.add([str(i) for i in range(50, 100)], x[50:])
+        assert DocumentIndex(path, "model-a", 32).stats()["documents"] == 50
+
+        index.flush()
+        assert DocumentIndex(path, "model-a", 32).stats()["documents"] == 100
+
+    def test_stats_do_not_wait_for_inserts(self):
+        index = DocumentIndex(None, "model-a", 32)
+        index.add([str(i) for i in range(50)], clustered(50, seed=11))
+        # Held by an insert in progress
+        with index._lock:
+            assert index.stats()["documents"] == 50
+
+    def test_growth_triggers_retraining(self):
+        x = clustered(2000, seed=7)
+        index = DocumentIndex(None, "model-a", 32)
+        index.add([str(i) for i in range(50)], x[:50])
+        assert index.stats()["n_lists"] == 1
+
+        index.add([str(i) for i in range(50, 2000)], x[50:])
+        stats = index.stats()
+        assert stats["documents"] == 2000
+        assert stats["n_lists"] > 1
+        assert stats["trained_size"] == 2000
@@ -0,0 +1,85 @@
+"""
+Unit tests for the NumPy-backed request fields
+"""
+from typing import Dict, Optional
+import numpy as np
+import pytest
+from fastapi.exceptions import RequestValidationError
+from pydantic import BaseModel, ValidationError
+
+from app import wire_format
+from app.array_fields import DistanceMatrix, PointArray, check_distance_matrix, is_symmetric
+
+
+class MatrixRequest(BaseModel):
+    D_high: Optional[DistanceMatrix] = None
+    points_low: Optional[PointArray] = None
+    projections: Optional[Dict[str, DistanceMatrix]] = None
+
+
+def distance_matrix(n, seed=0):
+    x = np.random.default_rng(seed).normal(size=(n, 3))
+    return np.linalg.norm(x[:, None] - x[None], axis=2)
+
+
+class TestArrayFields:
+    """Test parsing and vectorized checks of matrix fields"""
+
+    def test_json_is_parsed_into_arrays(self):
+        D = distance_matrix(6)
+        request = MatrixRequest.model_validate_json(MatrixRequest(
+            D_high=D, points_low=np.ones((6, 2)), projections={"a": D}
+        ).model_dump_json())
+
+        assert isinstance(request.D_high, np.ndarray) and request.D_high.dtype == np.float64
+        np.testing.assert_allclose(request.D_high, D)
+        assert request.points_low.shape == (6, 2)
+        np.testing.assert_allclose(request.projections["a"], D)
+
+    @pytest.mark.parametrize("value, message", [
+        ([[0, 1], [1]], "rectangular"),
+        ([[0, 1, 2], [1, 0, 2]], "square"),
+        ([[0, 1], [2, 0]], "symmetric"),
+        ([[0, -1], [-1, 0]], "non-negative"),
+        ([[0, None], [None, 0]], "finite"),
+        ([0, 1], "2-dimensional"),
+    ])
+    def test_invalid_matrices(self, value, message):
+        with pytest.raises(ValidationError, match=message):
+            MatrixRequest.model_validate({"D_high": value})
+        with pytest.raises(ValidationError, match=message):
+            MatrixRequest.model_validate({"projections": {"a": value}})
+
+    def test_invalid_points(self):
+        with pytest.raises(ValidationError, match="finite"):
+            MatrixRequest.model_validate({"points_low": [[0.0, float("nan")]]})
+
+    def test_binary_bodies_run_the_same_checks(self):
+        D = distance_matrix(5)
+        request = wire_format.build_model(MatrixRequest, {}, {"D_high": D.astype(np.float32), "projections.a": D})
+        assert request.D_high.dtype == np.float64
+        assert request.projections["a"] is not None
+
+        asymmetric = D.copy()
+        asymmetric[0, 1] += 1
+        with pytest.raises(RequestValidationError):
+            wire_format.build_model(MatrixRequest, {}, {"D_high": asymmetric})
+        with pytest.raises(RequestValidationError):
+            wire_format.build_model(MatrixRequest, {}, {"D_high": D[0]})
+
+    def test_json_schema_is_nested_lists(self):
+        schema = MatrixRequest.model_json_schema()["properties"]["D_high"]
+        assert {"type": "array", "items": {"type": "array", "items": {"type": "number"}}} in schema["anyOf"]
+
+    def test_check_distance_matrix(self):
+        check_distance_matrix("D_high", distance_matrix(4))
+        with pytest.raises(ValueError):
+            check_distance_matrix("D_high", np.zeros((3, 4)))
+        with pytest.raises(ValueError):
+            check_distance_matrix("D_high", np.arange(9.0).reshape(3, 3))
+
+        # Blocks of the symmetry check cover every row
+        D = distance_matrix(1100)
+        assert is_symmetric(D)
+        D[1099, 3] += 1e-3
+        assert not is_symmetric(D)
@@ -0,0 +1,77 @@
+"""
+Unit tests for the blocked distance engine
+"""
+import numpy as np
+import pytest
+from scipy.spatial.distance import cdist
+from app.distance_engine import DistanceEngine, normalize_rows
+
+
+def embeddings(n, dim=12, seed=0):
+    return np.random.default_rng(seed).normal(size=(n, dim))
+
+
+class TestDistanceEngine:
+    """Tiled results must match the dense reference for any tile size"""
+
+    @pytest.mark.parametrize("budget", [1, 8 * 37 * 5, 1 << 30])
+    def test_cosine_matches_reference(self, budget):
+        x = embeddings(37)
+        result = DistanceEngine(memory_budget_bytes=budget).pairwise(x, "cosine")
+
+        assert result.dtype == np.float32
+        np.testing.assert_allclose(result, np.maximum(cdist(x, x, "cosine"), 0.0), atol=1e-5)
+        assert np.array_equal(result, result.T)
+        assert np.all(np.diag(result) == 0.0)
+
+    def test_euclidean_matches_reference(self):
+        x = embeddings(23)
+        result = DistanceEngine(memory_budget_bytes=8 * 23 * 4).pairwise(x, "euclidean")
+
+        np.testing.assert_allclose(result, cdist(x, x), rtol=1e-5, atol=1e-5)
+        assert np.array_equal(result, result.T)
+
+    def test_writes_into_memmap(self, tmp_path):
+        x = embeddings(30)
+        engine = DistanceEngine(memory_budget_bytes=8 * 30 * 7)
+        out = engine.allocate(30, path=str(tmp_path / "distances.npy"))
+        result = engine.pairwise(x, "cosine", out=out)
+
+        assert result is out
+        stored = np.load(tmp_path / "distances.npy", mmap_mode="r")
+        np.testing.assert_array_equal(stored, engine.pairwise(x, "cosine"))
+
+    def test_invalid_arguments(self):
+        engine = DistanceEngine()
+        with pytest.raises(ValueError):
+            engine.pairwise(embeddings(4), "manhattan")
+        with pytest.raises(ValueError):
+            engine.pairwise(embeddings(4), "cosine", out=np.empty((3, 3), dtype=np.float32))
+
+    def test_normalize_rows_keeps_unit_rows(self):
+        unit = normalize_rows(embeddings(5))
+        assert normalize_rows(unit) is unit
+        np.testing.assert_allclose(np.linalg.norm(unit, axis=1), 1.0, rtol=1e-6)
+
+
+class TestKnnGraph:
+    """Blocked top-k search must agree with a dense sort"""
+
+    @pytest.mark.parametrize("metric", ["cosine", "euclidean"])
+    def test_matches_dense_neighbors(self, metric):
+        x = embeddings(41, seed=3)
+        engine = DistanceEngine(memory_budget_bytes=8 * 41 * 6)
+        indptr, indices, distances = engine.knn(x, 5, metric=metric)
+
+        dense = cdist(x, x, metric)
+        np.fill_diagonal(dense, np.inf)
+        expected = np.argsort(dense, axis=1)[:, :5]
+
+        assert indptr.tolist() == list(range(0, 41 * 5 + 1, 5))
+        np.testing.assert_array_equal(indices.reshape(41, 5), expected)
+        np.testing.assert_allclose(distances.reshape(41, 5), np.take_along_axis(dense, expected, axis=1), atol=1e-5)
+
+    def test_k_is_capped(self):
+        indptr, indices, _ = DistanceEngine().knn(embeddings(4), 10)
+        assert indptr[-1] == len(indices) == 12
+        assert all(i not in indices[3 * i:3 * i + 3] for i in range(4))
@@ -0,0 +1,89 @@
+"""
+Unit tests for the content-addressed embedding cache
+"""
+import numpy as np
+from app.embedding_cache import EmbeddingCache, cache_key
+
+CONFIG = {'normalize_embeddings': True, 'preprocessing': None}
+
+
+def vectors(n, dim=8, seed=0):
+    return np.random.default_rng(seed).normal(size=(n, dim)).astype(np.float32)
+
+
+class TestEmbeddingCache:
+    """Test keys, the LRU tier and the disk tier"""
+
+    def test_keys_depend_on_model_config_and_text(self):
+        """Any change of model, config or text gives a different key"""
+        key = cache_key("model-a", CONFIG, "texto")
+
+        assert key == cache_key("model-a", dict(reversed(list(CONFIG.items()))), "texto")
+        assert key != cache_key("model-b", CONFIG, "texto")
+        assert key != cache_key("model-a", {**CONFIG, 'preprocessing': {'lowercase': True}}, "texto")
+        assert key != cache_key("model-a", CONFIG, "texto!")
+
+    def test_lookup_returns_hits_and_misses(self):
+        """Stored rows come back in request order; unknown keys are reported missing"""
+        cache = EmbeddingCache(directory=None)
+        keys = EmbeddingCache.make_keys("m", CONFIG, ["a", "b", "c"])
+        data = vectors(3)
+        cache.store(keys[:2], data[:2])
+
+        found, missing = cache.lookup([keys[1], keys[2], keys[0]], dim=8)
+
+        assert missing.tolist() == [1]
+        assert np.array_equal(found[0], data[1])
+        assert np.array_equal(found[2], data[0])
+        assert cache.stats()["memory_hits"] == 2
+        assert cache.stats()["misses"] == 1
+
+        # Stats are read without the lock held during disk I/O
+        with cache._lock:
+            assert np.isclose(cache.stats()["hit_ratio"], 2 / 3)
+
+    def test_memory_budget_evicts_least_recently_used(self):
+        """The LRU tier never exceeds its byte budget"""
+        cache = EmbeddingCache(directory=None, memory_budget_bytes=3 * 8 * 4)
+        keys = EmbeddingCache.make_keys("m", CONFIG, ["a", "b", "c", "d"])
+        data = vectors(4)
+
+        cache.store(keys[:3], data[:3])
+        cache.lookup([keys[0]], dim=8)  # "a" becomes most recently used
+        cache.store(keys[3:], data[3:])
+
+        _, missing = cache.lookup(keys, dim=8)
+        assert missing.tolist() == [1]
+        assert cache.stats()["memory_bytes"] <= 3 * 8 * 4
+
+    def test_disk_tier_survives_restart(self, tmp_path):
+        """A new cache over the same directory serves earlier embeddings from disk"""
+        keys = EmbeddingCache.make_keys("m", CONFIG, [f"doc {i}" for i in range(5000)])
+        data = vectors(5000)
+
+        first = EmbeddingCache(directory=str(tmp_path))
+        first.store(keys[:3000], data[:3000])
+        first.store(keys[3000:], data[3000:])
+
+        second = EmbeddingCache(directory=str(tmp_path))
+        found, missing = second.lookup(keys, dim=8)
+
+        assert len(missing) == 0
+        assert np.array_equal(found, data)
+        assert second.stats()["disk_hits"] == 5000
+
+    def test_partial_key_write_is_ignored(self, tmp_path):
+        """A truncated key file (interrupted write) does not corrupt later entries"""
+        keys = EmbeddingCache.make_keys("m", CONFIG, ["a", "b", "c"])
+        data = vectors(3)
+        EmbeddingCache(directory=str(tmp_path)).store(keys[:2], data[:2])
+
+        with open(tmp_path / "dim_8" / "keys.bin", "ab") as f:
+            f.write(b"partial")
+
+        cache = EmbeddingCache(directory=str(tmp_path))
+        cache.store(keys[2:], data[2:])
+        found, missing = EmbeddingCache(directory=str(tmp_path)).lookup(keys, dim=8)
+
+        assert len(missing) == 0
+        assert np.array_equal(found, data)
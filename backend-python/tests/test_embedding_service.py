@@ -0,0 +1,174 @@
+"""
+Unit tests for length-bucketed encoding and the batching front-end
+"""
+import asyncio
+import pytest
+import numpy as np
+
+pytest.importorskip("sentence_transformers")
+
+from app.embedding_cache import EmbeddingCache
+from services.embedding_service import EmbeddingService, EmbeddingBatcher
+
+
+class FakeService:
+    """Stands in for EmbeddingService: one row per text, calls recorded"""
+
+    def __init__(self):
+        self.calls = []
+
+    def encode(self, texts, normalize_embeddings=True, preprocessing=None):
+        self.calls.append((list(texts), preprocessing))
+        if any(text == "fail" for text in texts):
+            raise ValueError("model error")
+        return np.array([[len(text), float(normalize_embeddings)] for text in texts], dtype=np.float32)
+
+
+class FakeModel:
+    """Stands in for SentenceTransformer: whitespace tokens, batches recorded"""
+
+    max_seq_length = 16
+
+    def __init__(self):
+        self.batches = []
+
+    def tokenizer(self, texts, add_special_tokens=True, truncation=True, max_length=None):
+        return {'input_ids': [[0] * min(len(text.split()) + 2, max_length) for text in texts]}
+
+    def encode(self, texts, batch_size=32, show_progress_bar=False, normalize_embeddings=True, convert_to_numpy=True):
+        self.batches.append(list(texts))
+        return np.array([[len(text.split()), 0.0] for text in texts], dtype=np.float32)
+
+
+class TestLengthBucketing:
+    """Test the token-budget batching of EmbeddingService"""
+
+    def test_batches_fit_token_budget(self):
+        """Padded batch sizes stay within the budget, one text at least"""
+        lengths = np.array([2, 2, 3, 5, 8, 8, 40])
+
+        batches = EmbeddingService._length_batches(lengths, token_budget=16)
+
+        assert batches[0][0] == 0 and batches[-1][1] == len(lengths)
+        for (start, end), (next_start, _) in zip(batches, batches[1:]):
+            assert end == next_start
+        for start, end in batches:
+            assert end - start == 1 or (end - start) * lengths[end - 1] <= 16
+
+    def test_order_is_preserved(self):
+        """Texts are encoded by length but returned in input order"""
+        service = EmbeddingService.__new__(EmbeddingService)
+        service.model = FakeModel()
+        service.embedding_dim = 2
+        service.token_budget = 24
+        service.backend = 'torch'
+        texts = ["a " * k for k in [9, 1, 5, 1, 14, 3, 2, 30]]
+
+        embeddings = service._encode_model(texts, 32, False, True)
+
+        assert embeddings[:, 0].tolist() == [len(text.split()) for text in texts]
+        assert len(service.model.batches) > 1
+        for batch in service.model.batches:
+            lengths = [min(len(text.split()) + 2, 16) for text in batch]
+            assert len(batch) == 1 or len(batch) * max(lengths) <= 24
+
+
+class TestCacheKeys:
+    """Test that cached vectors are not shared across backends"""
+
+    def test_backends_do_not_share_cache_entries(self):
+        cache = EmbeddingCache()
+        services = []
+        for backend, quantize in [('torch', True), ('onnx', True), ('onnx', False)]:
+            service = EmbeddingService.__new__(EmbeddingService)
+            service.model = FakeModel()
+            service.model_name = "model"
+            service.embedding_dim = 2
+            service.token_budget = None
+            service.embedding_cache = cache
+            service.backend = backend
+            service.onnx_quantize = quantize
+            services.append(service)
+
+        for service in services:
+            service.encode(["a b c"])
+            service.encode(["a b c"])
+            assert len(service.model.batches) == 1
+
+
+class TestEmbeddingBatcher:
+    """Test merging of concurrent requests into model batches"""
+
+    def test_concurrent_requests_share_a_batch(self):
+        """Concurrent calls are encoded together and each gets its own rows"""
+        service = FakeService()
+
+        async def main():
+            batcher = EmbeddingBatcher(service, max_batch_size=100, max_wait_ms=50)
+            results = await asyncio.gather(*[
+                batcher.encode(["x" * i, "y" * (i + 1)]) for i in range(10)
+            ])
+            await batcher.stop()
+            return results, batcher.stats()
+
+        results, stats = asyncio.run(main())
+
+        assert len(service.calls) == 1
+        for i, embeddings in enumerate(results):
+            assert embeddings[:, 0].tolist() == [i, i + 1]
+        assert stats["requests"] == 10
+        assert stats["batches"] == 1
+
+    def test_options_are_not_mixed(self):
+        """Requests with different preprocessing configs go to separate model calls"""
+        service = FakeService()
+
+        async def main():
+            batcher = EmbeddingBatcher(service, max_batch_size=100, max_wait_ms=50)
+            await asyncio.gather(
+                batcher.encode(["a"], preprocessing=None),
+                batcher.encode(["b"], preprocessing={"lowercase": True}),
+                batcher.encode(["c"], preprocessing=None)
+            )
+            await batcher.stop()
+
+        asyncio.run(main())
+
+        assert sorted(call[0] for call in service.calls) == [["a", "c"], ["b"]]
+
+    def test_errors_reach_every_caller_of_the_batch(self):
+        """A failing batch raises in each request that was part of it"""
+        service = FakeService()
+
+        async def main():
+            batcher = EmbeddingBatcher(service, max_batch_size=100, max_wait_ms=50)
+            results = await asyncio.gather(
+                batcher.encode(["fail"]), batcher.encode(["ok"]), return_exceptions=True
+            )
+            await batcher.stop()
+            return results
+
+        results = asyncio.run(main())
+
+        assert all(isinstance(result, ValueError) for result in results)
+
+    def test_large_requests_are_interleaved(self):
+        """A request over max_batch_size runs in chunks and small requests get in between"""
+        service = FakeService()
+
+        async def main():
+            batcher = EmbeddingBatcher(service, max_batch_size=4, max_wait_ms=1)
+            large = asyncio.create_task(batcher.encode(["x" * (i + 1) for i in range(12)]))
+            await asyncio.sleep(0)
+            small = await batcher.encode(["small"])
+            embeddings = await large
+            await batcher.stop()
+            return embeddings, small
+
+        embeddings, small = asyncio.run(main())
+
+        assert embeddings[:, 0].tolist() == list(range(1, 13))
+        assert small[:, 0].tolist() == [5]
+        # Three chunks, and the small request is encoded before the last one
+        assert len(service.calls) == 3
+        assert "small" not in service.calls[-1][0]
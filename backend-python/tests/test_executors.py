@@ -0,0 +1,70 @@
+"""
+Unit tests for the endpoint worker pools
+"""
+import asyncio
+import threading
+import pytest
+import numpy as np
+from algorithms import build_nj_tree
+from app.executors import WorkerPools
+
+
+class TestWorkerPools:
+    """Test the thread and process pools used by the endpoints"""
+
+    def test_thread_pool_runs_off_event_loop(self):
+        """Calls run in a pool thread and the metrics count them"""
+        pools = WorkerPools(thread_workers=2, process_workers=1)
+
+        async def main():
+            names = await asyncio.gather(*[
+                pools.run_in_thread(lambda: threading.current_thread().name) for _ in range(5)
+            ])
+            return names
+
+        try:
+            names = asyncio.run(main())
+            stats = pools.stats()["thread_pool"]
+        finally:
+            pools.shutdown()
+
+        assert all(name.startswith("compute") for name in names)
+        assert stats["max_workers"] == 2
+        assert stats["submitted"] == stats["completed"] == 5
+        assert stats["in_flight"] == stats["queue_depth"] == 0
+
+    def test_process_pool_builds_tree(self):
+        """NJ runs in a worker process and returns a picklable result"""
+        pools = WorkerPools(thread_workers=1, process_workers=1)
+        D = np.array([
+            [0.0, 0.2, 0.4, 0.6],
+            [0.2, 0.0, 0.5, 0.7],
+            [0.4, 0.5, 0.0, 0.3],
+            [0.6, 0.7, 0.3, 0.0]
+        ])
+        labels = ["A", "B", "C", "D"]
+
+        try:
+            result = asyncio.run(pools.run_in_process(build_nj_tree, D, labels))
+            stats = pools.stats()["process_pool"]
+        finally:
+            pools.shutdown()
+
+        assert result["newick"] == build_nj_tree(D, labels)["newick"]
+        assert stats["completed"] == 1
+
+    def test_failures_are_counted(self):
+        """Exceptions propagate to the caller and count as failed"""
+        pools = WorkerPools(thread_workers=1, process_workers=1)
+
+        def fail():
+            raise ValueError("bad input")
+
+        try:
+            with pytest.raises(ValueError):
+                asyncio.run(pools.run_in_thread(fail))
+            stats = pools.stats()["thread_pool"]
+        finally:
+            pools.shutdown()
+
+        assert stats["failed"] == 1
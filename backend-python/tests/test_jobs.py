@@ -0,0 +1,110 @@
+"""
+Unit tests for the persistent job queue
+"""
+import asyncio
+import pytest
+import numpy as np
+from algorithms import build_nj_tree
+from app.jobs import JobStore, JobManager, JobProgress, JobCancelled
+
+
+async def wait_for_status(store, job_id, statuses, timeout=10.0):
+    for _ in range(int(timeout / 0.05)):
+        job = store.get(job_id)
+        if job["status"] in statuses:
+            return job
+        await asyncio.sleep(0.05)
+    raise AssertionError(f"job stayed {job['status']}")
+
+
+class TestJobQueue:
+    """Test job submission, progress, cancellation and recovery"""
+
+    def test_job_runs_to_completion(self, tmp_path):
+        """A submitted job runs, reports progress and stores its result"""
+        store = JobStore(str(tmp_path / "jobs.db"))
+
+        async def handler(payload, progress):
+            progress.set_stage("tree", total=3)
+            for k in range(1, 4):
+                progress(k, 3)
+            return payload.upper()
+
+        async def main():
+            manager = JobManager(store, {"echo": handler})
+            await manager.start()
+            job_id = manager.submit("echo", "hello")
+            job = await wait_for_status(store, job_id, ("completed", "failed"))
+            await manager.stop()
+            return job_id, job
+
+        job_id, job = asyncio.run(main())
+
+        assert job["status"] == "completed"
+        assert job["stage"] == "tree"
+        assert (job["progress_current"], job["progress_total"]) == (3, 3)
+        assert store.get_result(job_id) == "HELLO"
+
+    def test_failed_job_keeps_error(self, tmp_path):
+        """Exceptions mark the job failed with their message"""
+        store = JobStore(str(tmp_path / "jobs.db"))
+
+        async def handler(payload, progress):
+            raise ValueError("bad matrix")
+
+        async def main():
+            manager = JobManager(store, {"tree": handler})
+            await manager.start()
+            job_id = manager.submit("tree", "{}")
+            job = await wait_for_status(store, job_id, ("completed", "failed"))
+            await manager.stop()
+            return job
+
+        job = asyncio.run(main())
+
+        assert job["status"] == "failed"
+        assert job["error"] == "bad matrix"
+
+    def test_unknown_kind(self, tmp_path):
+        """Only registered job kinds are accepted"""
+        manager = JobManager(JobStore(str(tmp_path / "jobs.db")), {})
+        with pytest.raises(ValueError):
+            manager.submit("tree", "{}")
+
+    def test_cancel_queued_job(self, tmp_path):
+        """Queued jobs are cancelled immediately and never run"""
+        store = JobStore(str(tmp_path / "jobs.db"))
+        job_id = store.create("tree", "{}")
+
+        assert store.request_cancel(job_id)["status"] == "cancelled"
+        assert store.claim_next() is None
+
+    def test_cancel_running_tree(self, tmp_path):
+        """The NJ progress callback aborts a running job once cancellation is requested"""
+        store = JobStore(str(tmp_path / "jobs.db"))
+        job_id = store.create("tree", "{}")
+        assert store.claim_next() == (job_id, "tree")
+        store.request_cancel(job_id)
+
+        rng = np.random.default_rng(0)
+        D = rng.random((30, 30))
+        D = (D + D.T) / 2
+        np.fill_diagonal(D, 0)
+
+        progress = JobProgress(store.path, job_id, interval=0.0)
+        with pytest.raises(JobCancelled):
+            build_nj_tree(D, [str(i) for i in range(30)], progress_callback=progress)
+
+        assert store.get(job_id)["progress_current"] == 1
+
+    def test_restart_requeues_running_jobs(self, tmp_path):
+        """Jobs interrupted by a restart go back to the queue"""
+        path = str(tmp_path / "jobs.db")
+        store = JobStore(path)
+        job_id = store.create("tree", "{}")
+        store.claim_next()
+
+        reopened = JobStore(path)
+        assert reopened.requeue_running() == 1
+        assert reopened.get(job_id)["status"] == "queued"
+        assert reopened.claim_next() == (job_id, "tree")
@@ -0,0 +1,139 @@
+"""
+Unit tests for streaming JSON request bodies
+"""
+import asyncio
+import json
+from typing import Any, Dict, List, Optional
+import numpy as np
+import pytest
+from fastapi import Depends, FastAPI, HTTPException
+from fastapi.exceptions import RequestValidationError
+from fastapi.testclient import TestClient
+from pydantic import BaseModel
+
+from app import wire_format
+from app.json_stream import BodyLimits, parse_streamed
+
+
+class Document(BaseModel):
+    id: str
+    content: str
+    metadata: Optional[Dict[str, Any]] = None
+
+
+class TreeRequest(BaseModel):
+    distance_matrix: List[List[float]]
+    labels: List[str]
+    algorithm: str = "neighbor_joining"
+
+
+class PipelineRequest(BaseModel):
+    documents: List[Document]
+    preprocess: bool = True
+
+
+async def chunked(body, size):
+    for start in range(0, len(body), size):
+        yield body[start:start + size]
+
+
+def parse(model, body, streamed, size=7, limits=None):
+    return asyncio.run(parse_streamed(model, chunked(body, size), streamed, limits or BodyLimits()))
+
+
+class TestStreamedParsing:
+    """Test element-wise parsing across arbitrary chunk boundaries"""
+
+    @pytest.mark.parametrize("size", [1, 3, 64, 1 << 20])
+    def test_matrix_rows_fill_an_array(self, size):
+        D = np.random.default_rng(0).random((6, 6))
+        labels = ["a[", 'b\\"]', "c{", "d", "e", "f"]
+        body = json.dumps({"labels": labels, "distance_matrix": D.tolist(), "algorithm": "rapid_nj"}).encode()
+
+        request = parse(TreeRequest, body, ("distance_matrix",), size)
+        assert isinstance(request.distance_matrix, np.ndarray)
+        np.testing.assert_array_equal(request.distance_matrix, D)
+        assert request.labels == labels
+        assert request.algorithm == "rapid_nj"
+
+    @pytest.mark.parametrize("size", [1, 5, 1 << 20])
+    def test_documents_are_validated_one_by_one(self, size):
+        documents = [
+            {"id": str(i), "content": 'quote " brace } bracket [' + "\\" * i, "metadata": {"tags": ["]", {"a": 1}]}}
+            for i in range(5)
+        ]
+        body = json.dumps({"documents": documents, "preprocess": False}).encode()
+
+        request = parse(PipelineRequest, body, ("documents",), size)
+        assert [document.model_dump() for document in request.documents] == documents
+        assert request.preprocess is False
+
+    @pytest.mark.parametrize("body, loc", [
+        (b'{"distance_matrix": [[0, 1], [1]], "labels": []}', ("body", "distance_matrix", 1)),
+        (b'{"distance_matrix": [[0, "x"]], "labels": []}', ("body", "distance_matrix", 0)),
+        (b'{"distance_matrix": [0, 1], "labels": []}', ("body",)),
+        (b'{"distance_matrix": [[0, 1]', ("body",)),
+        (b'{"labels": []}', ("body", "distance_matrix")),
+    ])
+    def test_invalid_matrices(self, body, loc):
+        with pytest.raises(RequestValidationError) as error:
+            parse(TreeRequest, body, ("distance_matrix",))
+        assert tuple(error.value.errors()[0]["loc"]) == loc
+
+    def test_invalid_document_location(self):
+        body = b'{"documents": [{"id": "a", "content": "x"}, {"id": 2}]}'
+        with pytest.raises(RequestValidationError) as error:
+            parse(PipelineRequest, body, ("documents",))
+        assert tuple(error.value.errors()[0]["loc"])[:3] == ("body", "documents", 1)
+
+    def test_item_limit(self):
+        limits = BodyLimits(max_items=3)
+        body = json.dumps({"documents": [{"id": str(i), "content": "x"} for i in range(4)]}).encode()
+        with pytest.raises(HTTPException) as error:
+            parse(PipelineRequest, body, ("documents",), limits=limits)
+        assert error.value.status_code == 413
+
+        # A matrix is rejected at its first row
+        body = json.dumps({"distance_matrix": np.zeros((4, 4)).tolist(), "labels": []}).encode()
+        with pytest.raises(HTTPException) as error:
+            parse(TreeRequest, body, ("distance_matrix",), limits=limits)
+        assert error.value.status_code == 413
+
+    def test_wide_first_row_is_rejected_before_allocation(self):
+        # One 40k-column row is ~80 KB of JSON but would allocate a 12.8 GB matrix
+        limits = BodyLimits(max_body_bytes=1024 * 1024)
+        body = b'{"labels": [], "distance_matrix": [[' + b",".join([b"0"] * 40_000) + b"]]}"
+        with pytest.raises(HTTPException) as error:
+            parse(TreeRequest, body, ("distance_matrix",), size=1 << 16, limits=limits)
+        assert error.value.status_code == 413
+
+
+class TestBodyLimits:
+    """Test 413 rejection through the body_model dependency"""
+
+    def client(self, limits):
+        app = FastAPI()
+
+        @app.post("/tree")
+        async def tree(request: TreeRequest = Depends(wire_format.body_model(TreeRequest, ("distance_matrix",), limits))):
+            return {"shape": list(np.asarray(request.distance_matrix).shape)}
+
+        @app.post("/plain")
+        async def plain(request: TreeRequest = Depends(wire_format.body_model(TreeRequest, limits=limits))):
+            return {"labels": request.labels}
+
+        return TestClient(app)
+
+    def test_body_size_limit(self):
+        client = self.client(BodyLimits(max_body_bytes=200))
+        small = {"distance_matrix": [[0, 1], [1, 0]], "labels": ["a", "b"]}
+        assert client.post("/tree", json=small).json() == {"shape": [2, 2]}
+        assert client.post("/plain", json=small).json() == {"labels": ["a", "b"]}
+
+        large = {"distance_matrix": np.ones((10, 10)).tolist(), "labels": ["a"] * 10}
+        assert client.post("/tree", json=large).status_code == 413
+        assert client.post("/plain", json=large).status_code == 413
+
+        # Rejected from the declared length, before the body is read
+        response = client.post("/tree", content=b"{}", headers={"content-length": "1000"})
+        assert response.status_code == 413
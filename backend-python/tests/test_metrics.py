@@ -0,0 +1,129 @@
+"""
+Unit tests for the Prometheus-style metrics
+"""
+import pytest
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+
+from app import metrics
+from app.metrics import MetricsRegistry, MetricsMiddleware, stats_families
+
+
+class TestRegistry:
+    """Test metric updates and the text exposition format"""
+
+    def test_counter_and_gauge_rendering(self):
+        registry = MetricsRegistry()
+        counter = registry.counter("requests_total", "Requests", ("endpoint",))
+        gauge = registry.gauge("in_flight", "In flight")
+        counter.inc(endpoint="/a")
+        counter.inc(2, endpoint='/b"\n')
+        gauge.inc()
+        gauge.inc()
+        gauge.dec()
+
+        text = registry.render()
+        assert "# TYPE requests_total counter" in text
+        assert 'requests_total{endpoint="/a"} 1' in text
+        assert 'requests_total{endpoint="/b\\"\\n"} 2' in text
+        assert "in_flight 1" in text
+        assert text.endswith("\n")
+
+    def test_histogram_buckets_are_cumulative(self):
+        registry = MetricsRegistry()
+        histogram = registry.histogram("duration_seconds", "Duration", ("stage",), buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 0.5, 5.0):
+            histogram.observe(value, stage="nj")
+
+        text = registry.render()
+        assert 'duration_seconds_bucket{stage="nj",le="0.1"} 1' in text
+        assert 'duration_seconds_bucket{stage="nj",le="1"} 3' in text
+        assert 'duration_seconds_bucket{stage="nj",le="+Inf"} 4' in text
+        assert 'duration_seconds_count{stage="nj"} 4' in text
+        assert histogram.snapshot(stage="nj")["sum"] == pytest.approx(6.05)
+
+        with histogram.time(stage="encode"):
+            pass
+        assert histogram.snapshot(stage="encode")["count"] == 1
+
+    def test_labels_must_match(self):
+        registry = MetricsRegistry()
+        counter = registry.counter("c_total", "C", ("endpoint",))
+        with pytest.raises(ValueError):
+            counter.inc(method="GET")
+        with pytest.raises(ValueError):
+            registry.counter("c_total", "C")
+
+    def test_failing_collector_is_skipped(self):
+        registry = MetricsRegistry()
+        registry.add_collector(lambda: 1 / 0)
+        registry.add_collector(lambda: [("up", "gauge", "Up", [({}, 1.0)])])
+        assert "up 1" in registry.render()
+
+    def test_stats_families(self):
+        families = {name: samples for name, _, _, samples in stats_families(
+            "cache", {"hits": 3, "hit_ratio": 0.75, "path": "/tmp", "enabled": True, "size": None}
+        )}
+        assert families == {"cache_hits": [({}, 3.0)], "cache_hit_ratio": [({}, 0.75)]}
+
+        pools = stats_families("executors", {
+            "thread_pool": {"in_flight": 2}, "process_pool": {"in_flight": 1}
+        }, label="pool")
+        assert pools[0][0] == "executors_in_flight"
+        assert pools[0][3] == [({"pool": "thread_pool"}, 2.0), ({"pool": "process_pool"}, 1.0)]
+        assert stats_families("cache", None) == []
+
+
+class TestMiddleware:
+    """Test per-endpoint request metrics"""
+
+    def test_requests_are_counted_per_route_template(self):
+        app = FastAPI()
+        app.add_middleware(MetricsMiddleware)
+
+        @app.get("/items/{item_id}")
+        async def item(item_id: str):
+            assert metrics.HTTP_IN_FLIGHT.value(endpoint="/items/{item_id}") == 1
+            return {"id": item_id}
+
+        @app.get("/fail")
+        async def fail():
+            raise HTTPException(status_code=400, detail="bad")
+
+        labels = {"method": "GET", "endpoint": "/items/{item_id}", "status": "200"}
+        before = metrics.HTTP_REQUESTS.value(**labels)
+        failed = metrics.HTTP_REQUESTS.value(method="GET", endpoint="/fail", status="400")
+        timed = metrics.HTTP_DURATION.snapshot(method="GET", endpoint="/items/{item_id}")["count"]
+
+        client = TestClient(app)
+        assert client.get("/items/a").status_code == 200
+        assert client.get("/items/b").status_code == 200
+        assert client.get("/fail").status_code == 400
+
+        assert metrics.HTTP_REQUESTS.value(**labels) == before + 2
+        assert metrics.HTTP_REQUESTS.value(method="GET", endpoint="/fail", status="400") == failed + 1
+        assert metrics.HTTP_DURATION.snapshot(method="GET", endpoint="/items/{item_id}")["count"] == timed + 2
+        assert metrics.HTTP_IN_FLIGHT.value(endpoint="/items/{item_id}") == 0
+
+    def test_unhandled_errors_count_as_500(self):
+        app = FastAPI()
+        app.add_middleware(MetricsMiddleware)
+
+        @app.get("/boom")
+        async def boom():
+            raise RuntimeError("boom")
+
+        before = metrics.HTTP_REQUESTS.value(method="GET", endpoint="/boom", status="500")
+        client = TestClient(app, raise_server_exceptions=False)
+        assert client.get("/boom").status_code == 500
+        assert metrics.HTTP_REQUESTS.value(method="GET", endpoint="/boom", status="500") == before + 1
+        assert metrics.HTTP_IN_FLIGHT.value(endpoint="/boom") == 0
+
+    def test_unknown_paths_share_one_label(self):
+        app = FastAPI()
+        app.add_middleware(MetricsMiddleware)
+        client = TestClient(app)
+        before = metrics.HTTP_REQUESTS.value(method="GET", endpoint="unmatched", status="404")
+        client.get("/random/a")
+        client.get("/random/b")
+        assert metrics.HTTP_REQUESTS.value(method="GET", endpoint="unmatched", status="404") == before + 2
@@ -0,0 +1,281 @@
+"""
+Unit tests for the Neighbor-Joining tree reconstruction
+"""
+import json
+import pytest
+import numpy as np
+from algorithms.neighbor_joining import NeighborJoining, build_nj_tree
+from algorithms.rapid_nj import RapidNeighborJoining
+from algorithms.approximate_nj import ApproximateNeighborJoining, build_approximate_tree
+from algorithms.tree_store import TreeStore
+
+
+# Reference matrices from test_nj_algorithm.py and their Newick output
+SIMPLE_MATRIX = [
+    [0.0, 0.2, 0.4, 0.6],
+    [0.2, 0.0, 0.5, 0.7],
+    [0.4, 0.5, 0.0, 0.3],
+    [0.6, 0.7, 0.3, 0.0]
+]
+SIMPLE_LABELS = ["Species_A", "Species_B", "Species_C", "Species_D"]
+SIMPLE_NEWICK = "((Species_A:0.050000,Species_B:0.150000):0.300000,Species_C:0.050000,Species_D:0.250000);"
+
+RANDOM_20_NEWICK = (
+    "(((((Taxa_1:0.029728,Taxa_6:0.063984):0.298652,(Taxa_3:0.139076,Taxa_18:0.045516):0.112219):0.061254,"
+    "((Taxa_12:0.059643,Taxa_15:0.056653):0.062369,Taxa_20:0.133453):0.084840):0.046348,Taxa_19:0.116418):0.033810,"
+    "((((Taxa_2:0.037719,Taxa_10:0.042243):0.114354,Taxa_11:0.082064):0.178409,"
+    "(Taxa_16:0.112758,Taxa_17:0.112083):0.117421):0.051108,((Taxa_8:0.100632,Taxa_9:0.018367):0.116405,"
+    "Taxa_14:0.268576):0.135704):0.051954,(((Taxa_4:0.052259,Taxa_7:0.073229):0.067020,"
+    "Taxa_13:0.101169):0.092571,Taxa_5:0.148777):0.142904);"
+)
+
+
+def random_20_matrix():
+    np.random.seed(42)
+    matrix = np.random.rand(20, 20)
+    matrix = (matrix + matrix.T) / 2
+    np.fill_diagonal(matrix, 0)
+    return matrix
+
+
+class TestNeighborJoining:
+    """Test the vectorized NJ engine"""
+
+    def test_simple_matrix_newick(self):
+        """4-taxon reference matrix gives the known tree"""
+        result = build_nj_tree(SIMPLE_MATRIX, SIMPLE_LABELS)
+
+        assert result["newick"] == SIMPLE_NEWICK
+        assert result["statistics"]["iterations"] == 1
+
+    def test_random_matrix_newick(self):
+        """20-taxon reference matrix gives the known tree"""
+        labels = [f"Taxa_{i + 1}" for i in range(20)]
+        result = build_nj_tree(random_20_matrix().tolist(), labels)
+
+        assert result["newick"] == RANDOM_20_NEWICK
+        assert result["statistics"]["iterations"] == 17
+        assert result["statistics"]["total_operations"] == 3978
+
+    def test_q_matrix_matches_formula(self):
+        """Vectorized Q matrix equals the scalar definition on the upper triangle"""
+        D = random_20_matrix()
+        n = D.shape[0]
+        nj = NeighborJoining(D, [str(i) for i in range(n)])
+
+        Q = nj.calculate_q_matrix(D, n)
+        row_sums = D.sum(axis=1)
+
+        for i in range(n):
+            for j in range(i + 1, n):
+                assert Q[i, j] == (n - 2) * D[i, j] - row_sums[i] - row_sums[j]
+
+    def test_update_is_in_place(self):
+        """Joining compacts the working buffer instead of allocating a new one"""
+        D = random_20_matrix()
+        n = D.shape[0]
+        nj = NeighborJoining(D, [str(i) for i in range(n)])
+        buffer = nj.distance_matrix
+
+        i, j = 2, 7
+        expected = np.delete(np.delete(D, j, axis=0), j, axis=1)
+        expected[i, i + 1:] = 0.5 * (D[i, np.r_[i + 1:j, j + 1:n]] + D[j, np.r_[i + 1:j, j + 1:n]] - D[i, j])
+        expected[i + 1:, i] = expected[i, i + 1:]
+
+        reduced = nj.update_distance_matrix(buffer, i, j, n)
+
+        assert reduced.shape == (n - 1, n - 1)
+        assert np.shares_memory(reduced, buffer)
+        assert np.array_equal(reduced, expected)
+
+    @pytest.mark.parametrize("n", [3, 5, 12, 40])
+    def test_tree_contains_all_leaves(self, n):
+        """Every taxon appears exactly once in the Newick output"""
+        rng = np.random.default_rng(n)
+        D = rng.random((n, n))
+        D = (D + D.T) / 2
+        np.fill_diagonal(D, 0)
+        labels = [f"L{i}" for i in range(n)]
+
+        newick = build_nj_tree(D.tolist(), labels)["newick"]
+
+        for label in labels:
+            assert newick.count(f"{label}:") == 1
+        assert newick.endswith(";")
+
+    def test_invalid_labels(self):
+        """Label count must match matrix dimension"""
+        with pytest.raises(ValueError):
+            build_nj_tree(SIMPLE_MATRIX, SIMPLE_LABELS[:3])
+
+
+class TestRapidNeighborJoining:
+    """Test the bounded-search (RapidNJ) engine against the classic one"""
+
+    def test_reference_matrices(self):
+        """Same trees as the classic engine on the reference matrices"""
+        labels = [f"Taxa_{i + 1}" for i in range(20)]
+
+        assert build_nj_tree(SIMPLE_MATRIX, SIMPLE_LABELS, algorithm="rapid_nj")["newick"] == SIMPLE_NEWICK
+        assert build_nj_tree(random_20_matrix().tolist(), labels, algorithm="rapid_nj")["newick"] == RANDOM_20_NEWICK
+
+    @pytest.mark.parametrize("seed", range(6))
+    def test_matches_classic_on_embeddings(self, seed):
+        """Clustered cosine distances produce the same joins with fewer Q evaluations"""
+        rng = np.random.default_rng(seed)
+        n = 300
+        centers = rng.normal(size=(12, 32)) * 3
+        X = centers[rng.integers(0, 12, n)] + rng.normal(size=(n, 32))
+        X /= np.linalg.norm(X, axis=1, keepdims=True)
+        D = np.maximum(1 - X @ X.T, 0)
+        D = (D + D.T) / 2
+        np.fill_diagonal(D, 0)
+        labels = [f"doc{i}" for i in range(n)]
+
+        classic = build_nj_tree(D.tolist(), labels)
+        rapid = build_nj_tree(D.tolist(), labels, algorithm="rapid_nj")
+
+        assert rapid["newick"] == classic["newick"]
+        assert rapid["statistics"]["algorithm"] == "rapid_nj"
+        assert rapid["statistics"]["q_evaluations"] < rapid["statistics"]["q_evaluations_full"] / 2
+
+    def test_ties(self):
+        """Integer distances with many exact ties follow the classic tie-breaking"""
+        rng = np.random.default_rng(7)
+        D = np.round(rng.random((30, 30)) * 3)
+        D = (D + D.T) / 2
+        np.fill_diagonal(D, 0)
+        labels = [str(i) for i in range(30)]
+
+        nj = RapidNeighborJoining(D, labels)
+        nj.run()
+
+        assert nj.get_newick() == build_nj_tree(D.tolist(), labels)["newick"]
+
+    def test_unknown_algorithm(self):
+        """Unsupported algorithm names are rejected"""
+        with pytest.raises(ValueError):
+            build_nj_tree(SIMPLE_MATRIX, SIMPLE_LABELS, algorithm="upgma")
+
+
+def clustered_embeddings(seed, n, n_clusters=12, dim=32):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(n_clusters, dim)) * 6
+    assignment = rng.integers(0, n_clusters, n)
+    X = centers[assignment] + rng.normal(size=(n, dim))
+    return X, assignment
+
+
+def leaf_sets(tree):
+    """Leaf label sets of every subtree, from the parent array"""
+    sets = [{label} for label in tree.labels] + [set() for _ in range(tree.n_nodes - tree.n_leaves)]
+    for node in range(tree.n_nodes):  # children are always created before their parent
+        parent = tree.parent[node]
+        if parent >= 0:
+            sets[parent] |= sets[node]
+    return [frozenset(s) for s in sets]
+
+
+class TestApproximateNeighborJoining:
+    """Test the top-hits approximate engine"""
+
+    def test_small_input_is_exact(self):
+        """Below the exact tail size the tree equals NJ on cosine distances"""
+        X, _ = clustered_embeddings(0, 60)
+        labels = [f"doc{i}" for i in range(60)]
+        P = X.astype(np.float32)
+        P = (P / np.linalg.norm(P, axis=1, keepdims=True)).astype(np.float64)
+        D = 1.0 - P @ P.T
+        D = (D + D.T) / 2
+        np.fill_diagonal(D, 0)
+
+        approximate = build_approximate_tree(X, labels)
+
+        assert approximate["newick"] == build_nj_tree(D.tolist(), labels)["newick"]
+
+    def test_large_input(self):
+        """All documents appear once, clusters stay together and few distances are computed"""
+        n = 1500
+        X, assignment = clustered_embeddings(1, n)
+        labels = [f"doc{i}" for i in range(n)]
+
+        nj = ApproximateNeighborJoining(X, labels)
+        nj.run()
+        newick = nj.get_newick()
+        stats = nj.get_statistics()
+
+        for label in labels:
+            assert newick.count(f"{label}:") == 1
+
+        # Well separated clusters are monophyletic (a subtree or its complement)
+        clades = set(leaf_sets(nj.tree))
+        everything = frozenset(labels)
+        for c in np.unique(assignment):
+            members = frozenset(labels[k] for k in np.flatnonzero(assignment == c))
+            assert members in clades or everything - members in clades
+
+        assert stats["algorithm"] == "approximate_nj"
+        assert stats["distance_evaluations"] < stats["distance_evaluations_full"] / 2
+
+    def test_invalid_labels(self):
+        """Label count must match the number of embeddings"""
+        X, _ = clustered_embeddings(0, 10)
+        with pytest.raises(ValueError):
+            build_approximate_tree(X, [str(i) for i in range(9)])
+
+
+def caterpillar(n_leaves):
+    """Tree where every internal node has a leaf child: depth grows linearly"""
+    tree = TreeStore([f"L{i}" for i in range(n_leaves)])
+    node = tree.add_node([0, 1], [0.1, 0.2])
+    for leaf in range(2, n_leaves - 2):
+        node = tree.add_node([node, leaf], [0.3, 0.4])
+    tree.set_root([node, n_leaves - 2, n_leaves - 1], [0.5, 0.6, 0.7])
+    return tree
+
+
+class TestTreeStore:
+    """Test the array-backed tree and its serializers"""
+
+    def test_serializers_match_reference(self):
+        """Newick, dict and JSON output of the reference tree"""
+        tree = build_nj_tree(SIMPLE_MATRIX, SIMPLE_LABELS)["tree"]
+
+        assert tree.to_newick() == SIMPLE_NEWICK
+        assert json.loads(tree.to_json()) == tree.to_dict()
+        assert tree.to_dict() == {
+            'id': 'root', 'label': 'root', 'distance': 0.0, 'is_leaf': False,
+            'children': [
+                {'id': '4', 'label': 'Node_4', 'distance': pytest.approx(0.3), 'is_leaf': False, 'children': [
+                    {'id': '0', 'label': 'Species_A', 'distance': pytest.approx(0.05), 'is_leaf': True},
+                    {'id': '1', 'label': 'Species_B', 'distance': pytest.approx(0.15), 'is_leaf': True}
+                ]},
+                {'id': '2', 'label': 'Species_C', 'distance': pytest.approx(0.05), 'is_leaf': True},
+                {'id': '3', 'label': 'Species_D', 'distance': pytest.approx(0.25), 'is_leaf': True}
+            ]
+        }
+
+    def test_deep_tree(self):
+        """Serializers do not recurse, so depth is not limited by the interpreter"""
+        n = 20000
+        tree = caterpillar(n)
+
+        newick = tree.to_newick()
+        assert newick.startswith("(" * (n - 2) + "L0:0.100000,L1:0.200000)")
+        assert newick.endswith(f"L{n - 2}:0.600000,L{n - 1}:0.700000);")
+
+        assert tree.to_json().count('"is_leaf": true') == n
+        assert tree.nbytes < 32 * tree.n_nodes
+
+        # The nested dict is built without recursion as well
+        node = tree.to_dict()
+        depth = 0
+        while 'children' in node:
+            node = node['children'][0]
+            depth += 1
+        assert depth == n - 2
+
+    def test_tree_not_built(self):
+        """Serializing before the root exists is an error"""
+        with pytest.raises(ValueError):
+            TreeStore(SIMPLE_LABELS).to_newick()
@@ -0,0 +1,59 @@
+"""
+Unit tests for the NumPy parts of the ONNX Runtime backend
+"""
+import pytest
+import numpy as np
+
+pytest.importorskip("sentence_transformers")
+
+from services.onnx_backend import pool_token_embeddings, compare_cosine_distances
+
+
+class TestPooling:
+    """Pooling must ignore padding tokens like Sentence Transformers does"""
+
+    def setup_method(self):
+        self.tokens = np.array([
+            [[1.0, 2.0], [3.0, 4.0], [100.0, 100.0]],
+            [[5.0, -1.0], [-5.0, 9.0], [7.0, 0.0]]
+        ])
+        self.mask = np.array([[1, 1, 0], [1, 1, 1]])
+
+    def test_mean(self):
+        pooled = pool_token_embeddings(self.tokens, self.mask, 'mean')
+        np.testing.assert_allclose(pooled, [[2.0, 3.0], [7.0 / 3, 8.0 / 3]], rtol=1e-6)
+        assert pooled.dtype == np.float32
+
+    def test_cls_and_max(self):
+        np.testing.assert_allclose(pool_token_embeddings(self.tokens, self.mask, 'cls'), [[1, 2], [5, -1]])
+        np.testing.assert_allclose(pool_token_embeddings(self.tokens, self.mask, 'max'), [[3, 4], [7, 9]])
+
+    def test_unknown_mode(self):
+        with pytest.raises(ValueError):
+            pool_token_embeddings(self.tokens, self.mask, 'weightedmean')
+
+
+class TestCompareCosineDistances:
+    """Accuracy report between two backends"""
+
+    def test_identical_embeddings(self):
+        embeddings = np.random.RandomState(0).randn(20, 8)
+        report = compare_cosine_distances(embeddings, embeddings * 3.0)
+
+        assert report['n_texts'] == 20
+        assert report['max_abs_error'] < 1e-12
+        assert report['nearest_neighbor_agreement'] == 1.0
+        assert report['distance_correlation'] == pytest.approx(1.0)
+
+    def test_perturbed_embeddings(self):
+        rng = np.random.RandomState(1)
+        embeddings = rng.randn(30, 16)
+        noisy = embeddings + rng.randn(30, 16) * 0.01
+        report = compare_cosine_distances(embeddings, noisy)
+
+        assert 0 < report['mean_abs_error'] <= report['max_abs_error'] < 0.05
+        assert report['distance_correlation'] > 0.99
+
+    def test_shape_mismatch(self):
+        with pytest.raises(ValueError):
+            compare_cosine_distances(np.ones((4, 3)), np.ones((4, 2)))
@@ -5,7 +5,11 @@ import pytest
 import numpy as np
 from hypothesis import given, strategies as st, assume, settings
 from hypothesis.extra.numpy import arrays
-from app.projection_quality import ProjectionQualityMetrics
+from scipy.spatial import Delaunay
+from app.projection_quality import (
+    ProjectionQualityMetrics, ProjectionComparison, ArtifactMemo, rank_matrix, pair_ranks,
+    upper_triangle_blocks, pairwise_from_points, knn_from_points
+)
 
 
 class TestProjectionErrors:
@@ -178,6 +182,35 @@ class TestFalseNeighbors:
             assert 0 <= edge[1] < n
             assert edge[0] != edge[1]
 
+    def test_pairs_match_set_difference(self):
+        """Columnar pairs equal the per-point kNN set difference; Delaunay edges are unique and sorted"""
+        rng = np.random.default_rng(3)
+        n, k = 50, 6
+        x = rng.normal(size=(n, 6))
+        points_2d = x[:, :2] + 0.5 * rng.normal(size=(n, 2))
+        D_high = np.linalg.norm(x[:, None] - x[None], axis=2)
+        D_low = np.linalg.norm(points_2d[:, None] - points_2d[None], axis=2)
+
+        pairs, edges, metrics = ProjectionQualityMetrics.compute_false_neighbor_pairs(D_high, D_low, points_2d, k)
+
+        neighbors_high = ProjectionQualityMetrics.find_k_nearest_neighbors(D_high, k)
+        neighbors_low = ProjectionQualityMetrics.find_k_nearest_neighbors(D_low, k)
+        expected = {(i, j) for i in range(n) for j in set(neighbors_low[i]) - set(neighbors_high[i])}
+        assert set(zip(pairs['source'].tolist(), pairs['target'].tolist())) == expected
+        assert metrics['total_false_neighbors'] == len(expected)
+        np.testing.assert_array_equal(pairs['rank_high'], np.argsort(np.argsort(D_high, axis=1), axis=1)[pairs['source'], pairs['target']])
+        np.testing.assert_allclose(pairs['distance_low'], D_low[pairs['source'], pairs['target']])
+
+        simplex_edges = {
+            tuple(sorted((int(simplex[a]), int(simplex[b]))))
+            for simplex in Delaunay(points_2d).simplices for a, b in ((0, 1), (1, 2), (2, 0))
+        }
+        assert edges.tolist() == sorted(map(list, simplex_edges))
+
+        records, edge_list, _ = ProjectionQualityMetrics.compute_false_neighbors(D_high, D_low, points_2d, k)
+        assert records[0] == {name: array[0].item() for name, array in pairs.items()}
+        assert edge_list == [tuple(edge) for edge in edges.tolist()]
+
 
 class TestMissingNeighbors:
     """Test missing neighbors graph computation"""
@@ -219,6 +252,33 @@ class TestMissingNeighbors:
 
         assert stats_low['total_missing_neighbors'] >= stats_high['total_missing_neighbors']
 
+    def test_edges_match_per_pair_percentiles(self):
+        """Edge arrays list every kNN pair whose low-D percentile rank exceeds the threshold"""
+        rng = np.random.default_rng(5)
+        n, k, threshold = 40, 6, 0.4
+        x = rng.normal(size=(n, 6))
+        D_high = np.linalg.norm(x[:, None] - x[None], axis=2)
+        D_low = np.linalg.norm(x[:, None, :2] - x[None, :, :2], axis=2)
+
+        edges, counts, stats = ProjectionQualityMetrics.compute_missing_neighbors_edges(D_high, D_low, k, threshold)
+
+        neighbors = ProjectionQualityMetrics.find_k_nearest_neighbors(D_high, k)
+        expected = []
+        for i in range(n):
+            others = np.delete(D_low[i], i)
+            for j in neighbors[i]:
+                rank = np.sum(others <= D_low[i, j])
+                if rank / (n - 1) > threshold:
+                    expected.append((i, j, rank))
+
+        assert list(zip(edges['source'], edges['target'], edges['rank_low'])) == expected
+        np.testing.assert_allclose(edges['percentile'], edges['rank_low'] / (n - 1))
+        assert counts.sum() == stats['total_missing_neighbors'] == len(expected)
+
+        graph, missing_count, _ = ProjectionQualityMetrics.compute_missing_neighbors_graph(D_high, D_low, k, threshold)
+        assert graph == {i: [j for s, j, _ in expected if s == i] for i in range(n)}
+        assert missing_count == dict(enumerate(counts.tolist()))
+
 
 class TestGroupAnalysis:
     """Test group-based analysis"""
@@ -267,6 +327,26 @@ class TestGroupAnalysis:
         assert global_metrics['silhouette_high'] > 0.5
         assert global_metrics['silhouette_preservation'] == pytest.approx(1.0, abs=0.01)
 
+    def test_matches_pairwise_definitions(self):
+        """One-hot group sums must match the per-pair means and sklearn's silhouette"""
+        from sklearn.metrics import silhouette_score
+
+        n = 40
+        x = np.random.rand(n, 4)
+        D_high = np.linalg.norm(x[:, None] - x[None], axis=2)
+        D_low = np.linalg.norm(x[:, None, :2] - x[None, :, :2], axis=2)
+        groups = np.array([3, 7, 9, 12] * 10)
+
+        group_metrics, _, global_metrics = ProjectionQualityMetrics.analyze_groups(D_high, D_low, groups)
+
+        for metrics in group_metrics:
+            inside = groups == metrics['group_id']
+            block = D_low[np.ix_(inside, inside)]
+            assert metrics['cohesion_low'] == pytest.approx(block[np.triu_indices(inside.sum(), k=1)].mean())
+            assert metrics['separation_high'] == pytest.approx(D_high[np.ix_(inside, ~inside)].mean())
+        assert global_metrics['silhouette_high'] == pytest.approx(silhouette_score(D_high, groups, metric='precomputed'))
+        assert global_metrics['silhouette_low'] == pytest.approx(silhouette_score(D_low, groups, metric='precomputed'))
+
     @given(
         n_points=st.integers(min_value=10, max_value=30),
         n_groups=st.integers(min_value=2, max_value=5)
@@ -365,6 +445,190 @@ class TestProjectionComparison:
         assert np.allclose(comparison, comparison.T)
         assert np.allclose(np.diag(comparison), 1.0)  # Diagonal should be 1
 
+    def test_concurrent_engine_matches_sequential(self):
+        """Candidates evaluated in a thread pool give the sequential results"""
+        from concurrent.futures import ThreadPoolExecutor
+
+        n = 30
+        x = np.random.rand(n, 5)
+        D_high = np.linalg.norm(x[:, None] - x[None], axis=2)
+        projections = {
+            name: np.linalg.norm(x[:, None, dims] - x[None, :, dims], axis=2)
+            for name, dims in (('xy', [0, 1]), ('yz', [1, 2]), ('xz', [0, 2]))
+        }
+
+        expected = ProjectionQualityMetrics.compare_projections(D_high, projections)
+
+        comparison = ProjectionComparison(D_high)
+        comparison.prepare()
+        with ThreadPoolExecutor(max_workers=3) as pool:
+            results = list(pool.map(comparison.evaluate, projections, projections.values()))
+        assert comparison.summarize(results) == expected
+
+        # Gram-based similarities match the pairwise Procrustes correlation
+        matrix = np.array(expected[3])
+        assert matrix[0, 1] == pytest.approx(
+            ProjectionQualityMetrics._procrustes_similarity(projections['xy'], projections['yz']), abs=1e-5
+        )
+
+
+class TestRankMatrix:
+    """Test the blocked rank matrix and the metrics reading from it"""
+
+    @pytest.mark.parametrize("budget", [1, 16 * 30 * 4, 1 << 30])
+    def test_matches_row_argsort(self, budget):
+        D = np.round(np.random.rand(30, 30) * 5)  # Ties included
+        ranks = rank_matrix(D, memory_budget_bytes=budget)
+
+        assert ranks.dtype == np.uint16
+        for i in range(30):
+            assert ranks[i].tolist() == np.argsort(D[i].argsort(kind='stable')).tolist()
+
+    @pytest.mark.parametrize("budget", [1, 10 * 30 * 7, 1 << 30])
+    def test_pair_ranks_match_rank_matrix(self, budget):
+        D = np.round(np.random.rand(30, 30) * 5)  # Ties included
+        source = np.random.randint(0, 30, 100)
+        target = np.random.randint(0, 30, 100)
+        expected = rank_matrix(D)[source, target]
+        np.testing.assert_array_equal(pair_ranks(D, source, target, memory_budget_bytes=budget), expected)
+
+    def test_false_neighbor_ranks_reuse_a_cached_rank_matrix(self):
+        x = np.round(np.random.rand(40, 4) * 3)
+        D_high = np.linalg.norm(x[:, None] - x[None], axis=2)
+        D_low = np.linalg.norm(x[:, None, :2] - x[None, :, :2], axis=2)
+        fresh, _, _ = ProjectionQualityMetrics.compute_false_neighbor_pairs(D_high, D_low, x[:, :2], 5)
+
+        artifacts = ArtifactMemo()
+        ProjectionQualityMetrics.compute_rank_matrix(D_high, artifacts)
+        reused, _, _ = ProjectionQualityMetrics.compute_false_neighbor_pairs(D_high, D_low, x[:, :2], 5, artifacts)
+        for name in ('rank_high', 'rank_low'):
+            np.testing.assert_array_equal(reused[name], fresh[name])
+        # Only the rank matrix that was already there
+        assert artifacts.peek(D_low, "rank") is None
+
+    def test_trustworthiness_and_continuity_match_per_pair_ranks(self):
+        n, k = 40, 6
+        x = np.random.rand(n, 5)
+        D_high = np.linalg.norm(x[:, None] - x[None], axis=2)
+        D_low = np.linalg.norm(x[:, None, :2] - x[None, :, :2], axis=2)
+
+        def penalty(D_a, D_b):
+            neighbors_a = ProjectionQualityMetrics.find_k_nearest_neighbors(D_a, k)
+            neighbors_b = ProjectionQualityMetrics.find_k_nearest_neighbors(D_b, k)
+            total = 0
+            for i in range(n):
+                for j in set(neighbors_b[i]) - set(neighbors_a[i]):
+                    total += max(0, np.where(D_a[i].argsort() == j)[0][0] - k)
+            return 1 - 2 * total / (n * k * (2 * n - 3 * k - 1) / 2)
+
+        assert np.isclose(ProjectionQualityMetrics._compute_trustworthiness(D_high, D_low, k), penalty(D_high, D_low))
+        assert np.isclose(ProjectionQualityMetrics._compute_continuity(D_high, D_low, k), penalty(D_low, D_high))
+
+    def test_upper_triangle_blocks(self):
+        A, B = np.random.rand(13, 13), np.random.rand(13, 13)
+        upper = np.triu_indices(13, k=1)
+        blocks = list(upper_triangle_blocks(A, B, memory_budget_bytes=1))
+
+        assert len(blocks) == 13
+        np.testing.assert_array_equal(np.concatenate([a for a, _ in blocks]), A[upper])
+        np.testing.assert_array_equal(np.concatenate([b for _, b in blocks]), B[upper])
+
+
+class TestQualityCurves:
+    """Curves over k must match the single-k metrics"""
+
+    def test_matches_single_k_metrics(self):
+        n = 50
+        x = np.random.rand(n, 6)
+        D_high = np.linalg.norm(x[:, None] - x[None], axis=2)
+        D_low = np.linalg.norm(x[:, None, :2] - x[None, :, :2], axis=2)
+
+        curves = ProjectionQualityMetrics.compute_quality_curves(D_high, D_low, max_k=12)
+        assert curves['k'] == list(range(1, 13))
+
+        for k in curves['k']:
+            trust = ProjectionQualityMetrics._compute_trustworthiness(D_high, D_low, k)
+            cont = ProjectionQualityMetrics._compute_continuity(D_high, D_low, k)
+            _, _, metrics = ProjectionQualityMetrics.compute_false_neighbors(D_high, D_low, x[:, :2], k)
+            assert np.isclose(curves['trustworthiness'][k - 1], trust)
+            assert np.isclose(curves['continuity'][k - 1], cont)
+            assert np.isclose(curves['false_neighbors_ratio'][k - 1], metrics['false_neighbors_ratio'])
+            # Missing pairs are the mirror image of false pairs, with the same count
+            assert np.isclose(curves['missing_neighbors_ratio'][k - 1], metrics['false_neighbors_ratio'])
+
+    def test_tied_distances_match_comparison(self):
+        """Integer-grid coordinates (many ties) give the same values as /projection/compare"""
+        rng = np.random.default_rng(3)
+        x = rng.random((40, 5))
+        grid = rng.integers(0, 4, size=(40, 2)).astype(float)
+        D_high = np.linalg.norm(x[:, None] - x[None], axis=2)
+        D_low = np.linalg.norm(grid[:, None] - grid[None], axis=2)
+
+        curves = ProjectionQualityMetrics.compute_quality_curves(D_high, D_low, max_k=10)
+        for k in curves['k']:
+            comparison = ProjectionComparison(D_high, k=k)
+            comparison.prepare()
+            metrics = comparison.evaluate("grid", D_low)['metrics']
+            assert np.isclose(curves['trustworthiness'][k - 1], metrics['trustworthiness'])
+            assert np.isclose(curves['continuity'][k - 1], metrics['continuity'])
+            assert np.isclose(curves['false_neighbors_ratio'][k - 1], metrics['false_neighbors_ratio'])
+            assert np.isclose(curves['missing_neighbors_ratio'][k - 1], metrics['missing_neighbors_ratio'])
+            assert np.isclose(curves['trustworthiness'][k - 1],
+                              ProjectionQualityMetrics._compute_trustworthiness(D_high, D_low, k))
+
+    def test_perfect_projection_and_k_cap(self):
+        D = np.random.rand(8, 8)
+        D = (D + D.T) / 2
+        np.fill_diagonal(D, 0)
+
+        curves = ProjectionQualityMetrics.compute_quality_curves(D, D, max_k=20)
+        assert curves['k'] == list(range(1, 8))
+        assert np.allclose(curves['trustworthiness'], 1.0)
+        assert np.allclose(curves['continuity'], 1.0)
+        assert np.allclose(curves['false_neighbors_ratio'], 0.0)
+
+
+class TestCoordinateMode:
+    """Low-D coordinates must give the same results as their distance matrix"""
+
+    def setup_method(self):
+        x = np.random.rand(35, 5)
+        self.D_high = np.linalg.norm(x[:, None] - x[None], axis=2)
+        self.points = x[:, :2]
+        self.D_low = np.linalg.norm(self.points[:, None] - self.points[None], axis=2)
+
+    def test_blocked_distances_and_kdtree_neighbors(self):
+        D = pairwise_from_points(self.points, memory_budget_bytes=8 * 35 * 4)
+        np.testing.assert_allclose(D, self.D_low, atol=1e-12)
+        assert np.array_equal(D, D.T)
+
+        neighbors = knn_from_points(self.points, 6)
+        expected = np.argsort(self.D_low + np.diag([np.inf] * 35), axis=1)[:, :6]
+        np.testing.assert_array_equal(neighbors, expected)
+        with pytest.raises(ValueError):
+            knn_from_points(self.points, 35)
+
+    def test_false_neighbors_without_dense_matrix(self):
+        dense, edges, metrics = ProjectionQualityMetrics.compute_false_neighbors(
+            self.D_high, self.D_low, self.points, 5
+        )
+        sparse, sparse_edges, sparse_metrics = ProjectionQualityMetrics.compute_false_neighbors(
+            self.D_high, None, self.points, 5, points_low=self.points
+        )
+
+        key = lambda pair: (pair['source'], pair['target'])
+        assert sparse_metrics == metrics
+        assert sorted(sparse_edges) == sorted(edges)
+        for expected, actual in zip(sorted(dense, key=key), sorted(sparse, key=key)):
+            assert actual == pytest.approx(expected)
+
+    def test_missing_neighbors_without_dense_matrix(self):
+        expected = ProjectionQualityMetrics.compute_missing_neighbors_graph(self.D_high, self.D_low, 5, 0.3)
+        actual = ProjectionQualityMetrics.compute_missing_neighbors_graph(
+            self.D_high, None, 5, 0.3, points_low=self.points
+        )
+        assert actual == expected
+
 
 class TestPropertyBased:
     """Property-based tests using Hypothesis"""
@@ -0,0 +1,82 @@
+"""
+Unit tests for the matrix session store
+"""
+import numpy as np
+import pytest
+from app.sessions import SessionStore
+from app.projection_quality import ProjectionQualityMetrics
+
+
+def distance_matrix(n, seed=0):
+    x = np.random.default_rng(seed).normal(size=(n, 5))
+    return np.linalg.norm(x[:, None] - x[None], axis=2)
+
+
+class TestSessionStore:
+    """Test session lookup, artifact caching and byte-bounded eviction"""
+
+    def test_create_get_delete(self):
+        store = SessionStore()
+        D = distance_matrix(10)
+        session = store.create({"D_high": D})
+
+        assert store.get(session.session_id).arrays["D_high"] is D
+        assert session.describe()["arrays"] == {"D_high": [10, 10]}
+        assert store.delete(session.session_id)
+        assert not store.delete(session.session_id)
+        with pytest.raises(KeyError):
+            store.get(session.session_id)
+        assert store.stats()["memory_bytes"] == 0
+
+    def test_artifacts_are_cached_for_session_arrays_only(self):
+        store = SessionStore()
+        D_high, D_low = distance_matrix(30), distance_matrix(30, seed=1)
+        session = store.create({"D_high": D_high})
+        artifacts = store.artifacts(session)
+
+        first = ProjectionQualityMetrics.find_k_nearest_neighbors(D_high, 5, artifacts)
+        second = ProjectionQualityMetrics.find_k_nearest_neighbors(D_high, 5, artifacts)
+        assert second is first
+        np.testing.assert_array_equal(first, ProjectionQualityMetrics.find_k_nearest_neighbors(D_high, 5))
+
+        # Inline matrices are never cached under the session
+        ProjectionQualityMetrics.find_k_nearest_neighbors(D_low, 5, artifacts)
+        assert list(session.artifacts) == [("knn", "D_high", 5)]
+        assert store.stats()["artifact_hits"] == 1
+
+    def test_cached_artifacts_give_identical_metrics(self):
+        store = SessionStore()
+        D_high, D_low = distance_matrix(25), distance_matrix(25, seed=2)
+        session = store.create({"D_high": D_high, "D_low": D_low})
+        artifacts = store.artifacts(session)
+
+        expected = ProjectionQualityMetrics.compute_missing_neighbors_graph(D_high, D_low, 4)
+        for _ in range(2):
+            assert ProjectionQualityMetrics.compute_missing_neighbors_graph(D_high, D_low, 4, artifacts=artifacts) == expected
+
+    def test_lru_eviction_by_bytes(self):
+        D = distance_matrix(20)
+        store = SessionStore(memory_budget_bytes=2 * D.nbytes + 1)
+        first = store.create({"D_high": D})
+        second = store.create({"D_high": D.copy()})
+        store.get(first.session_id)
+
+        third = store.create({"D_high": D.copy()})
+        with pytest.raises(KeyError):
+            store.get(second.session_id)
+        store.get(first.session_id)
+        store.get(third.session_id)
+        assert store.stats()["evictions"] == 1
+
+        with pytest.raises(ValueError):
+            store.create({"D_high": distance_matrix(40)})
+
+    def test_artifact_over_budget_is_not_kept(self):
+        D = distance_matrix(20)
+        store = SessionStore(memory_budget_bytes=D.nbytes + 100)
+        session = store.create({"D_high": D})
+
+        artifact = store.derived(session, ("rank", "D_high"), lambda: np.zeros((20, 20)))
+        assert artifact.shape == (20, 20)
+        assert session.artifacts == {}
+        store.get(session.session_id)
@@ -0,0 +1,126 @@
+"""
+Unit tests for the binary wire formats
+"""
+from typing import Dict, List
+import numpy as np
+import pytest
+from fastapi import Depends, FastAPI, HTTPException
+from fastapi.testclient import TestClient
+from pydantic import BaseModel, Field
+
+from app import wire_format
+
+
+class MatrixRequest(BaseModel):
+    D_high: List[List[float]]
+    groups: List[int]
+    projections: Dict[str, List[List[float]]] = Field(default_factory=dict)
+    k_neighbors: int = Field(default=10, ge=1, le=100)
+
+
+def body(fmt, fields, arrays):
+    if fmt == wire_format.RAW:
+        return b"".join(bytes(chunk) for chunk in wire_format.encode_raw(fields, arrays))
+    if fmt == wire_format.NPZ:
+        return wire_format.encode_npz(fields, arrays)
+    return wire_format.encode_arrow(fields, arrays)
+
+
+FORMATS = [wire_format.RAW, wire_format.NPZ, pytest.param(
+    wire_format.ARROW,
+    marks=pytest.mark.skipif(not wire_format.arrow_available(), reason="pyarrow not installed")
+)]
+
+
+class TestBundles:
+    """Encoding and decoding round trips"""
+
+    @pytest.mark.parametrize("fmt", FORMATS)
+    def test_round_trip(self, fmt):
+        matrix = np.random.default_rng(0).random((5, 5))
+        fields = {"labels": ["a", "b"], "stats": {"mean": 0.5}}
+        decoded_fields, arrays = wire_format.decode(fmt, body(fmt, fields, {"m": matrix, "idx": np.arange(7)}))
+
+        assert decoded_fields == fields
+        assert arrays["m"].dtype == np.float32
+        np.testing.assert_allclose(arrays["m"], matrix, rtol=1e-6)
+        np.testing.assert_array_equal(arrays["idx"], np.arange(7))
+
+    def test_raw_splices_serialized_fields(self):
+        raw = body(wire_format.RAW, {}, {})
+        assert wire_format.decode_raw(raw) == ({}, {})
+
+        chunks = wire_format.encode_raw({"n": 1}, {}, raw_fields={"tree": '{"id": "root"}'})
+        fields, _ = wire_format.decode_raw(b"".join(bytes(chunk) for chunk in chunks))
+        assert fields == {"n": 1, "tree": {"id": "root"}}
+
+    def test_raw_rejects_truncated_body(self):
+        raw = body(wire_format.RAW, {}, {"m": np.ones((4, 4))})
+        with pytest.raises(ValueError):
+            wire_format.decode_raw(raw[:-8])
+
+    def test_negotiate(self):
+        assert wire_format.negotiate(None) == wire_format.JSON
+        assert wire_format.negotiate("*/*") == wire_format.JSON
+        assert wire_format.negotiate("application/x-float32") == wire_format.RAW
+        assert wire_format.negotiate("application/json;q=0.5, application/x-npz") == wire_format.NPZ
+        assert wire_format.negotiate("application/x-npz;q=0.2, application/json") == wire_format.JSON
+
+
+class TestBodyModel:
+    """Request bodies parsed by the body_model dependency"""
+
+    def setup_method(self):
+        app = FastAPI()
+
+        @app.post("/echo")
+        async def echo(request: MatrixRequest = Depends(wire_format.body_model(MatrixRequest))):
+            return {
+                "type": type(request.D_high).__name__,
+                "shape": list(np.shape(request.D_high)),
+                "groups": np.asarray(request.groups).tolist(),
+                "projections": sorted(request.projections),
+                "k_neighbors": request.k_neighbors
+            }
+
+        self.client = TestClient(app)
+
+    def post(self, fmt, fields, arrays):
+        return self.client.post("/echo", content=body(fmt, fields, arrays), headers={"Content-Type": fmt})
+
+    def test_json_still_validated(self):
+        response = self.client.post("/echo", json={"D_high": [[0, 1], [1, 0]], "groups": [0, 1]})
+        assert response.json()["type"] == "list"
+
+        response = self.client.post("/echo", json={"D_high": [[0, 1], [1, 0]], "groups": [0, 1], "k_neighbors": 0})
+        assert response.status_code == 422
+
+    @pytest.mark.parametrize("fmt", [wire_format.RAW, wire_format.NPZ])
+    def test_binary_arrays_stay_numpy(self, fmt):
+        response = self.post(fmt, {"k_neighbors": 3}, {
+            "D_high": np.zeros((3, 3)),
+            "groups": np.array([0.0, 1.0, 1.0]),
+            "projections.pca": np.zeros((3, 3))
+        })
+        assert response.status_code == 200
+        assert response.json() == {
+            "type": "ndarray", "shape": [3, 3], "groups": [0, 1, 1], "projections": ["pca"], "k_neighbors": 3
+        }
+
+    def test_binary_validation_errors(self):
+        assert self.post(wire_format.RAW, {}, {"groups": np.zeros(3)}).status_code == 422
+        assert self.post(wire_format.RAW, {}, {"D_high": np.zeros(3), "groups": np.zeros(3)}).status_code == 422
+        assert self.post(wire_format.RAW, {}, {"D_high": np.zeros((3, 3)), "groups": np.array([0.5])}).status_code == 422
+        assert self.post(wire_format.RAW, {"k_neighbors": 500},
+                         {"D_high": np.zeros((3, 3)), "groups": np.zeros(3)}).status_code == 422
+
+        response = self.client.post("/echo", content=b"\xff\xff", headers={"Content-Type": wire_format.RAW})
+        assert response.status_code == 400
+
+    @pytest.mark.skipif(wire_format.arrow_available(), reason="pyarrow installed")
+    def test_missing_pyarrow(self):
+        response = self.client.post("/echo", content=b"arrow", headers={"Content-Type": wire_format.ARROW})
+        assert response.status_code == 415
+        with pytest.raises(HTTPException) as error:
+            wire_format.encode_response(wire_format.ARROW, {}, {"D_high": np.zeros((2, 2))})
+        assert error.value.status_code == 406